@@ -0,0 +1,391 @@
+"""
+Generador de datos sintéticos con forma de producción.
+
+`csv` escribe un BOM con las columnas exactas de /object/validate-and-insert
+(latin1, 'Clase' en español, líneas de tornillería con Cantidad alta).
+`seed` llena una base vacía con N productos × M jobs × K items, piezas en
+stages al azar según su proceso, defect records con imágenes y usuarios.
+
+Uso (desde app/):
+    python -m benchmarks.dataset csv --job WN900A --items 5000 --out /tmp/WN900A.csv
+    python -m benchmarks.dataset seed --url sqlite:///bench.sqlite3 --products 5 --jobs 20 --items 300
+    python -m benchmarks.dataset seed --url sqlite:///bench.sqlite3 --images-dir static --defects 10
+"""
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+import random
+import string
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, update
+from sqlmodel import Session, SQLModel, select
+
+from auth import get_password_hash
+from db import create_db_engine
+from models import (
+    CorrectionProcess, DefectImage, DefectRecord, ImageType, Issue, Item, Job, Object, Process,
+    ProcessStage, Product, Role, Stage, Status, User,
+)
+from services.ingest_service import bulk_insert_items
+from services.progress_service import rebuild_counts
+
+BOM_COLUMNS = ["Job", "Item", "Material", "Espesor", "Cantidad", "OCR", "Clase",
+               "Longitud", "Ancho", "Alto", "Volumen", "Área Superficial"]
+
+# Proporción de cada 'Clase' en los BOM reales (data_example/WN675C.csv)
+CLASES = {"Doblado": 0.40, "Corte": 0.25, "Almacén": 0.12, "Maquinado": 0.08, "Sin clase": 0.15}
+MATERIALS = {"Steel": 0.9, "Stainless": 0.07, "Aluminum": 0.03}
+THICKNESSES = [0.125, 0.1875, 0.25, 0.3125, 0.375, 0.5, 0.75, 1.0, 3.0]
+# Nombres con acentos para ejercitar la lectura latin1
+SPANISH_NAMES = ["PLACA ÁNGULO", "MÉNSULA", "SOPORTE ESQUINA", "TAPA REGISTRO", "CANAL DOBLADO"]
+
+STAGES = ["CUTTING", "MACHINING", "WAREHOUSE", "BENT"]
+# Proceso -> ruta de stages
+PROCESS_ROUTES = {
+    "Cutting": ["CUTTING", "WAREHOUSE"],
+    "Bending": ["CUTTING", "BENT", "WAREHOUSE"],
+    "Machining": ["CUTTING", "MACHINING", "WAREHOUSE"],
+    "Warehouse": ["WAREHOUSE"],
+    "Sin clase": ["CUTTING", "MACHINING", "WAREHOUSE"],
+}
+PRODUCTS = ["TANKS", "ENCLOSURES", "ATC-COMPARTMENT", "CLAMP-HEAD IRON", "JUNCTION BOX"]
+STATUSES = ["Pending", "Ok", "Error"]
+IMAGE_TYPES = ["SOLVED IMAGE", "LOCATION IMAGE", "BEFORE ERROR"]
+CORRECTIONS = ["REWORK", "SCRAP"]
+ROLES = ["admin", "ingeniero", "supervisor", "operator", "inspector"]
+ISSUES = {
+    "Cutting": ["Cutting error", "Wrong dimensions", "Material defect"],
+    "Bending": ["Bending angle incorrect", "Wrong dimensions"],
+    "Machining": ["Hole misplaced", "Thread damaged"],
+    "Warehouse": ["Packaging damage"],
+}
+BENCH_PASSWORD = "bench1234"
+
+
+@dataclass
+class SeedSummary:
+    products: int = 0
+    jobs: int = 0
+    items: int = 0
+    objects: int = 0
+    defect_records: int = 0
+    images: int = 0
+    users: int = 0
+
+
+def _choice(rng: random.Random, weights: Dict[str, float]) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _quantity(rng: random.Random) -> int:
+    """Mayoría de 1-3 piezas, algunas de 4-12 y ~5% de tornillería con decenas (las líneas de 39/46 studs)."""
+    roll = rng.random()
+    if roll < 0.85:
+        return min(int(rng.expovariate(0.9)) + 1, 4)
+    if roll < 0.95:
+        return rng.randint(4, 12)
+    return rng.choice([20, 24, 39, 39, 46, 60])
+
+
+def job_codes(count: int, rng: random.Random) -> List[str]:
+    """Códigos únicos con la forma de los reales (WN675A, VA330O)."""
+    codes: set = set()
+    while len(codes) < count:
+        codes.add("".join(rng.choices(string.ascii_uppercase, k=2)) + f"{rng.randint(100, 999)}"
+                  + rng.choice(string.ascii_uppercase))
+    return sorted(codes)
+
+
+def generate_bom(job_code: str, items: int, rng: random.Random) -> pd.DataFrame:
+    """
+    Genera un BOM de `items` filas con las columnas de validate_and_insert.
+
+    Args:
+        job_code (str): Valor de la columna Job.
+        items (int): Filas (Items únicos).
+        rng (random.Random): Generador, para que el resultado sea reproducible.
+
+    Returns:
+        pd.DataFrame: Filas del BOM en el orden de columnas del CSV real.
+    """
+    rows = []
+    names: set = set()
+    stud = 0
+    while len(rows) < items:
+        quantity = _quantity(rng)
+        thickness = rng.choice(THICKNESSES)
+        if quantity >= 20:
+            stud += 1
+            name = f"{thickness}-20 X {rng.choice([0.5, 0.75, 1.0])} STUD_{stud}"
+            length, width, height = 0.75, thickness, thickness
+        else:
+            name = (f"{rng.choice(SPANISH_NAMES)} {rng.randint(1, 999)}" if rng.random() < 0.05
+                    else str(rng.randint(100, 9999)))
+            length, width, height = round(rng.uniform(1, 96), 3), round(rng.uniform(0.5, 48), 3), thickness
+        if name in names:
+            continue
+        names.add(name)
+        volume = length * width * height / 1728
+        area = 2 * (length * width + length * height + width * height) / 12
+        rows.append({
+            "Job": job_code,
+            "Item": name,
+            "Material": _choice(rng, MATERIALS),
+            "Espesor": thickness,
+            "Cantidad": quantity,
+            "OCR": f"{job_code}{name}",
+            "Clase": _choice(rng, CLASES),
+            "Longitud": length,
+            "Ancho": width,
+            "Alto": height,
+            # Los BOM reales traen algunas celdas vacías en Volumen/Área
+            "Volumen": np.nan if rng.random() < 0.01 else volume,
+            "Área Superficial": np.nan if rng.random() < 0.01 else area,
+        })
+    return pd.DataFrame(rows, columns=BOM_COLUMNS)
+
+
+def write_bom_csv(df: pd.DataFrame, path: Path) -> Path:
+    """Escribe el BOM en latin1, como los exporta la planta."""
+    df.to_csv(path, index=False, encoding="latin1")
+    return path
+
+
+def _seed_catalogs(session: Session, rng: random.Random, user_count: int) -> Dict[str, Dict[str, int]]:
+    """Crea stages, procesos, rutas, catálogos de defectos, roles y usuarios."""
+    session.add_all([Stage(stage_name=name) for name in STAGES])
+    session.add_all([Status(status_name=name) for name in STATUSES])
+    session.add_all([ImageType(type_name=name) for name in IMAGE_TYPES])
+    session.add_all([CorrectionProcess(correction_process_description=name) for name in CORRECTIONS])
+    session.add_all([Role(role_name=name) for name in ROLES])
+    session.add_all([Product(product_name=name) for name in PRODUCTS])
+    session.add_all([Process(process_name=name) for name in PROCESS_ROUTES])
+    session.flush()
+
+    ids = {
+        "stage": dict(session.exec(select(Stage.stage_name, Stage.stage_id)).all()),
+        "process": dict(session.exec(select(Process.process_name, Process.process_id)).all()),
+        "status": dict(session.exec(select(Status.status_name, Status.status_id)).all()),
+        "image_type": dict(session.exec(select(ImageType.type_name, ImageType.image_type_id)).all()),
+        "role": dict(session.exec(select(Role.role_name, Role.role_id)).all()),
+    }
+    session.add_all([
+        ProcessStage(process_id=ids["process"][process], stage_id=ids["stage"][stage], order=order)
+        for process, route in PROCESS_ROUTES.items()
+        for order, stage in enumerate(route, start=1)
+    ])
+    session.add_all([
+        Issue(issue_description=description, process_id=ids["process"][process])
+        for process, descriptions in ISSUES.items()
+        for description in descriptions
+    ])
+
+    # bcrypt es lento: todos los usuarios comparten el mismo hash
+    hashed = get_password_hash(BENCH_PASSWORD)
+    users = [("bench_admin", "admin")] + [
+        (f"bench_user{n}", rng.choice(ROLES[1:])) for n in range(1, user_count)
+    ]
+    session.add_all([
+        User(employee_number=10000 + n, username=username, email=f"{username}@example.com",
+             first_name="Bench", first_surname=f"User{n}", hashed_password=hashed, role_id=ids["role"][role])
+        for n, (username, role) in enumerate(users)
+    ])
+    session.flush()
+    ids["user"] = dict(session.exec(select(User.username, User.user_id)).all())
+    ids["issue"] = dict(session.exec(select(Issue.issue_id, Issue.process_id)).all())
+    return ids
+
+
+def _spread_stages(session: Session, job_id: int, stage_ids: Dict[str, int], process_names: Dict[int, str],
+                   rng: random.Random) -> None:
+    """Reparte las piezas del Job en stages al azar dentro de la ruta de su proceso."""
+    pieces = session.exec(
+        select(Object.object_id, Item.process_id).join(Item, Item.item_id == Object.item_id)
+        .where(Item.job_id == job_id)
+    ).all()
+    moves = []
+    for object_id, process_id in pieces:
+        route = PROCESS_ROUTES.get(process_names[process_id], PROCESS_ROUTES["Sin clase"])
+        stage = stage_ids[rng.choice(route)]
+        # bulk_insert_items deja todas las piezas en el stage 1
+        if stage != 1:
+            moves.append({"object_id": object_id, "current_stage": stage})
+    if moves:
+        session.execute(update(Object), moves)
+
+
+def _write_image(path: Path, size: tuple) -> None:
+    from PIL import Image
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.effect_noise(size, 48).convert("RGB").save(path, "JPEG", quality=85)
+
+
+def _seed_defects(session: Session, job: Job, product_name: str, count: int, images: int, ids: Dict,
+                  rng: random.Random, images_dir: Optional[Path], image_size: tuple) -> tuple:
+    users = list(ids["user"].values())
+    issues = list(ids["issue"])
+    now = datetime.now(timezone.utc)
+    records = []
+    for _ in range(count):
+        status = rng.choice(STATUSES)
+        opened = now - timedelta(days=rng.uniform(0, 180))
+        records.append({
+            "product_id": job.product_id,
+            "job_id": job.job_id,
+            "inspector_user_id": rng.choice(users),
+            "issue_by_user_id": rng.choice(users),
+            "issue_id": rng.choice(issues),
+            "correction_process_id": rng.randint(1, len(CORRECTIONS)),
+            "status_id": ids["status"][status],
+            "date_opened": opened,
+            "date_closed": opened + timedelta(days=rng.uniform(0, 10)) if status == "Ok" else None,
+        })
+    if not records:
+        return 0, 0
+    session.execute(insert(DefectRecord.__table__), records)
+    record_ids = session.exec(
+        select(DefectRecord.defect_record_id).where(DefectRecord.job_id == job.job_id)
+        .order_by(DefectRecord.defect_record_id.desc()).limit(count)
+    ).all()
+
+    image_rows = []
+    kinds = [("defect_image", "BEFORE ERROR"), ("location_image", "LOCATION IMAGE"), ("solved_image", "SOLVED IMAGE")]
+    for record_id in record_ids:
+        folder = f"{product_name}_{job.job_code}_{record_id}"
+        for n in range(images):
+            subfolder, type_name = kinds[n % len(kinds)]
+            relative = f"punch_list/{product_name}/{job.job_code}/{folder}/{subfolder}/bench_{n}.jpg"
+            if images_dir:
+                _write_image(images_dir / relative, image_size)
+            image_rows.append({
+                "defect_record_id": record_id,
+                "image_type_id": ids["image_type"][type_name],
+                "image_url": f"/static/{relative}",
+            })
+    if image_rows:
+        session.execute(insert(DefectImage.__table__), image_rows)
+    return len(record_ids), len(image_rows)
+
+
+def seed_database(
+    url: str,
+    products: int = 3,
+    jobs: int = 10,
+    items: int = 200,
+    defects: int = 5,
+    images: int = 3,
+    users: int = 20,
+    seed: int = 42,
+    images_dir: Optional[Path] = None,
+    image_size: tuple = (1600, 1200),
+) -> SeedSummary:
+    """
+    Llena una base vacía con datos sintéticos, cargando los Items por el
+    mismo camino que la ingesta de CSV (`bulk_insert_items`).
+
+    Args:
+        url (str): URL de la base (se crean las tablas si no existen).
+        products (int): Productos (hasta len(PRODUCTS)).
+        jobs (int): Jobs por producto.
+        items (int): Items por Job.
+        defects (int): Defect records por Job.
+        images (int): Imágenes por defect record.
+        users (int): Usuarios; el primero es `bench_admin` con rol admin.
+        seed (int): Semilla del generador.
+        images_dir (Path, optional): Si se indica, se escriben JPEG reales
+            bajo `images_dir/punch_list/...` (el directorio `static`).
+        image_size (tuple): Ancho y alto de las imágenes escritas.
+
+    Returns:
+        SeedSummary: Conteo de lo creado.
+    """
+    rng = random.Random(seed)
+    engine = create_db_engine(url)
+    SQLModel.metadata.create_all(engine)
+    summary = SeedSummary(users=users)
+
+    with Session(engine) as session:
+        if session.exec(select(Job.job_id).limit(1)).first() is not None:
+            raise ValueError("La base ya tiene datos; seed_database requiere una base vacía.")
+        ids = _seed_catalogs(session, rng, users)
+        process_names = {process_id: name for name, process_id in ids["process"].items()}
+        product_rows = session.exec(select(Product).where(Product.product_name.in_(PRODUCTS[:products]))).all()
+
+        codes = iter(job_codes(len(product_rows) * jobs, rng))
+        for product in product_rows:
+            summary.products += 1
+            for _ in range(jobs):
+                job = Job(job_code=next(codes), product_id=product.product_id)
+                session.add(job)
+                session.flush()
+                result = bulk_insert_items(session, generate_bom(job.job_code, items, rng), job.job_id)
+                _spread_stages(session, job.job_id, ids["stage"], process_names, rng)
+                records, written = _seed_defects(session, job, product.product_name, defects, images, ids, rng,
+                                                 images_dir, image_size)
+                session.commit()
+                summary.jobs += 1
+                summary.items += result.items_created
+                summary.objects += result.objects_created
+                summary.defect_records += records
+                summary.images += written
+
+        rebuild_counts(session)
+        session.commit()
+    engine.dispose()
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    csv_parser = commands.add_parser("csv", help="Escribir un BOM CSV")
+    csv_parser.add_argument("--job", help="Código del Job (por defecto uno al azar)")
+    csv_parser.add_argument("--items", type=int, default=1000)
+    csv_parser.add_argument("--out", type=Path, required=True)
+    csv_parser.add_argument("--seed", type=int, default=42)
+
+    seed_parser = commands.add_parser("seed", help="Llenar una base vacía")
+    seed_parser.add_argument("--url", required=True, help="URL de la base, p. ej. sqlite:///bench.sqlite3")
+    seed_parser.add_argument("--products", type=int, default=3)
+    seed_parser.add_argument("--jobs", type=int, default=10, help="Jobs por producto")
+    seed_parser.add_argument("--items", type=int, default=200, help="Items por Job")
+    seed_parser.add_argument("--defects", type=int, default=5, help="Defect records por Job")
+    seed_parser.add_argument("--images", type=int, default=3, help="Imágenes por defect record")
+    seed_parser.add_argument("--users", type=int, default=20)
+    seed_parser.add_argument("--seed", type=int, default=42)
+    seed_parser.add_argument("--images-dir", type=Path, help="Escribir JPEG reales bajo este directorio (static)")
+    seed_parser.add_argument("--image-size", default="1600x1200", help="ANCHOxALTO de las imágenes")
+
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    if args.command == "csv":
+        rng = random.Random(args.seed)
+        job_code = args.job or job_codes(1, rng)[0]
+        df = generate_bom(job_code, args.items, rng)
+        write_bom_csv(df, args.out)
+        print(f"{args.out}: Job {job_code}, {len(df)} items, {int(df['Cantidad'].sum())} piezas")
+        return 0
+
+    width, height = (int(value) for value in args.image_size.lower().split("x"))
+    try:
+        summary = seed_database(
+            args.url, args.products, args.jobs, args.items, args.defects, args.images, args.users,
+            args.seed, args.images_dir, (width, height),
+        )
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"{summary} en {time.perf_counter() - started:.1f}s (usuarios con contraseña '{BENCH_PASSWORD}')")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
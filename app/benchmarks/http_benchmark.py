@@ -0,0 +1,274 @@
+"""
+Benchmark HTTP de los endpoints calientes contra un servidor corriendo.
+
+Escenarios: escaneo de piezas (PUT /object/update_stage), tableros de Job
+(/jobs/{code}/status y /jobs/{code}/objects), defect records completos,
+carga de CSV y login. Cada escenario corre `--duration` segundos con
+`--concurrency` clientes y reporta p50/p95/p99 y requests/s; el resultado se
+compara contra una línea base guardada en JSON.
+
+Uso (desde app/):
+    python -m benchmarks.dataset seed --url sqlite:///bench.sqlite3 --products 3 --jobs 10 --items 300
+    DATABASE_URL=sqlite:///bench.sqlite3 uvicorn main:app --port 8080 --workers 1
+    python -m benchmarks.http_benchmark --db-url sqlite:///bench.sqlite3 --save-baseline
+    python -m benchmarks.http_benchmark --db-url sqlite:///bench.sqlite3 --scenarios scan,job_status -c 16
+
+Devuelve 1 si algún escenario empeora más que `--tolerance` contra la línea base.
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlmodel import Session, select
+
+from benchmarks.dataset import BENCH_PASSWORD, generate_bom, job_codes
+from db import create_db_engine
+from models import Item, Job, Object, Product, Stage
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "http_baseline.json"
+
+
+@dataclass
+class Targets:
+    """Datos reales de la base para armar los requests."""
+    jobs: List[tuple]  # (job_code, product_name)
+    pieces: List[str]  # "{ocr}_{piece_number}"
+    stages: List[str]
+    username: str
+    password: str
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    requests: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    latencies_ms: List[float] = field(default_factory=list, repr=False)
+
+    def summary(self) -> Dict[str, float]:
+        latencies = self.latencies_ms or [0.0]
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.requests / self.seconds, 1) if self.seconds else 0.0,
+            "p50_ms": round(cuts[49], 2),
+            "p95_ms": round(cuts[94], 2),
+            "p99_ms": round(cuts[98], 2),
+        }
+
+
+Scenario = Callable[[httpx.AsyncClient, Targets, random.Random], Awaitable[httpx.Response]]
+
+
+async def scan(client, targets, rng):
+    return await client.put("/object/update_stage", params={
+        "ocr": rng.choice(targets.pieces), "new_stage_name": rng.choice(targets.stages),
+    })
+
+
+async def job_status(client, targets, rng):
+    return await client.get(f"/jobs/{rng.choice(targets.jobs)[0]}/status")
+
+
+async def job_objects(client, targets, rng):
+    return await client.get(f"/jobs/{rng.choice(targets.jobs)[0]}/objects")
+
+
+async def defects_complete(client, targets, rng):
+    job_code, product_name = rng.choice(targets.jobs)
+    return await client.get(f"/defect-records/complete/{job_code}/{product_name}")
+
+
+async def ingest(client, targets, rng):
+    # Cada carga es un Job nuevo para medir siempre el camino de inserción completo
+    job_code = "BX" + job_codes(1, rng)[0][2:]
+    payload = generate_bom(job_code, 200, rng).to_csv(index=False).encode("latin1")
+    return await client.post(
+        "/object/validate-and-insert",
+        params={"product_name": rng.choice(targets.jobs)[1]},
+        files={"file": (f"{job_code}.csv", payload, "text/csv")},
+    )
+
+
+async def login(client, targets, rng):
+    return await client.post("/token", data={"username": targets.username, "password": targets.password})
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "scan": scan,
+    "job_status": job_status,
+    "job_objects": job_objects,
+    "defects_complete": defects_complete,
+    "ingest": ingest,
+    "login": login,
+}
+
+
+def load_targets(db_url: str, username: str, password: str, max_pieces: int = 20000) -> Targets:
+    """Lee de la base del servidor los Jobs, piezas y stages existentes."""
+    engine = create_db_engine(db_url)
+    with Session(engine) as session:
+        jobs = session.exec(
+            select(Job.job_code, Product.product_name).join(Product, Product.product_id == Job.product_id)
+        ).all()
+        pieces = session.exec(
+            select(Item.ocr, Object.piece_number).join(Object, Object.item_id == Item.item_id).limit(max_pieces)
+        ).all()
+        stages = session.exec(select(Stage.stage_name)).all()
+    engine.dispose()
+    if not jobs or not pieces:
+        raise ValueError("La base no tiene Jobs; genere datos con `python -m benchmarks.dataset seed`.")
+    return Targets(
+        jobs=[tuple(row) for row in jobs],
+        pieces=[f"{ocr}_{piece_number}" for ocr, piece_number in pieces],
+        stages=list(stages),
+        username=username,
+        password=password,
+    )
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, targets: Targets, concurrency: int,
+                       duration: float, seed: int = 0) -> ScenarioResult:
+    """
+    Corre un escenario con `concurrency` clientes durante `duration` segundos.
+
+    Las respuestas 4xx/5xx y los errores de conexión cuentan como errores y
+    no entran en las latencias.
+    """
+    scenario = SCENARIOS[name]
+    result = ScenarioResult(scenario=name)
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int) -> None:
+        rng = random.Random(seed * 1000 + worker_id)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await scenario(client, targets, rng)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            result.requests += 1
+            if failed:
+                result.errors += 1
+            else:
+                result.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+async def authenticate(client: httpx.AsyncClient, targets: Targets) -> None:
+    response = await login(client, targets, random.Random())
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+
+def compare(current: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """
+    Escenarios que empeoraron: p95 mayor o requests/s menor que la línea base
+    por más de `tolerance` (fracción).
+    """
+    regressions = []
+    for name, summary in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if summary["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {summary['p95_ms']} ms")
+        if summary["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {base['rps']} -> {summary['rps']}")
+    return regressions
+
+
+def _delta(value: float, base: Optional[float]) -> str:
+    if not base:
+        return ""
+    return f" ({(value - base) / base * 100:+.0f}%)"
+
+
+def print_report(current: Dict[str, Dict], baseline: Dict[str, Dict]) -> None:
+    print(f"{'escenario':<18}{'req':>7}{'err':>6}{'rps':>16}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}")
+    for name, s in current.items():
+        base = baseline.get(name, {})
+        print(
+            f"{name:<18}{s['requests']:>7}{s['errors']:>6}"
+            f"{str(s['rps']) + _delta(s['rps'], base.get('rps')):>16}"
+            f"{str(s['p50_ms']) + _delta(s['p50_ms'], base.get('p50_ms')):>18}"
+            f"{str(s['p95_ms']) + _delta(s['p95_ms'], base.get('p95_ms')):>18}"
+            f"{str(s['p99_ms']) + _delta(s['p99_ms'], base.get('p99_ms')):>18}"
+        )
+
+
+async def run(args) -> Dict[str, Dict]:
+    targets = load_targets(args.db_url, args.username, args.password)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        await authenticate(client, targets)
+        results = {}
+        for name in args.scenarios:
+            result = await run_scenario(client, name, targets, args.concurrency, args.duration, args.seed)
+            results[name] = result.summary()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--db-url", required=True, help="Base que usa el servidor (para elegir Jobs y piezas)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda value: [name for name in value.split(",") if name],
+                        help=f"Lista separada por comas: {','.join(SCENARIOS)}")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="Segundos por escenario")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--username", default="bench_admin")
+    parser.add_argument("--password", default=BENCH_PASSWORD)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar el resultado como nueva línea base")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Empeoramiento tolerado (fracción)")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    current = asyncio.run(run(args))
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    baseline = stored.get("scenarios", {})
+    print_report(current, baseline)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": platform.node(),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "scenarios": {**baseline, **current},
+        }, indent=2))
+        print(f"Línea base guardada en {args.baseline}")
+        return 0
+
+    regressions = compare(current, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESIÓN {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Benchmark del endpoint /object/validate-and-insert.
+
+Escala `data_example/WN675A.csv` N veces (renombrando Item y OCR para que no
+haya duplicados), lo inserta en una base SQLite temporal y reporta filas/s.
+
+Uso (desde app/):
+    python -m benchmarks.ingest_benchmark --scale 40
+"""
+import argparse
+import io
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+from fastapi import UploadFile
+from sqlmodel import Session, SQLModel, create_engine
+
+from models import Product, Stage
+from routers.validate_csv import validate_and_insert
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data_example"
+
+
+def build_scaled_csv(scale: int, source: str = "WN675A.csv") -> bytes:
+    """
+    Replica el CSV de ejemplo `scale` veces con nombres de Item/OCR únicos.
+    """
+    df = pd.read_csv(DATA_DIR / source, encoding="latin1")
+    copies = []
+    for n in range(scale):
+        copy = df.copy()
+        copy["Item"] = copy["Item"].astype(str) + f"-{n}"
+        copy["OCR"] = copy["OCR"].astype(str) + f"-{n}"
+        copies.append(copy)
+    scaled = pd.concat(copies, ignore_index=True)
+    return scaled.to_csv(index=False).encode("latin1")
+
+
+def run(scale: int) -> float:
+    payload = build_scaled_csv(scale)
+    rows = len(pd.read_csv(io.BytesIO(payload), encoding="latin1"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.sqlite3")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(Product(product_name="TANKS"))
+            session.add(Stage(stage_name="CUTTING"))
+            session.commit()
+
+            upload = UploadFile(file=io.BytesIO(payload), filename="bench.csv")
+            start = time.perf_counter()
+            validate_and_insert(upload, "TANKS", session)
+            elapsed = time.perf_counter() - start
+        engine.dispose()
+
+    rows_per_second = rows / elapsed
+    print(f"rows={rows} elapsed={elapsed:.3f}s rows/s={rows_per_second:,.0f}")
+    return rows_per_second
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=40, help="Veces que se replica WN675A.csv")
+    args = parser.parse_args()
+    run(args.scale)
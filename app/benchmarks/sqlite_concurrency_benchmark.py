@@ -0,0 +1,132 @@
+"""
+Benchmark de concurrencia del engine SQLite: escáneres + carga de CSV.
+
+Compara los engines sin PRAGMAs (`create_engine`/`create_async_engine`)
+contra el perfil de `db.create_db_engine`/`db.create_async_db_engine` (WAL,
+busy_timeout, pool, ...). Durante `--seconds` segundos, `--scanners` tareas
+asíncronas actualizan el stage de piezas al azar mientras un hilo sube CSVs
+completos; se reportan actualizaciones/s, latencias y errores "database is
+locked".
+
+Uso (desde app/):
+    python -m benchmarks.sqlite_concurrency_benchmark --scanners 8 --seconds 10
+"""
+import argparse
+import asyncio
+import io
+import random
+import statistics
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.ingest_benchmark import build_scaled_csv
+from db import async_database_url, create_async_db_engine, create_db_engine
+from models import Item, Object, Product, Stage
+from routers.object_current_stage import update_object_stage
+from routers.validate_csv import validate_and_insert
+
+# Perfil -> (engine síncrono para la carga de CSV, engine asíncrono para los escáneres)
+PROFILES = {
+    "legacy": (create_engine, lambda url: create_async_engine(async_database_url(url))),
+    "tuned": (create_db_engine, create_async_db_engine),
+}
+
+
+@dataclass
+class RunStats:
+    latencies: list = field(default_factory=list)
+    locked: int = 0
+    uploads: int = 0
+    upload_errors: int = 0
+
+
+def seed(engine, payload: bytes) -> list[str]:
+    """Crea catálogos, sube el Job base y devuelve los OCR escaneables."""
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([Product(product_name="TANKS"), Stage(stage_name="CUTTING"), Stage(stage_name="MACHINING")])
+        session.commit()
+        validate_and_insert(UploadFile(file=io.BytesIO(payload), filename="seed.csv"), "TANKS", session)
+        pieces = session.exec(select(Item.ocr, Object.piece_number).join(Object)).all()
+    return [f"{ocr}_{piece_number}" for ocr, piece_number in pieces]
+
+
+async def scanner(async_engine, scans: list[str], stats: RunStats, stop: threading.Event) -> None:
+    rng = random.Random()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                await update_object_stage(rng.choice(scans), rng.choice(["CUTTING", "MACHINING"]), session)
+        except OperationalError:
+            stats.locked += 1
+            continue
+        stats.latencies.append(time.perf_counter() - start)
+
+
+async def run_scanners(async_engine, scans: list[str], scanners: int, seconds: float,
+                       stats: RunStats, stop: threading.Event) -> None:
+    tasks = [asyncio.create_task(scanner(async_engine, scans, stats, stop)) for _ in range(scanners)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    await async_engine.dispose()
+
+
+def uploader(engine, payload: bytes, stats: RunStats, stop: threading.Event) -> None:
+    n = 0
+    while not stop.is_set():
+        n += 1
+        job_payload = payload.replace(b"WN675A", f"UP{n:04d}".encode())
+        try:
+            with Session(engine) as session:
+                validate_and_insert(UploadFile(file=io.BytesIO(job_payload), filename="up.csv"), "TANKS", session)
+            stats.uploads += 1
+        except (HTTPException, OperationalError):
+            stats.upload_errors += 1
+
+
+def run(profile: str, scanners: int, seconds: float, scale: int) -> RunStats:
+    payload = build_scaled_csv(scale)
+    stats = RunStats()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.sqlite3"
+        make_engine, make_async_engine = PROFILES[profile]
+        engine = make_engine(url)
+        scans = seed(engine, payload)
+
+        stop = threading.Event()
+        upload_thread = threading.Thread(target=uploader, args=(engine, payload, stats, stop))
+        upload_thread.start()
+        asyncio.run(run_scanners(make_async_engine(url), scans, scanners, seconds, stats, stop))
+        upload_thread.join()
+        engine.dispose()
+
+    latencies = sorted(stats.latencies) or [0.0]
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(
+        f"{profile:>6}: updates={len(stats.latencies)} ({len(stats.latencies) / seconds:,.0f}/s) "
+        f"locked={stats.locked} p50={statistics.median(latencies) * 1000:.1f}ms p95={p95 * 1000:.1f}ms "
+        f"uploads={stats.uploads} upload_errors={stats.upload_errors}"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scanners", type=int, default=8, help="Escáneres concurrentes")
+    parser.add_argument("--seconds", type=float, default=10, help="Duración de cada corrida")
+    parser.add_argument("--scale", type=int, default=5, help="Veces que se replica WN675A.csv por carga")
+    parser.add_argument("--profile", choices=[*PROFILES, "both"], default="both")
+    args = parser.parse_args()
+    for profile in (PROFILES if args.profile == "both" else [args.profile]):
+        run(profile, args.scanners, args.seconds, args.scale)
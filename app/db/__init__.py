@@ -1,12 +1,108 @@
 from sqlmodel import Session, create_engine, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from typing import Annotated
 from fastapi import Depends, FastAPI
 
+from config import settings
+from db.query_counter import instrument_engine
 
-sqlite_name = "db.sqlite3"
-sqlite_url = f"sqlite:///{sqlite_name}"
 
-engine = create_engine(sqlite_url)
+database_url = settings.DATABASE_URL
+
+# Driver asíncrono por backend
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def sqlite_pragmas() -> dict[str, str]:
+    """
+    PRAGMAs del perfil SQLite definidos en `config.Settings`.
+    """
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": str(settings.SQLITE_BUSY_TIMEOUT_MS),
+        "cache_size": str(settings.SQLITE_CACHE_SIZE),
+        "mmap_size": str(settings.SQLITE_MMAP_SIZE),
+        "temp_store": settings.SQLITE_TEMP_STORE,
+        "foreign_keys": "ON" if settings.SQLITE_FOREIGN_KEYS else "OFF",
+    }
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: dict[str, str] | None = None) -> None:
+    """
+    Aplica los PRAGMAs a cada conexión nueva del engine.
+
+    Args:
+        engine (Engine): Engine SQLite.
+        pragmas (dict, optional): PRAGMA -> valor; por defecto `sqlite_pragmas()`.
+    """
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _pool_options(url: str) -> dict:
+    """
+    Opciones de pool comunes; vacías para SQLite en memoria (usa su pool por defecto).
+    """
+    sa_url = make_url(url)
+    if sa_url.get_backend_name() == "sqlite" and sa_url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+
+def create_db_engine(url: str = database_url) -> Engine:
+    """
+    Crea el engine de la aplicación para SQLite o PostgreSQL según la URL.
+
+    Ambos usan el pool configurado (tamaño, overflow, pre-ping y recycle);
+    SQLite además recibe los PRAGMAs del perfil. Las bases SQLite en memoria
+    usan el pool por defecto de SQLAlchemy.
+    """
+    options = _pool_options(url)
+    engine = create_engine(url, **options)
+    if options and make_url(url).get_backend_name() == "sqlite":
+        apply_sqlite_pragmas(engine)
+    return instrument_engine(engine)
+
+
+def async_database_url(url: str) -> str:
+    """
+    Convierte la URL al driver asíncrono del mismo backend (aiosqlite/asyncpg).
+    """
+    sa_url = make_url(url)
+    backend = sa_url.get_backend_name()
+    return sa_url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def create_async_db_engine(url: str = database_url) -> AsyncEngine:
+    """
+    Crea el engine asíncrono con el mismo pool y PRAGMAs que `create_db_engine`.
+    """
+    options = _pool_options(url)
+    engine = create_async_engine(async_database_url(url), **options)
+    if options and make_url(url).get_backend_name() == "sqlite":
+        apply_sqlite_pragmas(engine.sync_engine)
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+engine = create_db_engine()
+async_engine = create_async_db_engine()
 
 def create_all_tables(app: FastAPI):
     SQLModel.metadata.create_all(engine)
@@ -16,4 +112,10 @@ def get_session():
     with Session(engine) as session:
         yield session
 
-SessionDep = Annotated[Session, Depends(get_session)]
\ No newline at end of file
+async def get_async_session():
+    # Sin expire_on_commit: en async no se pueden recargar atributos de forma implícita
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+SessionDep = Annotated[Session, Depends(get_session)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
@@ -0,0 +1,111 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+from db.slow_query import slow_query_log
+from services.metrics import DB_LOCK_ERRORS, DB_LOCK_WAIT, DB_QUERIES, DB_QUERY_DURATION
+
+
+@dataclass
+class QueryStats:
+    """Consultas ejecutadas dentro de un `track_queries()` (normalmente un request)."""
+    count: int = 0
+    total_ms: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+    statement_ms: Counter = field(default_factory=Counter)
+    route: Optional[str] = None
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Sentencias idénticas ejecutadas `threshold` veces o más: patrón N+1.
+        """
+        threshold = settings.QUERY_N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries(route: Optional[str] = None) -> Iterator[QueryStats]:
+    """
+    Cuenta las consultas de los engines instrumentados dentro del bloque.
+
+    El contexto se hereda en las tareas y en el threadpool de FastAPI, así que
+    cubre endpoints sync y async.
+    """
+    stats = QueryStats(route=route)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+# Sentencias que toman el lock de escritura de SQLite
+WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE", "BEGIN IMMEDIATE", "BEGIN EXCLUSIVE")
+
+
+def _is_sqlite_write(conn, statement: str) -> bool:
+    return conn.dialect.name == "sqlite" and statement.lstrip()[:16].upper().startswith(WRITE_PREFIXES)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERIES.inc()
+    DB_QUERY_DURATION.observe(elapsed)
+    if elapsed * 1000 >= settings.SQLITE_LOCK_WAIT_THRESHOLD_MS and _is_sqlite_write(conn, statement):
+        DB_LOCK_WAIT.observe(elapsed)
+
+    stats = _current_stats.get()
+    if 0 <= settings.SLOW_QUERY_THRESHOLD_MS <= elapsed * 1000:
+        slow_query_log.record(conn, statement, parameters, executemany, elapsed * 1000, stats and stats.route)
+    if stats is None:
+        return
+    stats.count += 1
+    stats.total_ms += elapsed * 1000
+    stats.statements[statement] += 1
+    stats.statement_ms[statement] += elapsed * 1000
+
+
+def _handle_error(context):
+    # La sentencia falló: descartar su marca de inicio
+    start = None
+    if context.connection is not None:
+        starts = context.connection.info.get("query_start")
+        if starts:
+            start = starts.pop()
+    if "database is locked" in str(context.original_exception):
+        DB_LOCK_ERRORS.inc()
+        if start is not None:
+            DB_LOCK_WAIT.observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine) -> Engine:
+    """
+    Registra los eventos de conteo, métricas y consultas lentas en un engine
+    síncrono (o en `AsyncEngine.sync_engine`).
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+    return engine
@@ -0,0 +1,180 @@
+"""
+Registro de consultas lentas.
+
+Cada sentencia que supera SLOW_QUERY_THRESHOLD_MS se agrupa por su SQL
+normalizado (literales y listas IN colapsados) y se acumula su conteo y
+tiempo total. El plan de ejecución (`EXPLAIN QUERY PLAN` en SQLite, `EXPLAIN`
+en PostgreSQL) se captura una sola vez por sentencia única.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from logs_setup import setup_api_logger
+
+logger = setup_api_logger("slow_queries")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)|\(\s*%\(\w+\)s(?:\s*,\s*%\(\w+\)s)*\s*\)")
+_VALUES_ROWS = re.compile(r"(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+")
+_SPACES = re.compile(r"\s+")
+
+# Solo estas sentencias admiten EXPLAIN en ambos backends
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    SQL sin literales ni listas de parámetros de largo variable, para agrupar
+    ejecuciones de la misma consulta.
+    """
+    sql = _STRING.sub("?", statement)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PARAM_LIST.sub("(...)", sql)
+    sql = _VALUES_ROWS.sub(r"\1", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def _types(values) -> str:
+    if isinstance(values, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in values.items()) + "}"
+    # Tipos consecutivos iguales se agrupan: (int×3, str)
+    groups: List[List[Any]] = []
+    for value in values:
+        name = type(value).__name__
+        if groups and groups[-1][0] == name:
+            groups[-1][1] += 1
+        else:
+            groups.append([name, 1])
+    return "(" + ", ".join(name if n == 1 else f"{name}×{n}" for name, n in groups) + ")"
+
+
+def params_shape(parameters, executemany: bool) -> str:
+    """Forma de los parámetros (tipos, no valores) para no registrar datos."""
+    if not parameters:
+        return "()"
+    if executemany:
+        return f"{len(parameters)} × {_types(parameters[0])}"
+    return _types(parameters)
+
+
+@dataclass
+class SlowQuery:
+    statement: str
+    params_shape: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    routes: Counter = field(default_factory=Counter)
+    plan: Optional[List[str]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "statement": self.statement,
+            "params_shape": self.params_shape,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 2),
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "routes": dict(self.routes.most_common()),
+            "plan": self.plan,
+        }
+
+
+def explain(conn, statement: str, parameters) -> Optional[List[str]]:
+    """
+    Plan de ejecución de `statement` con sus parámetros, o None si no aplica.
+
+    Usa un cursor DBAPI propio para no disparar los eventos del engine. En
+    PostgreSQL un EXPLAIN que falla aborta la transacción del request, así que
+    corre dentro de un SAVEPOINT y ante un error se vuelve a él.
+    """
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        return None
+    savepoint = dialect == "postgresql"
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        try:
+            cursor.execute(prefix + statement, parameters or ())
+            rows = cursor.fetchall()
+        except Exception as e:
+            if savepoint:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            return [f"EXPLAIN falló: {e}"]
+        finally:
+            if savepoint:
+                cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+    except Exception as e:
+        # Sin transacción abierta (autocommit) no hay SAVEPOINT, pero tampoco nada que abortar
+        logger.warning(f"No se pudo capturar el plan: {e}")
+        return None
+    finally:
+        cursor.close()
+    # SQLite: (id, parent, notused, detail); PostgreSQL: una línea por fila
+    return [row[-1] for row in rows]
+
+
+class SlowQueryLog:
+    """
+    Acumula las consultas lentas por SQL normalizado; como máximo
+    `max_statements` sentencias únicas.
+    """
+
+    def __init__(self, max_statements: int = settings.SLOW_QUERY_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._entries: Dict[str, SlowQuery] = {}
+        self._lock = threading.Lock()
+
+    def record(self, conn, statement: str, parameters, executemany: bool, elapsed_ms: float,
+               route: Optional[str]) -> None:
+        """
+        Registra una ejecución lenta y captura su plan si es la primera vez
+        que se ve la sentencia.
+        """
+        normalized = normalize_sql(statement)
+        shape = params_shape(parameters, executemany)
+        with self._lock:
+            entry = self._entries.get(normalized)
+            is_new = entry is None
+            if is_new:
+                if len(self._entries) >= self.max_statements:
+                    return
+                entry = self._entries[normalized] = SlowQuery(statement=normalized, params_shape=shape)
+            entry.count += 1
+            entry.total_ms += elapsed_ms
+            entry.max_ms = max(entry.max_ms, elapsed_ms)
+            entry.routes[route or "-"] += 1
+
+        logger.warning(f"Consulta lenta ({elapsed_ms:.1f} ms) en {route or '-'}: {normalized} {shape}")
+        if is_new:
+            first_params = parameters[0] if executemany and parameters else parameters
+            entry.plan = explain(conn, statement, first_params)
+            if entry.plan:
+                logger.info("Plan de ejecución:\n" + "\n".join(entry.plan))
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Sentencias con mayor tiempo total acumulado."""
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda entry: entry.total_ms, reverse=True)
+        return [entry.to_dict() for entry in entries[:limit]]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog()
@@ -13,11 +13,12 @@ from routers import (
     ocr_routes, validate_csv, list_jobs, details, job_status, 
     object_current_stage, item_router, user_router, auth_router, 
     rest_password_router, products_router, issue_router, defect_record_router,
-    correction_process_router, status_router
+    correction_process_router, status_router, metrics_router,
+    profiling_router, slow_query_router, ocr_cache_router
 
 )
 from generate_qr import generate_qr, generate_pdf
-from middleware import auth_middleware
+from middleware import auth_middleware, query_counter_middleware, metrics_middleware, profiling_middleware
 
 logger = setup_api_logger("main")
 qr_path = generate_qr()
@@ -25,6 +26,9 @@ generate_pdf(qr_path)
 
 app = FastAPI(lifespan=create_all_tables)
 app.middleware("http")(auth_middleware)
+app.middleware("http")(profiling_middleware)
+app.middleware("http")(query_counter_middleware)
+app.middleware("http")(metrics_middleware)
 
 # Rutas públicas (no necesitan token)
 app.include_router(rest_password_router.router)
@@ -177,6 +181,10 @@ app.include_router(issue_router.router)
 app.include_router(defect_record_router.router)
 app.include_router(correction_process_router.router)
 app.include_router(status_router.router)
+app.include_router(metrics_router.router)
+app.include_router(profiling_router.router)
+app.include_router(slow_query_router.router)
+app.include_router(ocr_cache_router.router)
 
 # Configuración de archivos estáticos
 app.mount("/static", StaticFiles(directory="./static"), name="static")
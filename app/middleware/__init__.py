@@ -1,2 +1,5 @@
 from .login_redirection import auth_middleware
-#from .admin_middleware import check_admin_access
\ No newline at end of file
+from .query_counter import query_counter_middleware
+from .metrics import metrics_middleware
+from .profiling import profiling_middleware
+#from .admin_middleware import check_admin_access
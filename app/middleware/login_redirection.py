@@ -1,8 +1,11 @@
+import secrets
+
 from fastapi import Request, HTTPException
 from fastapi.responses import RedirectResponse
 from auth import verify_token, get_token
 import jwt
 from auth import SECRET_KEY, ALGORITHM
+from config import settings
 
 async def check_admin_access(request: Request, allowed_roles):
     token = get_token(request)
@@ -46,6 +49,19 @@ async def check_admin_access(request: Request, allowed_roles):
 
 allowed_roles = ["admin", "ingeniero", "supervisor"]
 
+# Rutas que además del login exigen un rol en allowed_roles
+restricted_paths = ("/admin", "/metrics")
+
+
+def has_metrics_token(request: Request) -> bool:
+    """True si la request trae el METRICS_TOKEN configurado (scraper de Prometheus)."""
+    expected = settings.METRICS_TOKEN
+    auth_header = request.headers.get("Authorization", "")
+    if not expected or not auth_header.startswith("Bearer "):
+        return False
+    return secrets.compare_digest(auth_header[len("Bearer "):].encode(), expected.encode())
+
+
 async def auth_middleware(request: Request, call_next):
     #return await call_next(request)
     # Rutas que no requieren autenticación
@@ -58,6 +74,9 @@ async def auth_middleware(request: Request, call_next):
     if any(path.startswith(public_path) for public_path in public_paths):
         return await call_next(request)
     
+    if path == "/metrics" and has_metrics_token(request):
+        return await call_next(request)
+    
     # Obtiene el token
     token = get_token(request)
     if not token:
@@ -68,8 +87,8 @@ async def auth_middleware(request: Request, call_next):
     if not payload:
         return RedirectResponse(url="/login", status_code=303)
     
-    # Verifica los permisos de admin si la ruta comienza con /admin
-    if path.startswith("/admin"):
+    # Verifica los permisos de admin si la ruta comienza con /admin (o es /metrics)
+    if path.startswith(restricted_paths):
         user_role = payload.get("role")
         if not user_role or user_role not in allowed_roles:
             if "html" in request.headers.get("accept", ""):
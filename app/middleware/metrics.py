@@ -0,0 +1,30 @@
+import time
+
+from fastapi import Request
+
+from services.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+
+
+async def metrics_middleware(request: Request, call_next):
+    """
+    Mide la latencia de cada request por ruta y los requests en proceso.
+
+    Se etiqueta con la plantilla de la ruta (`/jobs/{job_code}/status`) y no con
+    la URL, para que la cardinalidad de la métrica no crezca con los datos.
+    """
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status_code),
+        )
@@ -0,0 +1,72 @@
+from contextlib import nullcontext
+import threading
+import time
+
+from fastapi import Request
+
+from auth import get_token, verify_token
+from db.query_counter import current_stats, track_queries
+from logs_setup import setup_api_logger
+from middleware.login_redirection import allowed_roles
+from services.profiler import (
+    SamplingProfiler, build_profile, current_profiler, new_profile_id, profile_requested, save_profile
+)
+
+logger = setup_api_logger("profiles")
+
+
+def _profiling_user(request: Request) -> dict | None:
+    token = get_token(request)
+    payload = verify_token(token) if token else None
+    if not payload or payload.get("role") not in allowed_roles:
+        return None
+    return payload
+
+
+async def profiling_middleware(request: Request, call_next):
+    """
+    Perfila el request si trae `X-Profile: 1` o `?profile=1` y el usuario
+    tiene un rol en `allowed_roles`; el perfil se guarda en PROFILE_DIR y su
+    id se devuelve en el header `X-Profile-Id`.
+
+    El flag de otros usuarios se ignora. Los requests sin flag pasan directo.
+    """
+    if not profile_requested(request.scope):
+        return await call_next(request)
+    payload = _profiling_user(request)
+    if payload is None:
+        return await call_next(request)
+
+    profile_id = new_profile_id()
+    stats = current_stats()
+    route = f"{request.method} {request.url.path}"
+    with nullcontext(stats) if stats is not None else track_queries(route) as stats:
+        queries_before, ms_before = stats.count, stats.total_ms
+        profiler = SamplingProfiler(threading.get_ident()).start()
+        # Registra la tarea del request; sus tareas hijas y los endpoints síncronos
+        # (threadpool) heredan este contexto
+        token = profiler.activate()
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            current_profiler.reset(token)
+            profiler.stop()
+
+    profile = build_profile(
+        profile_id, profiler, stats,
+        method=request.method,
+        path=request.url.path,
+        query=request.url.query,
+        status_code=response.status_code,
+        duration_ms=duration_ms,
+        user=payload.get("sub"),
+    )
+    save_profile(profile)
+    logger.info(
+        f"Perfil {profile_id}: {request.method} {request.url.path} {duration_ms:.1f} ms, "
+        f"{stats.count - queries_before} consultas ({stats.total_ms - ms_before:.1f} ms)"
+    )
+    response.headers["X-Profile-Id"] = profile_id
+    return response
@@ -0,0 +1,28 @@
+from fastapi import Request
+
+from db.query_counter import track_queries
+from logs_setup import setup_api_logger
+
+logger = setup_api_logger("queries")
+
+
+async def query_counter_middleware(request: Request, call_next):
+    """
+    Cuenta las consultas SQL y el tiempo en base de datos de cada request,
+    los expone en headers `X-DB-*` y reporta los patrones N+1 en logs/queries.log.
+    """
+    route = f"{request.method} {request.url.path}"
+    with track_queries(route) as stats:
+        response = await call_next(request)
+
+    response.headers["X-DB-Query-Count"] = str(stats.count)
+    response.headers["X-DB-Query-Time-Ms"] = f"{stats.total_ms:.1f}"
+
+    repeated = stats.repeated()
+    if repeated:
+        response.headers["X-DB-N-Plus-One"] = str(len(repeated))
+        for statement, n in repeated:
+            logger.warning(f"Posible N+1 en {route}: {n} ejecuciones de: {statement}")
+
+    logger.debug(f"{route}: {stats.count} consultas, {stats.total_ms:.1f} ms en base de datos")
+    return response
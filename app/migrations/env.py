@@ -10,12 +10,16 @@ from sqlmodel import SQLModel
 
 # Importa explícitamente todos tus modelos aquí para que Alembic los vea
 # Ajusta estas rutas según la estructura de tu proyecto
-from models.users import User, Role  # Asegúrate de importar todos tus modelos
+from models import User, Role  # Importar models registra todas las tablas en SQLModel.metadata
+from config import settings
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
+# La URL sale de DATABASE_URL (SQLite o PostgreSQL), igual que la aplicación
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL.replace("%", "%%"))
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -71,7 +75,10 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite no soporta ALTER completo; autogenerate debe usar batch
+            render_as_batch=connection.dialect.name == "sqlite",
         )
 
         with context.begin_transaction():
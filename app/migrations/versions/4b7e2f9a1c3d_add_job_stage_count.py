@@ -0,0 +1,47 @@
+"""add_job_stage_count
+
+Revision ID: 4b7e2f9a1c3d
+Revises: cdc692568ccc
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+revision = '4b7e2f9a1c3d'
+down_revision = 'cdc692568ccc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'job_stage_count',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('stage_id', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['job.job_id']),
+        sa.ForeignKeyConstraint(['item_id'], ['item.item_id']),
+        sa.ForeignKeyConstraint(['stage_id'], ['stage.stage_id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('item_id', 'stage_id'),
+    )
+    op.create_index('ix_job_stage_count_job_id', 'job_stage_count', ['job_id'])
+
+    # Poblar los contadores con los Objects existentes
+    op.execute(
+        """
+        INSERT INTO job_stage_count (job_id, item_id, stage_id, count)
+        SELECT item.job_id, object.item_id, object.current_stage, COUNT(*)
+        FROM object JOIN item ON item.item_id = object.item_id
+        GROUP BY item.job_id, object.item_id, object.current_stage
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_job_stage_count_job_id', table_name='job_stage_count')
+    op.drop_table('job_stage_count')
@@ -0,0 +1,42 @@
+"""add_object_piece_number
+
+Revision ID: 8d1f5c2e7a94
+Revises: 4b7e2f9a1c3d
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+revision = '8d1f5c2e7a94'
+down_revision = '4b7e2f9a1c3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('object', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('piece_number', sa.Integer(), nullable=True))
+
+    # Numerar las piezas de cada Item en el orden de object_id, como lo hacía el OFFSET anterior
+    op.execute(
+        """
+        UPDATE object SET piece_number = numbered.rn
+        FROM (
+            SELECT object_id, ROW_NUMBER() OVER (PARTITION BY item_id ORDER BY object_id) AS rn
+            FROM object
+        ) AS numbered
+        WHERE numbered.object_id = object.object_id
+        """
+    )
+
+    with op.batch_alter_table('object', schema=None) as batch_op:
+        batch_op.alter_column('piece_number', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index('ix_object_item_id_piece_number', ['item_id', 'piece_number'], unique=True)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('object', schema=None) as batch_op:
+        batch_op.drop_index('ix_object_item_id_piece_number')
+        batch_op.drop_column('piece_number')
@@ -0,0 +1,36 @@
+"""add_hot_lookup_indexes
+
+Revision ID: c3a9e5d7f2b1
+Revises: 8d1f5c2e7a94
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+revision = 'c3a9e5d7f2b1'
+down_revision = '8d1f5c2e7a94'
+branch_labels = None
+depends_on = None
+
+# (nombre, tabla, columnas); object.item_id ya está cubierto por ix_object_item_id_piece_number
+INDEXES = [
+    ('ix_item_ocr', 'item', ['ocr']),
+    ('ix_item_job_id_item_name', 'item', ['job_id', 'item_name']),
+    ('ix_object_current_stage', 'object', ['current_stage']),
+    ('ix_defect_record_job_id_product_id', 'defect_record', ['job_id', 'product_id']),
+    ('ix_issue_process_id', 'issue', ['process_id']),
+    ('ix_defect_image_defect_record_id', 'defect_image', ['defect_record_id']),
+    ('ix_process_stage_process_id_order', 'process_stage', ['process_id', 'order']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,28 @@
+"""add_defect_image_variants
+
+Revision ID: e5b8d2a4c6f1
+Revises: c3a9e5d7f2b1
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+revision = 'e5b8d2a4c6f1'
+down_revision = 'c3a9e5d7f2b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Las imágenes existentes quedan en NULL hasta correr scripts.backfill_image_variants
+    with op.batch_alter_table('defect_image', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('thumbnail_url', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True))
+        batch_op.add_column(sa.Column('display_url', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('defect_image', schema=None) as batch_op:
+        batch_op.drop_column('display_url')
+        batch_op.drop_column('thumbnail_url')
@@ -0,0 +1,40 @@
+"""add_image_blob_store
+
+Revision ID: f2c7a1e9b3d5
+Revises: e5b8d2a4c6f1
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+revision = 'f2c7a1e9b3d5'
+down_revision = 'e5b8d2a4c6f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'image_blob',
+        sa.Column('sha256', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False),
+        sa.Column('extension', sqlmodel.sql.sqltypes.AutoString(length=10), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+    # Las imágenes existentes se pasan al store con `python -m scripts.image_store migrate`
+    with op.batch_alter_table('defect_image', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('blob_sha256', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=True))
+        batch_op.create_index('ix_defect_image_blob_sha256', ['blob_sha256'])
+        batch_op.create_foreign_key('fk_defect_image_blob_sha256', 'image_blob', ['blob_sha256'], ['sha256'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('defect_image', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_defect_image_blob_sha256', type_='foreignkey')
+        batch_op.drop_index('ix_defect_image_blob_sha256')
+        batch_op.drop_column('blob_sha256')
+    op.drop_table('image_blob')
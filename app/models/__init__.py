@@ -1,4 +1,5 @@
 from pydantic import EmailStr
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import SQLModel, Field, Relationship
 from typing import List, Optional
 from datetime import datetime, timezone
@@ -55,11 +56,13 @@ class ItemBase(SQLModel):
     area_superficial: float
     cantidad: int
     material: str = Field(default="Steel")
-    ocr: str = Field(max_length=255, nullable=False)
+    ocr: str = Field(max_length=255, nullable=False, index=True)
 
 
 
 class Item(ItemBase, table=True):
+    # job_id + item_name: items de un Job y resolución de ids en la ingesta
+    __table_args__ = (Index("ix_item_job_id_item_name", "job_id", "item_name"),)
     item_id: Optional[int] = Field(default=None, primary_key=True)
     job_id: int = Field(foreign_key="job.job_id", nullable=False)
     job: Job = Relationship(back_populates="items")
@@ -119,14 +122,17 @@ class ItemUpdate(ItemBase):
 
 # Modelos para la tabla Objects
 class ObjectBase(SQLModel):
-    current_stage: int = Field(foreign_key="stage.stage_id", default=1)
+    current_stage: int = Field(foreign_key="stage.stage_id", default=1, index=True)
     rework: int = Field(default=0)
     scrap: Optional[int]
 
 
 class Object(ObjectBase, table=True):
+    __table_args__ = (Index("ix_object_item_id_piece_number", "item_id", "piece_number", unique=True),)
     object_id: Optional[int] = Field(default=None, primary_key=True)
     item_id: int = Field(foreign_key="item.item_id", nullable=False)
+    # Número de pieza dentro del Item (1..cantidad), el sufijo "_N" del OCR escaneado
+    piece_number: int = Field(nullable=False)
     item: Item = Relationship(back_populates="related_objects")
 
         
@@ -150,9 +156,89 @@ class JobObjectsResponse(SQLModel):
     objects: list[ObjectDetails]
 
 
+# Actualización de stage en lote (escáner)
+class StageUpdateRequest(SQLModel):
+    ocr: str
+    new_stage_name: str
+
+
+class StageUpdateResult(SQLModel):
+    ocr: str
+    success: bool
+    object_id: Optional[int] = None
+    new_stage: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class BatchStageUpdateResponse(SQLModel):
+    updated: int
+    failed: int
+    results: list[StageUpdateResult]
+
+
+# Resolución de lecturas OCR contra Item.ocr (escáner)
+class OCRMatchRequest(SQLModel):
+    # Texto tal como lo devuelve /ocr (una línea por renglón)
+    text: str
+    job_code: Optional[str] = None
+    limit: int = Field(default=5, ge=1, le=50)
+
+
+class OCRCandidate(SQLModel):
+    item_id: int
+    ocr: str
+    item_name: str
+    job_code: str
+    score: float
+    piece_number: Optional[int] = None
+    piece_count: int
+    # "<ocr>_<pieza>", listo para /object/update_stage
+    scanned_ocr: Optional[str] = None
+
+
+class OCRMatchResponse(SQLModel):
+    candidates: list[OCRCandidate]
+    elapsed_ms: float
+
+
+# Escaneo en un paso: imagen -> OCR -> Item/pieza -> cambio de stage
+class ScannedObject(SQLModel):
+    object_id: int
+    item_id: int
+    piece_number: int
+    ocr: str
+    item_name: str
+    job_code: str
+    previous_stage: str
+    new_stage: str
+
+
+class ScanResponse(SQLModel):
+    updated: bool
+    lines: list[str]
+    object: Optional[ScannedObject] = None
+    score: Optional[float] = None
+    # Otros candidatos cuando la lectura no es exacta o no alcanzó para aplicar el cambio
+    alternatives: list[OCRCandidate] = []
+    detail: Optional[str] = None
+    timings_ms: dict[str, float] = {}
+
+
+# Contador de Objects por (job, item, stage), mantenido junto con los cambios a Object
+class JobStageCount(SQLModel, table=True):
+    __tablename__ = "job_stage_count"
+    __table_args__ = (UniqueConstraint("item_id", "stage_id"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="job.job_id", nullable=False, index=True)
+    item_id: int = Field(foreign_key="item.item_id", nullable=False)
+    stage_id: int = Field(foreign_key="stage.stage_id", nullable=False)
+    count: int = Field(default=0, nullable=False)
+
+
 # Tabla intermedia ProcessStage
 class ProcessStage(SQLModel, table=True):
     __tablename__ = "process_stage"
+    __table_args__ = (Index("ix_process_stage_process_id_order", "process_id", "order"),)
     id: Optional[int] = Field(default=None, primary_key=True)
     process_id: int = Field(foreign_key="process.process_id", nullable=False)
     stage_id: int = Field(foreign_key="stage.stage_id", nullable=False)
@@ -225,7 +311,7 @@ class IssueBase(SQLModel):
 
 class Issue(IssueBase, table=True):
     issue_id: Optional[int] = Field(default=None, primary_key=True)
-    process_id: int = Field(foreign_key="process.process_id", nullable=False)
+    process_id: int = Field(foreign_key="process.process_id", nullable=False, index=True)
     defect_records: list["DefectRecord"] = Relationship(back_populates="issue")
     process: "Process" = Relationship(back_populates="issues")
 
@@ -311,6 +397,7 @@ class DefectRecordBase(SQLModel):
 
 class DefectRecord(DefectRecordBase, table=True):
     __tablename__ = "defect_record"
+    __table_args__ = (Index("ix_defect_record_job_id_product_id", "job_id", "product_id"),)
     defect_record_id: int = Field(default=None, primary_key=True)
     # Relaciones
     product: "Product" = Relationship(back_populates="defect_records")
@@ -381,17 +468,35 @@ class DefectRecordResponse(SQLModel):
 #     PENDING = "pending"
 #     ERROR = "error"
 
+#==================================#
+# --- Image Blob ---
+#==================================#
+class ImageBlob(SQLModel, table=True):
+    """Archivo de imagen direccionado por contenido; ver services.image_storage."""
+    __tablename__ = "image_blob"
+    sha256: str = Field(primary_key=True, max_length=64)
+    extension: str = Field(max_length=10)
+    size: int = Field(nullable=False)
+    # Filas (DefectImage) que apuntan al archivo; en 0 lo borra `scripts.image_store gc`
+    ref_count: int = Field(default=0, nullable=False)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 #==================================#
 # --- Defect Image ---
 #==================================#
 class DefectImageBase(SQLModel):
     image_url: str = Field(max_length=255, nullable=False)
+    # Variantes livianas; None hasta que las genera services.image_variants
+    thumbnail_url: Optional[str] = Field(default=None, max_length=255)
+    display_url: Optional[str] = Field(default=None, max_length=255)
 
 class DefectImage(DefectImageBase, table=True):
     __tablename__ = "defect_image"
     defect_image_id: Optional[int] = Field(default=None, primary_key=True)
-    defect_record_id: int = Field(foreign_key="defect_record.defect_record_id")
+    defect_record_id: int = Field(foreign_key="defect_record.defect_record_id", index=True)
     image_type_id: int = Field(foreign_key="image_type.image_type_id")
+    # None en imágenes del árbol anterior aún no migradas (scripts.image_store migrate)
+    blob_sha256: Optional[str] = Field(default=None, foreign_key="image_blob.sha256", index=True, max_length=64)
     
     # Relaciones
     defect_record: DefectRecord = Relationship(back_populates="images")
@@ -408,6 +513,8 @@ class responseDefectImage(DefectImageBase):
     def from_orm(cls, defect_image: DefectImage):
         return cls(
             image_url=defect_image.image_url,
+            thumbnail_url=defect_image.thumbnail_url,
+            display_url=defect_image.display_url,
             type_name=defect_image.image_type.type_name
         )
     
@@ -1,14 +1,13 @@
 import os
 import shutil
 from typing import Optional
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile, status
-from sqlmodel import SQLModel, select, and_
-import time
+from fastapi import APIRouter, BackgroundTasks, File, Form, HTTPException, Query, Response, UploadFile, status
+from sqlmodel import SQLModel, func, select, and_
 from datetime import datetime, timezone
 from models import DefectImage, DefectImageCreate, DefectRecord, DefectRecordCreate, DefectRecordRead, DefectRecordUpdate, DefectRecordResponse, Job, Product, Process, Issue, User, Status, CorrectionProcess, CompleteDefectRecordResponse
-from db import SessionDep
-from sqlalchemy.orm import aliased
-from pathlib import Path
+from db import AsyncSessionDep
+from services import image_storage, image_variants
+from sqlalchemy.orm import aliased, joinedload, selectinload
 import logging
 import json
 
@@ -18,8 +17,40 @@ logger.setLevel(logging.DEBUG)
 
 router = APIRouter(prefix="/defect-records", tags=["Defect Records"])
 
+# Relaciones que serializa CompleteDefectRecordResponse; en async deben cargarse por adelantado.
+# Las muchos-a-uno van en JOINs de la misma consulta (no multiplican filas, así que
+# LIMIT/OFFSET siguen siendo correctos) y las imágenes en una sola consulta IN.
+COMPLETE_RECORD_OPTIONS = (
+    joinedload(DefectRecord.issue).joinedload(Issue.process),
+    joinedload(DefectRecord.product),
+    joinedload(DefectRecord.status),
+    joinedload(DefectRecord.inspector).joinedload(User.role),
+    joinedload(DefectRecord.issue_by_user).joinedload(User.role),
+    selectinload(DefectRecord.images).joinedload(DefectImage.image_type),
+)
+
+# Tamaño de página máximo de los listados de defect records
+MAX_PAGE_SIZE = 1000
+
+
+async def paginate(session, query, response: Response, skip: int, limit: Optional[int], *options) -> tuple[int, list]:
+    """
+    Cuenta el total de filas de `query`, lo expone en el header `X-Total-Count`
+    y devuelve (total, filas de la página) cargando las relaciones de `options`.
+    Sin `limit` devuelve todas las filas desde `skip`, como antes de paginar.
+    """
+    total = (await session.exec(select(func.count()).select_from(query.order_by(None).subquery()))).one()
+    response.headers["X-Total-Count"] = str(total)
+    if not total:
+        return 0, []
+    query = query.options(*options).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = (await session.exec(query)).all()
+    return total, rows
+
 @router.post("/add_defect_record", response_model=DefectRecord)
-def create_defect_record(defect_record: DefectRecordCreate, session: SessionDep, status_code = status.HTTP_201_CREATED):
+async def create_defect_record(defect_record: DefectRecordCreate, session: AsyncSessionDep, status_code = status.HTTP_201_CREATED):
     """
     ## Create a new defect record
 
@@ -77,32 +108,32 @@ def create_defect_record(defect_record: DefectRecordCreate, session: SessionDep,
     
     # Guarda en la base de datos
     session.add(db_defect_record)
-    session.commit()
-    session.refresh(db_defect_record)
+    await session.commit()
+    await session.refresh(db_defect_record)
     
     return db_defect_record
 
 @router.get("/", response_model=list[DefectRecordRead], status_code = status.HTTP_200_OK)
-def get_all_defect_records(
-    session: SessionDep,
+async def get_all_defect_records(
+    session: AsyncSessionDep,
     skip: int = 0,
     limit: int = 100
 ):
     # Obtiene todos los registros con paginación
-    defect_records = session.exec(
+    defect_records = (await session.exec(
         select(DefectRecord)
         .offset(skip)
         .limit(limit)
-    ).all()
+    )).all()
     return defect_records
 
 @router.get("/{defect_record_id}", response_model=DefectRecordRead, status_code = status.HTTP_200_OK)
-def get_defect_record(
+async def get_defect_record(
     defect_record_id: int, 
-    session: SessionDep
+    session: AsyncSessionDep
 ):
     # Busca por ID
-    defect_record = session.get(DefectRecord, defect_record_id)
+    defect_record = await session.get(DefectRecord, defect_record_id)
     if not defect_record:
         raise HTTPException(status_code=404, detail="Defect record not found")
     return defect_record
@@ -110,11 +141,34 @@ def get_defect_record(
 @router.get("/search/{job_code}/{product_name}", 
           response_model=list[DefectRecordResponse], 
           status_code=status.HTTP_200_OK)
-def search_defect_records(
+async def search_defect_records(
     job_code: str,
     product_name: str,
-    session: SessionDep
+    session: AsyncSessionDep,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)
 ):
+    """
+    ## Search defect records by job and product
+
+    Returns one flattened row per defect record (job, product, users, issue, process,
+    correction and status names) built with a single joined query.
+
+    ### Arguments:
+    - **job_code** (str): Job code.
+    - **product_name** (str): Product name.
+    - **skip** (int): Records to skip (default 0).
+    - **limit** (int, optional): Page size (max 1000). If omitted, all records from `skip` on are returned.
+
+    ### Returns:
+    - **list[DefectRecordResponse]**: Records ordered by id (one page when `limit` is
+      given). The total number of matching records is returned in the `X-Total-Count` header.
+
+    ### Raises:
+    - `HTTPException`:
+        - 404: No defect records found
+    """
     Inspector = aliased(User)
     Issuer = aliased(User)
     
@@ -146,22 +200,44 @@ def search_defect_records(
                 Product.product_name == product_name
             )
         )
+        .order_by(DefectRecord.defect_record_id)
     )
 
-    results = session.exec(query).all()
+    total, results = await paginate(session, query, response, skip, limit)
 
-    if not results:
+    if not total:
         raise HTTPException(status_code=404, detail="No defect records found")
 
     return results
 
 @router.get("/search/{job_code}/{product_name}/{process_name}", response_model=list[DefectRecordRead], status_code = status.HTTP_200_OK)
-def search_defect_records(
+async def search_defect_records(
     job_code: str,
     product_name: str,
     process_name: str,
-    session: SessionDep
+    session: AsyncSessionDep,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)
 ):
+    """
+    ## Search defect records by job, product and process
+
+    ### Arguments:
+    - **job_code** (str): Job code.
+    - **product_name** (str): Product name.
+    - **process_name** (str): Process of the record's issue.
+    - **skip** (int): Records to skip (default 0).
+    - **limit** (int, optional): Page size (max 1000). If omitted, all records from `skip` on are returned.
+
+    ### Returns:
+    - **list[DefectRecordRead]**: Records ordered by id (one page when `limit` is
+      given). The total number of matching records is returned in the `X-Total-Count` header.
+
+    ### Raises:
+    - `HTTPException`:
+        - 404: No defect records found
+    """
     # Realizamos la consulta usando select y joins
     query = (
         select(DefectRecord)
@@ -172,68 +248,91 @@ def search_defect_records(
         .where(Job.job_code == job_code)
         .where(Product.product_name == product_name)
         .where(Process.process_name == process_name)
+        .order_by(DefectRecord.defect_record_id)
     )
 
     # Ejecutamos la consulta
-    results = session.exec(query).all()
+    total, results = await paginate(session, query, response, skip, limit)
 
     # Si no encontramos resultados, lanzamos una excepción 404
-    if not results:
+    if not total:
         raise HTTPException(status_code=404, detail="No defect records found")
 
     return results
 
 
 @router.get("/complete/{job_serial}/{product_name}", response_model=list[CompleteDefectRecordResponse], status_code = status.HTTP_200_OK)
-def get_defect_code(
+async def get_defect_code(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
+    response: Response,
     job_serial: str,
-    product_name: str
+    product_name: str,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)
 ):
-    # Primero buscamos el producto por su nombre
-    product_query = select(Product).where(Product.product_name == product_name)
-    product = session.exec(product_query).first()
-    
-    if not product:
+    """
+    ## Get complete defect records for a job
+
+    Returns the defect records of a job with their issue and process, product, status,
+    images with their type, and inspector / responsible users with their role.
+
+    The relations are loaded eagerly, so a page always costs the same four queries
+    (job lookup, count, records with their many-to-one relations, images) regardless
+    of the number of records.
+
+    ### Arguments:
+    - **job_serial** (str): Job code.
+    - **product_name** (str): Product name.
+    - **skip** (int): Records to skip (default 0).
+    - **limit** (int, optional): Page size (max 1000). If omitted, all records from `skip` on are returned.
+
+    ### Returns:
+    - **list[CompleteDefectRecordResponse]**: Records ordered by id (one page when `limit`
+      is given). The total number of records is returned in the `X-Total-Count` header.
+
+    ### Raises:
+    - `HTTPException`:
+        - 404: Product not found, job not found, or the job has no defect records
+    """
+    # Producto y Job en una sola consulta; job_id queda en None si el Job no existe
+    ids = (await session.exec(
+        select(Product.product_id, Job.job_id)
+        .outerjoin(Job, and_(Job.product_id == Product.product_id, Job.job_code == job_serial))
+        .where(Product.product_name == product_name)
+    )).first()
+
+    if not ids:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    
-    # Luego buscamos el job por su código y producto_id
-    job_query = select(Job).where(
-        and_(
-            Job.job_code == job_serial,
-            Job.product_id == product.product_id
-        )
-    )
-    job = session.exec(job_query).first()
-    
-    if not job:
+
+    product_id, job_id = ids
+    if job_id is None:
         raise HTTPException(status_code=404, detail="Job no encontrado")
-    
-    # Finalmente, buscamos el defect_record asociado a este job
+
+    # Finalmente, buscamos los defect_records asociados a este job
     defect_query = select(DefectRecord).where(
         and_(
-            DefectRecord.job_id == job.job_id,
-            DefectRecord.product_id == product.product_id
+            DefectRecord.job_id == job_id,
+            DefectRecord.product_id == product_id
         )
-    )
-    defect_records = session.exec(defect_query).all()
-    
-    if not defect_records:
+    ).order_by(DefectRecord.defect_record_id)
+    total, defect_records = await paginate(session, defect_query, response, skip, limit, *COMPLETE_RECORD_OPTIONS)
+
+    if not total:
         raise HTTPException(status_code=404, detail="No se encontraron registros de defectos")
-    
+
     # Retornamos los defect_records
     return defect_records
 
     
 @router.put("/{defect_record_id}", response_model=DefectRecordRead, status_code = status.HTTP_202_ACCEPTED)
-def update_defect_record(
+async def update_defect_record(
     defect_record_id: int,
     defect_record_data: DefectRecordUpdate,
-    session: SessionDep
+    session: AsyncSessionDep
 ):
     # Obtiene el registro existente
-    db_defect_record = session.get(DefectRecord, defect_record_id)
+    db_defect_record = await session.get(DefectRecord, defect_record_id)
     if not db_defect_record:
         raise HTTPException(status_code=404, detail="Defect record not found")
     
@@ -246,26 +345,53 @@ def update_defect_record(
     db_defect_record.updated_at = datetime.now(datetime.timezone.utc)
     
     session.add(db_defect_record)
-    session.commit()
-    session.refresh(db_defect_record)
+    await session.commit()
+    await session.refresh(db_defect_record)
     
     return db_defect_record
 
 @router.delete("/{defect_record_id}", status_code = status.HTTP_204_NO_CONTENT)
-def delete_defect_record(
+async def delete_defect_record(
     defect_record_id: int,
-    session: SessionDep
+    session: AsyncSessionDep
 ):
     # Busca y elimina el registro
-    defect_record = session.get(DefectRecord, defect_record_id)
+    defect_record = await session.get(DefectRecord, defect_record_id)
     if not defect_record:
         raise HTTPException(status_code=404, detail="Defect record not found")
     
-    session.delete(defect_record)
-    session.commit()
+    # Sus imágenes se borran con él y liberan su referencia en el store
+    images = (await session.exec(select(DefectImage).where(DefectImage.defect_record_id == defect_record_id))).all()
+    await image_storage.release_references(session, [image.blob_sha256 for image in images])
+    for image in images:
+        await session.delete(image)
+    await session.delete(defect_record)
+    await session.commit()
     
     return {"message": "Defect record deleted successfully"}
 
+async def add_defect_images(session, defect_record: DefectRecord,
+                            uploads: dict[str, Optional[list[UploadFile]]]) -> list[image_storage.StoredImage]:
+    """
+    Guarda en el store las imágenes subidas (kind -> archivos), agrega sus
+    DefectImage a la sesión y suma sus referencias. Responde 413 si alguna
+    supera IMAGE_MAX_BYTES.
+    """
+    try:
+        stored = await image_storage.save_images(uploads)
+    except image_storage.ImageTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    for image in stored:
+        session.add(DefectImage(
+            defect_record_id=defect_record.defect_record_id,
+            image_type_id=image.image_type_id,
+            image_url=image.url,
+            blob_sha256=image.sha256,
+        ))
+        logger.debug(f"Saved {image.kind} image ({image.size} bytes, new={image.created}): {image.url}")
+    await image_storage.add_references(session, [image.blob for image in stored])
+    return stored
+
 # Definición del modelo de respuesta
 class DefectRecordCreationResponse(SQLModel):
     defect_record_id: int
@@ -278,7 +404,8 @@ class DefectRecordCreationResponse(SQLModel):
 @router.post("/create-defect-record", response_model=DefectRecordCreationResponse, status_code=status.HTTP_201_CREATED)
 async def create_defect_record(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
+    background_tasks: BackgroundTasks,
     product_id: int = Form(...),
     job_id: int = Form(...),
     inspector_user_id: int = Form(...),
@@ -293,7 +420,16 @@ async def create_defect_record(
     Crea un nuevo registro de defecto con sus imágenes asociadas.
     Permite subir múltiples imágenes de defecto y ubicación.
     """
-    # 1. Crear el registro de defecto
+    # 1. Validar producto y job antes de crear nada
+    product = await session.get(Product, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+    job = await session.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+
+    # 2. Crear el registro de defecto (flush para obtener su id)
     defect_record_data = DefectRecordCreate(
         product_id=product_id,
         job_id=job_id,
@@ -306,97 +442,26 @@ async def create_defect_record(
     
     defect_record = DefectRecord.model_validate(defect_record_data)
     session.add(defect_record)
-    session.commit()
-    session.refresh(defect_record)
-    
-    # 2. Obtener información adicional para construir la ruta
-    product_query = select(Product).where(Product.product_id == product_id)
-    product = session.exec(product_query).first()
-    
-    if not product:
-        raise HTTPException(status_code=404, detail="Producto no encontrado")
-    
-    job_query = select(Job).where(Job.job_id == job_id)
-    job = session.exec(job_query).first()
-    
-    if not job:
-        raise HTTPException(status_code=404, detail="Job no encontrado")
-    
-    # 3. Construir la ruta base para guardar las imágenes
-    # IMPORTANTE: Usar una ruta relativa desde la raíz del proyecto
-    defect_folder_name = f"{product.product_name}_{job.job_code}_{defect_record.defect_record_id}"
-    base_path = Path.cwd() / "static" / "punch_list" / product.product_name / job.job_code / defect_folder_name
-    
-    # Asegurarse de que existen todos los directorios
-    (base_path / "defect_image").mkdir(parents=True, exist_ok=True)
-    (base_path / "location_image").mkdir(parents=True, exist_ok=True)
-    
-    # 4. Guardar las imágenes
-    defect_image_urls = []
-    location_image_urls = []
-    
-    # 4.1 Guardar las imágenes de defecto (DEFECT IMAGE, id=3)
-    for i, defect_image in enumerate(defect_images):
-        timestamp = int(time.time() * 1000) + i  # Añadir índice para garantizar unicidad
-        file_extension = Path(defect_image.filename).suffix if defect_image.filename else ".jpg"
-        defect_image_filename = f"defect_{timestamp}{file_extension}"
-        defect_image_path = base_path / "defect_image" / defect_image_filename
-        
-        # Guardar el archivo
-        with open(defect_image_path, "wb") as f:
-            content = await defect_image.read()
-            f.write(content)
-        await defect_image.seek(0)  # Reset file pointer
-        
-        # URL para guardar en la base de datos (ruta relativa desde el directorio static)
-        relative_url = f"/static/punch_list/{product.product_name}/{job.job_code}/{defect_folder_name}/defect_image/{defect_image_filename}"
-        
-        # Crear registro en la base de datos para la imagen de defecto
-        defect_image_data = DefectImageCreate(
-            defect_record_id=defect_record.defect_record_id,
-            image_type_id=3,  # DEFECT IMAGE
-            image_url=relative_url
-        )
-        defect_image_db = DefectImage.model_validate(defect_image_data)
-        session.add(defect_image_db)
-        defect_image_urls.append(relative_url)
-    
-    # 4.2 Guardar las imágenes de ubicación (LOCATION IMAGE, id=2)
-    for i, location_image in enumerate(location_images):
-        timestamp = int(time.time() * 1000) + i  # Añadir índice para garantizar unicidad
-        file_extension = Path(location_image.filename).suffix if location_image.filename else ".jpg"
-        location_image_filename = f"location_{timestamp}{file_extension}"
-        location_image_path = base_path / "location_image" / location_image_filename
-        
-        # Guardar el archivo
-        with open(location_image_path, "wb") as f:
-            content = await location_image.read()
-            f.write(content)
-        await location_image.seek(0)  # Reset file pointer
-        
-        # URL para guardar en la base de datos (ruta relativa desde el directorio static)
-        relative_url = f"/static/punch_list/{product.product_name}/{job.job_code}/{defect_folder_name}/location_image/{location_image_filename}"
-        
-        # Crear registro en la base de datos para la imagen de ubicación
-        location_image_data = DefectImageCreate(
-            defect_record_id=defect_record.defect_record_id,
-            image_type_id=2,  # LOCATION IMAGE
-            image_url=relative_url
-        )
-        location_image_db = DefectImage.model_validate(location_image_data)
-        session.add(location_image_db)
-        location_image_urls.append(relative_url)
-    
-    # Confirmar cambios en la base de datos
-    session.commit()
-    
-    # 5. Preparar respuesta
+    await session.flush()
+    
+    # 3. Guardar las imágenes y registrarlas; el registro y sus imágenes se confirman juntos
+    stored = await add_defect_images(session, defect_record, {
+        "defect": defect_images,
+        "location": location_images,
+    })
+    # Si el commit falla los blobs nuevos quedan sin fila; los recoge `scripts.image_store gc`
+    await session.commit()
+    if stored:
+        # Miniaturas y versión de pantalla, después de responder
+        background_tasks.add_task(image_variants.generate_record_variants, defect_record.defect_record_id)
+    
+    # 4. Preparar respuesta
     response = DefectRecordCreationResponse(
         defect_record_id=defect_record.defect_record_id,
         product_name=product.product_name,
         job_code=job.job_code,
-        defect_images=defect_image_urls,
-        location_images=location_image_urls
+        defect_images=[image.url for image in stored if image.kind == "defect"],
+        location_images=[image.url for image in stored if image.kind == "location"]
     )
     
     return response    
@@ -412,7 +477,8 @@ class DefectRecordUpdateResponse(SQLModel):
 @router.patch("/defect-record/{defect_record_id}", response_model=DefectRecordUpdateResponse, status_code=status.HTTP_200_OK)
 async def update_defect_record(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
+    background_tasks: BackgroundTasks,
     defect_record_id: int,
     product_id: Optional[int] = Form(None),
     job_id: Optional[int] = Form(None),
@@ -469,7 +535,7 @@ async def update_defect_record(
 
     # 1. Buscar el registro de defecto existente
     defect_record_query = select(DefectRecord).where(DefectRecord.defect_record_id == defect_record_id)
-    defect_record = session.exec(defect_record_query).first()
+    defect_record = (await session.exec(defect_record_query)).first()
     
     if not defect_record:
         logger.error(f"Registro de defecto no encontrado: {defect_record_id}")
@@ -484,7 +550,7 @@ async def update_defect_record(
     if product_id is not None:
         # Verificar que el producto existe
         product_query = select(Product).where(Product.product_id == product_id)
-        product = session.exec(product_query).first()
+        product = (await session.exec(product_query)).first()
         if not product:
             logger.error(f"Producto no encontrado: {product_id}")
             raise HTTPException(status_code=404, detail="Producto no encontrado")
@@ -494,7 +560,7 @@ async def update_defect_record(
     if job_id is not None:
         # Verificar que el job existe
         job_query = select(Job).where(Job.job_id == job_id)
-        job = session.exec(job_query).first()
+        job = (await session.exec(job_query)).first()
         if not job:
             logger.error(f"Job no encontrado: {job_id}")
             raise HTTPException(status_code=404, detail="Job no encontrado")
@@ -512,7 +578,7 @@ async def update_defect_record(
     if issue_id is not None:
         # Verificar que el issue existe
         issue_query = select(Issue).where(Issue.issue_id == issue_id)
-        issue = session.exec(issue_query).first()
+        issue = (await session.exec(issue_query)).first()
         if not issue:
             logger.error(f"Issue no encontrado: {issue_id}")
             raise HTTPException(status_code=404, detail="Issue no encontrado")
@@ -522,7 +588,7 @@ async def update_defect_record(
     if correction_process_id is not None:
         # Verificar que el correction process existe
         cp_query = select(CorrectionProcess).where(CorrectionProcess.correction_process_id == correction_process_id)
-        cp = session.exec(cp_query).first()
+        cp = (await session.exec(cp_query)).first()
         if not cp:
             logger.error(f"Proceso de corrección no encontrado: {correction_process_id}")
             raise HTTPException(status_code=404, detail="Proceso de corrección no encontrado")
@@ -532,7 +598,7 @@ async def update_defect_record(
     if status_id is not None:
         # Verificar que el status existe
         status_query = select(Status).where(Status.status_id == status_id)
-        status = session.exec(status_query).first()
+        status = (await session.exec(status_query)).first()
         if not status:
             logger.error(f"Estado no encontrado: {status_id}")
             raise HTTPException(status_code=404, detail="Estado no encontrado")
@@ -556,173 +622,43 @@ async def update_defect_record(
         setattr(defect_record, key, value)
     
     # 4. Procesar nuevas imágenes si se proporcionan
-    defect_image_urls = []
-    location_image_urls = []
-    solved_image_urls = []
-    
-    # Obtener información necesaria para construir la ruta de las imágenes
-    product = defect_record.product
-    job = defect_record.job
+    # En async no hay lazy loading: se cargan con los ids ya actualizados
+    product = await session.get(Product, defect_record.product_id)
+    job = await session.get(Job, defect_record.job_id)
     
     logger.debug(f"Product info: {product.product_name}")
     logger.debug(f"Job info: {job.job_code}")
     
-    if defect_images or location_images or solved_images:
-        # Construir la ruta base para guardar las imágenes
-        defect_folder_name = f"{product.product_name}_{job.job_code}_{defect_record.defect_record_id}"
-        base_path = Path.cwd() / "static" / "punch_list" / product.product_name / job.job_code / defect_folder_name
-        
-        logger.debug(f"Image base path: {base_path}")
-        
-        # Asegurarse de que existen todos los directorios
-        (base_path / "defect_image").mkdir(parents=True, exist_ok=True)
-        (base_path / "location_image").mkdir(parents=True, exist_ok=True)
-        (base_path / "solved_image").mkdir(parents=True, exist_ok=True)
-        
-        # 4.1 Guardar las nuevas imágenes de defecto (DEFECT IMAGE, id=3)
-        if defect_images:
-            logger.debug(f"Processing {len(defect_images)} defect images")
-            for i, defect_image in enumerate(defect_images):
-                # Saltar archivos vacíos
-                if defect_image.filename == "":
-                    logger.debug(f"Skipping empty defect image at index {i}")
-                    continue
-                    
-                timestamp = int(time.time() * 1000) + i  # Añadir índice para garantizar unicidad
-                file_extension = Path(defect_image.filename).suffix if defect_image.filename else ".jpg"
-                defect_image_filename = f"defect_{timestamp}{file_extension}"
-                defect_image_path = base_path / "defect_image" / defect_image_filename
-                
-                logger.debug(f"Saving defect image {i+1}: {defect_image_filename}")
-                
-                # Guardar el archivo
-                try:
-                    with open(defect_image_path, "wb") as f:
-                        content = await defect_image.read()
-                        f.write(content)
-                    await defect_image.seek(0)  # Reset file pointer
-                    logger.debug(f"Saved defect image: {defect_image_path}")
-                except Exception as e:
-                    logger.error(f"Error saving defect image: {str(e)}")
-                    continue
-                
-                # URL para guardar en la base de datos (ruta relativa desde el directorio static)
-                relative_url = f"/static/punch_list/{product.product_name}/{job.job_code}/{defect_folder_name}/defect_image/{defect_image_filename}"
-                
-                # Crear registro en la base de datos para la imagen de defecto
-                defect_image_data = DefectImageCreate(
-                    defect_record_id=defect_record.defect_record_id,
-                    image_type_id=3,  # DEFECT IMAGE
-                    image_url=relative_url
-                )
-                defect_image_db = DefectImage.model_validate(defect_image_data)
-                session.add(defect_image_db)
-                defect_image_urls.append(relative_url)
-                logger.debug(f"Added defect image to database: {relative_url}")
-        
-        # 4.2 Guardar las nuevas imágenes de ubicación (LOCATION IMAGE, id=2)
-        if location_images:
-            logger.debug(f"Processing {len(location_images)} location images")
-            for i, location_image in enumerate(location_images):
-                # Saltar archivos vacíos
-                if location_image.filename == "":
-                    logger.debug(f"Skipping empty location image at index {i}")
-                    continue
-                    
-                timestamp = int(time.time() * 1000) + i  # Añadir índice para garantizar unicidad
-                file_extension = Path(location_image.filename).suffix if location_image.filename else ".jpg"
-                location_image_filename = f"location_{timestamp}{file_extension}"
-                location_image_path = base_path / "location_image" / location_image_filename
-                
-                logger.debug(f"Saving location image {i+1}: {location_image_filename}")
-                
-                # Guardar el archivo
-                try:
-                    with open(location_image_path, "wb") as f:
-                        content = await location_image.read()
-                        f.write(content)
-                    await location_image.seek(0)  # Reset file pointer
-                    logger.debug(f"Saved location image: {location_image_path}")
-                except Exception as e:
-                    logger.error(f"Error saving location image: {str(e)}")
-                    continue
-                
-                # URL para guardar en la base de datos (ruta relativa desde el directorio static)
-                relative_url = f"/static/punch_list/{product.product_name}/{job.job_code}/{defect_folder_name}/location_image/{location_image_filename}"
-                
-                # Crear registro en la base de datos para la imagen de ubicación
-                location_image_data = DefectImageCreate(
-                    defect_record_id=defect_record.defect_record_id,
-                    image_type_id=2,  # LOCATION IMAGE
-                    image_url=relative_url
-                )
-                location_image_db = DefectImage.model_validate(location_image_data)
-                session.add(location_image_db)
-                location_image_urls.append(relative_url)
-                logger.debug(f"Added location image to database: {relative_url}")
-                
-        # 4.3 Guardar las nuevas imágenes de solución (SOLVED IMAGE, id=1)
-        if solved_images:
-            logger.debug(f"Processing {len(solved_images)} solved images")
-            for i, solved_image in enumerate(solved_images):
-                # Saltar archivos vacíos
-                if solved_image.filename == "":
-                    logger.debug(f"Skipping empty solved image at index {i}")
-                    continue
-                    
-                timestamp = int(time.time() * 1000) + i  # Añadir índice para garantizar unicidad
-                file_extension = Path(solved_image.filename).suffix if solved_image.filename else ".jpg"
-                solved_image_filename = f"solved_{timestamp}{file_extension}"
-                solved_image_path = base_path / "solved_image" / solved_image_filename
-                
-                logger.debug(f"Saving solved image {i+1}: {solved_image_filename}")
-                
-                # Guardar el archivo
-                try:
-                    with open(solved_image_path, "wb") as f:
-                        content = await solved_image.read()
-                        f.write(content)
-                    await solved_image.seek(0)  # Reset file pointer
-                    logger.debug(f"Saved solved image: {solved_image_path}")
-                except Exception as e:
-                    logger.error(f"Error saving solved image: {str(e)}")
-                    continue
-                
-                # URL para guardar en la base de datos (ruta relativa desde el directorio static)
-                relative_url = f"/static/punch_list/{product.product_name}/{job.job_code}/{defect_folder_name}/solved_image/{solved_image_filename}"
-                
-                # Crear registro en la base de datos para la imagen de solución
-                solved_image_data = DefectImageCreate(
-                    defect_record_id=defect_record.defect_record_id,
-                    image_type_id=1,  # SOLVED IMAGE
-                    image_url=relative_url
-                )
-                solved_image_db = DefectImage.model_validate(solved_image_data)
-                session.add(solved_image_db)
-                solved_image_urls.append(relative_url)
-                logger.debug(f"Added solved image to database: {relative_url}")
+    stored = await add_defect_images(session, defect_record, {
+        "defect": defect_images,
+        "location": location_images,
+        "solved": solved_images,
+    })
     
     # 5. Confirmar los cambios en la base de datos
     logger.debug("Committing changes to database")
     try:
-        session.commit()
-        session.refresh(defect_record)
+        await session.commit()
+        await session.refresh(defect_record)
         logger.debug("Database commit successful")
     except Exception as e:
         logger.error(f"Error committing to database: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error al guardar los cambios: {str(e)}")
+    if stored:
+        background_tasks.add_task(image_variants.generate_record_variants, defect_record.defect_record_id)
     
     # 6. Preparar la respuesta
-    logger.debug(f"Preparing response with {len(defect_image_urls)} defect images, {len(location_image_urls)} location images, and {len(solved_image_urls)} solved images")
+    urls = {kind: [image.url for image in stored if image.kind == kind] for kind in ("defect", "location", "solved")}
+    logger.debug(f"Preparing response with {len(urls['defect'])} defect images, {len(urls['location'])} location images, and {len(urls['solved'])} solved images")
     
     # 7. Preparar la respuesta usando el modelo definido
     response = DefectRecordUpdateResponse(
         defect_record_id=defect_record.defect_record_id,
         product_name=product.product_name,
         job_code=job.job_code,
-        defect_images=defect_image_urls,
-        location_images=location_image_urls,
-        solved_images=solved_image_urls
+        defect_images=urls["defect"],
+        location_images=urls["location"],
+        solved_images=urls["solved"]
     )
     
     logger.debug(f"Response prepared: defect_record_id={response.defect_record_id}")
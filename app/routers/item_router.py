@@ -1,8 +1,11 @@
 from fastapi import HTTPException
 from db import SessionDep
 from fastapi import APIRouter, status
+from sqlalchemy import delete
 from sqlmodel import select
 from models import Item, Object
+from services.ocr_matcher import ocr_index
+from services.progress_service import delete_item_counts
 
 
 router = APIRouter(
@@ -129,11 +132,13 @@ def delete_item(item_id: int, session: SessionDep):
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="El Item no existe.")
 
-    # Eliminar los Objects relacionados al Item
-    session.exec(select(Object).where(Object.item_id == item.item_id)).delete()
+    # Eliminar los Objects relacionados al Item y sus contadores de progreso
+    session.exec(delete(Object).where(Object.item_id == item.item_id))
+    delete_item_counts(session, item.item_id)
 
     # Eliminar el Item
     session.delete(item)
     session.commit()
+    ocr_index.remove([item_id])
 
     return {"message": f"El Item con ID '{item_id}' y todos los Objects relacionados fueron eliminados exitosamente."}
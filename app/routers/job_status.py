@@ -1,6 +1,10 @@
 from fastapi import APIRouter, HTTPException, status
+from sqlalchemy import delete
 from sqlmodel import select
-from db import SessionDep
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db import AsyncSessionDep
+from services.ocr_matcher import ocr_index
+from services.progress_service import delete_job_counts, get_job_counts
 from models import Job, Item, JobStatus, ProcessStage, StageStatus, ItemStageStatus, Object, Stage, Process
 from sqlmodel import SQLModel
 import logging
@@ -26,6 +30,25 @@ router = APIRouter(
     tags=["Jobs"]
 )
 
+async def get_process_routes(session: AsyncSession, job_id: int) -> dict[int, list[tuple[int, str]]]:
+    """
+    Devuelve la ruta de stages (stage_id, stage_name), ordenada, de cada
+    proceso usado por los Items del Job, en una sola consulta.
+    """
+    rows = (await session.exec(
+        select(ProcessStage.process_id, Stage.stage_id, Stage.stage_name)
+        .join(Stage, Stage.stage_id == ProcessStage.stage_id)
+        .where(ProcessStage.process_id.in_(
+            select(Item.process_id).where(Item.job_id == job_id).distinct()
+        ))
+        .order_by(ProcessStage.process_id, ProcessStage.order, ProcessStage.id)
+    )).all()
+    routes: dict[int, list[tuple[int, str]]] = {}
+    for process_id, stage_id, stage_name in rows:
+        routes.setdefault(process_id, []).append((stage_id, stage_name))
+    return routes
+
+
 @router.get("/{job_code}/status", response_model=JobStatus,
         summary="Get the status of objects in a job",
         response_description="Returns the status of objects in the specified job",
@@ -35,7 +58,7 @@ router = APIRouter(
             404: {"description": "Job or related items not found"},
         },
     )
-def get_job_status(job_code: str, session: SessionDep):
+async def get_job_status(job_code: str, session: AsyncSessionDep):
     """
     ## Endpoint to retrieve the status of objects in a job
 
@@ -101,134 +124,81 @@ def get_job_status(job_code: str, session: SessionDep):
     ### Workflow:
     1. Verify that the job exists.
     2. Retrieve all items related to the job.
-    3. For each item, analyze the progress across its stages.
-    4. Calculate the completion ratio and status for each item in each stage.
-    5. Return the job status with detailed progress information.
+    3. Load the stage route of every process used by the job (one query).
+    4. Read the per-(item, stage) object counters of the job (one query).
+    5. Calculate the completion ratio and status for each item in each stage.
+    6. Return the job status with detailed progress information.
     """
     logger.info(f"Procesando solicitud para job_code: {job_code}")
 
     # Verificar que el Job existe
-    logger.debug(f"Consultando job con job_code: {job_code}")
-    job = session.exec(select(Job).where(Job.job_code == job_code)).first()
-    job_id = session.exec(select(Job.job_id).where(Job.job_code == job_code)).first()
-    
+    job = (await session.exec(select(Job).where(Job.job_code == job_code))).first()
     if not job:
         logger.warning(f"Job no encontrado para job_code: {job_code}")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="El Job no existe.")
-    
-    logger.info(f"Job encontrado - job_id: {job_id}, job_code: {job_code}")
 
     # Obtener todos los Items relacionados al Job
-    logger.debug(f"Obteniendo items para job_id: {job_id}")
-    items = session.exec(select(Item).where(Item.job_id == job_id)).all()
-    
+    items = (await session.exec(
+        select(Item.item_id, Item.item_name, Item.ocr, Item.process_id)
+        .where(Item.job_id == job.job_id)
+        .order_by(Item.item_id)
+    )).all()
     if not items:
-        logger.warning(f"No se encontraron items para job_id: {job_id}")
+        logger.warning(f"No se encontraron items para job_id: {job.job_id}")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No se encontraron Items relacionados al Job.")
-    
-    logger.info(f"Se encontraron {len(items)} items para job_id: {job_id}")
-    
-    # Log de características de los items
-    for i, item in enumerate(items):
-        logger.debug(f"Item {i+1}: item_id={item.item_id}, item_name={item.item_name}, ocr={item.ocr}")
-        logger.debug(f"Item {i+1} stage_names: {item.stage_names}, stage_ids: {item.stage_ids}")
+
+    routes = await get_process_routes(session, job.job_id)
+    counts = await session.run_sync(get_job_counts, job.job_id)
+    logger.info(f"Job {job_code}: {len(items)} items, {len(routes)} procesos")
 
     # Diccionario para almacenar el progreso por estación
     progress_data = {}
-    logger.debug("Obteniendo todas las etapas")
-    stages = session.exec(select(Stage)).all()
-    logger.debug(f"Total de etapas en el sistema: {len(stages)}")
-
     for item in items:
-        logger.info(f"Procesando item: {item.item_name} (item_id: {item.item_id})")
-        
-        # Obtener los objetos relacionados al Item
-        logger.debug(f"Consultando objetos para item_id: {item.item_id}")
-        objects = session.exec(select(Object).where(Object.item_id == item.item_id)).all()
-        logger.info(f"Se encontraron {len(objects)} objetos para item_id: {item.item_id}")
-        
-        # Log de objetos encontrados
-        for i, obj in enumerate(objects):
-            logger.debug(f"Objeto {i+1}: object_id={obj.object_id}, current_stage={obj.current_stage}")
-
-        process_stages = item.stage_names  # ["CUTTING","MACHINING"]
-        process_ids = item.stage_ids
-        logger.debug(f"Etapas del proceso para item {item.item_name}: {process_stages}")
-        logger.debug(f"IDs de las etapas: {process_ids}")
-
-        # Analizar cada estación
-        for stage_name, stage in zip(process_stages, process_ids):
-            logger.info(f"Analizando etapa: {stage_name} (stage_id: {stage}) para item: {item.item_name}")
-
-            if stage_name not in progress_data:
-                logger.debug(f"Inicializando diccionario para la etapa: {stage_name}")
-                progress_data[stage_name] = {}
-
-            # Inicializar datos para el item en esta etapa
-            if item.item_name not in progress_data[stage_name]:
-                logger.debug(f"Inicializando datos para item {item.item_name} en etapa {stage_name}")
-                progress_data[stage_name][item.item_name] = {"completed": 0, "pending": 0, "ocr": item.ocr, "ratio": "", "status": False}
-            
-            # Log de estado inicial
-            logger.debug(f"Estado inicial para {item.item_name} en {stage_name}: {progress_data[stage_name][item.item_name]}")
-
-            # Analizar cada objeto y determinar su estado en la etapa
-            for obj in objects:
-                try:
-                    logger.debug(f"Analizando objeto: {obj.object_id}, current_stage: {obj.current_stage}, etapa destino: {stage}")
-                    
-                    if obj.current_stage == 1:
-                        logger.debug(f"Objeto {obj.object_id} en etapa inicial (1), marcado como pendiente en {stage_name}")
-                        progress_data[stage_name][item.item_name]["pending"] += 1
-
-                    elif process_ids.index(obj.current_stage) >= process_ids.index(stage):
-                        logger.debug(f"Objeto {obj.object_id} ya pasó por la etapa {stage_name}, marcado como completado")
-                        progress_data[stage_name][item.item_name]["completed"] += 1
-                    else:
-                        logger.debug(f"Objeto {obj.object_id} aún no llegó a la etapa {stage_name}, marcado como pendiente")
-                        progress_data[stage_name][item.item_name]["pending"] += 1
-                except Exception as e:
-                    logger.error(f"Error al procesar el objeto {obj.object_id} en etapa {stage_name}: {str(e)}")
-                    logger.error(f"process_stages: {process_stages}")
-                    logger.error(f"process_ids: {process_ids}")
-                    logger.error(f"current_stage: {obj.current_stage}")
-                    logger.error(f"stage: {stage}")
-            
-            # Cálculo de ratio
-            completed = progress_data[stage_name][item.item_name]["completed"]
-            pending = progress_data[stage_name][item.item_name]["pending"]
-            total = completed + pending
-            
-            logger.debug(f"Etapa {stage_name}, Item {item.item_name}: completed={completed}, pending={pending}, total={total}")
-            
-            progress_data[stage_name][item.item_name]["ratio"] = f'{completed}/{total}'
-            
-            if int(pending) == 0:
-                logger.debug(f"Todos los objetos completados para {item.item_name} en etapa {stage_name}")
-                progress_data[stage_name][item.item_name]["status"] = True
-            
-            # Log de estado final
-            logger.debug(f"Estado final para {item.item_name} en {stage_name}: {progress_data[stage_name][item.item_name]}")
+        route = routes.get(item.process_id, [])
+        # Posición de cada stage dentro del proceso (primera aparición)
+        position = {}
+        for index, (stage_id, _) in enumerate(route):
+            position.setdefault(stage_id, index)
+        item_counts = counts.get(item.item_id, {})
+
+        for stage_name, stage_id in ((name, sid) for sid, name in route):
+            stage_data = progress_data.setdefault(stage_name, {})
+            if item.item_name not in stage_data:
+                stage_data[item.item_name] = {"completed": 0, "pending": 0, "ocr": item.ocr, "ratio": "", "status": False}
+            data = stage_data[item.item_name]
+
+            for current_stage, count in item_counts.items():
+                # Los objetos en la etapa inicial (1) siempre están pendientes;
+                # los que están en una etapa fuera del proceso no se cuentan
+                if current_stage == 1:
+                    data["pending"] += count
+                elif current_stage not in position:
+                    logger.error(f"Etapa {current_stage} de item {item.item_id} no pertenece a su proceso")
+                elif position[current_stage] >= position[stage_id]:
+                    data["completed"] += count
+                else:
+                    data["pending"] += count
+
+            data["ratio"] = f'{data["completed"]}/{data["completed"] + data["pending"]}'
+            if int(data["pending"]) == 0:
+                data["status"] = True
 
     # Construir la respuesta
-    logger.info("Construyendo respuesta final")
-    stages = []
-    for stage_name, items_data in progress_data.items():
-        logger.debug(f"Añadiendo datos de etapa {stage_name} a la respuesta")
-        stages.append(
-            StageStatus(
-                stage_name=stage_name,
-                items=[
-                    ItemStageStatus(
-                        item_name=item_name,
-                        item_ocr=data["ocr"],
-                        ratio=data["ratio"],
-                        status=data["status"]
-                    )
-                    for item_name, data in items_data.items()
-                ]
-            )
+    stages = [
+        StageStatus(
+            stage_name=stage_name,
+            items=[
+                ItemStageStatus(
+                    item_name=item_name,
+                    item_ocr=data["ocr"],
+                    ratio=data["ratio"],
+                    status=data["status"]
+                )
+                for item_name, data in items_data.items()
+            ]
         )
+        for stage_name, items_data in progress_data.items()
+    ]
 
     response = JobStatus(
         job_code=job.job_code,
@@ -247,7 +217,7 @@ def get_job_status(job_code: str, session: SessionDep):
             404: {"description": "Job not found"},
         },
     )
-async def delete_job(job_code: str, session: SessionDep):
+async def delete_job(job_code: str, session: AsyncSessionDep):
     """
     ## Endpoint to delete a job and its related items and objects
 
@@ -275,34 +245,33 @@ async def delete_job(job_code: str, session: SessionDep):
 
     ### Workflow:
     1. Verify that the job exists.
-    2. Retrieve all items related to the job.
-    3. Delete all objects related to each item.
-    4. Delete all items related to the job.
+    2. Retrieve the ids of the items related to the job.
+    3. Delete the objects of those items with a single bulk delete.
+    4. Delete the items with a single bulk delete.
     5. Delete the job.
     6. Commit the changes to the database.
     """
     # Verificar si el Job existe
-    job = session.exec(select(Job).where(Job.job_code == job_code)).first()
+    job = (await session.exec(select(Job).where(Job.job_code == job_code))).first()
     if not job:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="El Job no existe.")
 
     # Obtener los Items relacionados al Job
-    items = session.exec(select(Item).where(Item.job_id == job.job_id)).all()
+    item_ids = (await session.exec(select(Item.item_id).where(Item.job_id == job.job_id))).all()
 
-    # Eliminar los Objects relacionados a los Items
-    for item in items:
-        objects = session.exec(select(Object).where(Object.item_id == item.item_id)).all()
-        for obj in objects:
-            session.delete(obj)
+    # Eliminar los contadores de progreso del Job
+    await session.run_sync(delete_job_counts, job.job_id)
 
-    # Eliminar los Items relacionados al Job
-    for item in items:
-        session.delete(item)
+    # Eliminar los Objects y los Items del Job con un DELETE cada uno
+    if item_ids:
+        await session.exec(delete(Object).where(Object.item_id.in_(item_ids)))
+        await session.exec(delete(Item).where(Item.item_id.in_(item_ids)))
 
     # Eliminar el Job
-    session.delete(job)
+    await session.delete(job)
 
     # Confirmar los cambios
-    session.commit()
+    await session.commit()
+    ocr_index.remove(item_ids)
 
     return {"message": f"El Job '{job_code}' y todos los datos relacionados fueron eliminados exitosamente."}
\ No newline at end of file
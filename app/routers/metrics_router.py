@@ -0,0 +1,40 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from services.metrics import CONTENT_TYPE, render_metrics
+
+router = APIRouter(
+    tags=["Monitoring"]
+)
+
+
+@router.get("/metrics", response_class=Response, summary="Prometheus metrics")
+async def metrics():
+    """
+    ## Prometheus metrics
+
+    Exposes the API metrics in the Prometheus text exposition format. Requires either
+    `Authorization: Bearer <METRICS_TOKEN>` or a logged-in user whose role is in `allowed_roles`.
+
+    ### Metrics:
+    - **http_request_duration_seconds**: Request latency histogram by method, route template and status.
+    - **http_requests_in_flight**: Requests currently being processed.
+    - **db_queries_total** / **db_query_duration_seconds**: SQL statements executed and their duration.
+    - **db_lock_errors_total**: Statements that failed with `database is locked` after the busy timeout (failures only).
+    - **db_lock_wait_seconds**: SQLite writes slower than `SQLITE_LOCK_WAIT_THRESHOLD_MS`, i.e. likely lock waits,
+      including the ones that ran out of busy timeout.
+    - **ingest_rows_total** / **ingest_rows_per_second**: CSV rows inserted and throughput of the last ingest.
+    - **ocr_request_duration_seconds** / **ocr_failures_total**: OCR latency and failures by reason.
+    - **image_bytes_written_total**: Image bytes written to disk by kind.
+
+    ### Example Usage:
+    ```yaml
+    scrape_configs:
+      - job_name: cis
+        authorization:
+          credentials: <METRICS_TOKEN>
+        static_configs:
+          - targets: ["api:8000"]
+    ```
+    """
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
@@ -1,13 +1,59 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+import time
+from typing import Annotated, Optional
+from fastapi import APIRouter, Body, File, Form, HTTPException, Depends, Request, Response, UploadFile, status
+from sqlalchemy import tuple_
 from sqlmodel import select
-from db import SessionDep
-from models import Object, Item, Stage
+from sqlmodel.ext.asyncio.session import AsyncSession
+from config import settings
+from db import AsyncSessionDep
+from models import (
+    Object, Item, Stage, StageUpdateRequest, StageUpdateResult, BatchStageUpdateResponse, ScanResponse, ScannedObject
+)
+from services.ocr_matcher import confident_match, get_ocr_index, ocr_index, to_candidate
+from services.ocr_service import ClientDisconnected, OCRError, OCRTimeout, cancel_on_disconnect, get_ocr_client
+from services.progress_service import change_stage, change_stages, delete_item_counts, remove_object
 
 router = APIRouter(
     prefix="/object",
     tags=["Object"]
 )
 
+# Máximo de lecturas por llamada a /update_stage/batch
+MAX_BATCH_SIZE = 500
+
+
+def split_scanned_ocr(ocr: str) -> tuple[str, str]:
+    """
+    Separa el OCR escaneado ("<ocr del item>_<pieza>") en OCR del Item y número de pieza.
+    """
+    pieces = ocr.split("_")
+    return "_".join(pieces[0:-1]), pieces[-1]
+
+
+def invalid_piece_detail(ocr: str) -> str:
+    return f"Número de pieza inválido en el OCR '{ocr}': se espera '<OCR del Item>_<número>'."
+
+
+def parse_piece_number(ocr: str, part: str) -> int:
+    """
+    Convierte el sufijo de pieza del OCR escaneado; 422 si no es un número.
+    """
+    if not part.isdigit():
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=invalid_piece_detail(ocr))
+    return int(part)
+
+
+async def get_piece(session: AsyncSession, item_id: int, piece_number: int) -> Object | None:
+    """
+    Busca la pieza `piece_number` de un Item con el índice único (item_id, piece_number).
+    """
+    result = await session.exec(
+        select(Object)
+        .where(Object.item_id == item_id)
+        .where(Object.piece_number == piece_number)
+    )
+    return result.first()
+
 @router.put("/update_stage",
             summary="Update the current stage of an object",
             response_description="Confirmation message after updating the object's stage",
@@ -15,12 +61,13 @@ router = APIRouter(
             responses={
                 200: {"description": "Stage updated successfully"},
                 404: {"description": "Item, stage, or object not found"},
+                422: {"description": "The scanned OCR does not end in a numeric piece number"},
             },
     )
-def update_object_stage(
+async def update_object_stage(
     ocr: str,
     new_stage_name: str,
-    session: SessionDep
+    session: AsyncSessionDep
 ):
     """
     ## Endpoint to update the current stage of an object
@@ -29,7 +76,7 @@ def update_object_stage(
     and the name of the new stage.
 
     ### Arguments:
-    - **ocr** (str): OCR of the item associated with the object (ignore the last character).
+    - **ocr** (str): OCR of the item followed by `_` and the piece number.
     - **new_stage_name** (str): Name of the new stage.
 
     ### Returns:
@@ -38,6 +85,7 @@ def update_object_stage(
     ### Raises:
     - `HTTPException`:
         - `404`: If the item, stage, or object is not found.
+        - `422`: If the piece suffix of the OCR is not a number (e.g. `ABC_x`).
 
     ### Example Usage:
     ```http
@@ -57,55 +105,331 @@ def update_object_stage(
     ```
 
     ### Workflow:
-    1. Clean the OCR by ignoring the last character.
+    1. Split the OCR into the item OCR and the piece number (`_N` suffix).
     2. Retrieve the item associated with the cleaned OCR.
     3. Verify that the new stage exists.
-    4. Retrieve the object associated with the item and the specified part number.
+    4. Retrieve the object by (item_id, piece_number) with a single indexed lookup.
     5. Update the `current_stage` of the object.
     6. Commit the changes to the database.
     """
-    # Ignorar el último carácter del OCR
-    delimitador = "_"
-    pieces = ocr.split(delimitador)
+    # Separar el número de pieza del OCR
+    ocr_cleaned, part = split_scanned_ocr(ocr)
+    piece_number = parse_piece_number(ocr, part)
 
-    ocr_cleaned, part = pieces[0:-1][0], pieces[-1]
-    
-    ocr_cleaned = "_".join(pieces[0:-1])
-    print(ocr_cleaned)
     # Obtener el Item asociado al OCR
-    #print(ocr_cleaned)
-    item = session.exec(select(Item).where(Item.ocr == ocr_cleaned)).first()
+    item = (await session.exec(select(Item).where(Item.ocr == ocr_cleaned))).first()
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=F"Item con el OCR proporcionado no encontrado, OCR {ocr_cleaned}.")
 
     # Verificar que el nuevo stage exista
-    stage = session.exec(select(Stage).where(Stage.stage_name == new_stage_name)).first()
+    stage = (await session.exec(select(Stage).where(Stage.stage_name == new_stage_name))).first()
     if not stage:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stage proporcionado no existe.")
     
-    # Obtener el Object asociado al Item
-    #print(f"OCR: {ocr_cleaned}, Part: {part}")
-    nth_term = int(part) -1
-    obj = session.exec(
-    select(Object)
-    .where(Object.item_id == item.item_id)
-    .offset(nth_term)  # Saltar las primeras nth_term piezas.
-    .limit(1)          # Obtener solo una pieza.
-    ).first()
-    #obj = session.exec(select(Object).where(Object.item_id == item.item_id)).first()
+    # Obtener el Object asociado al Item por su número de pieza
+    obj = await get_piece(session, item.item_id, piece_number)
     if not obj:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Object asociado al Item no encontrado.")
     
     
-    # Actualizar el current_stage del Object
-    obj.current_stage = stage.stage_id  # Debes asignar el ID del stage, no el nombre
-    session.add(obj)
-    session.commit()
-    session.refresh(obj)
+    # Actualizar el current_stage del Object y los contadores de progreso; el UPDATE
+    # es condicional para que dos escaneos simultáneos no descuadren los contadores
+    await session.run_sync(change_stage, item, obj, stage.stage_id)
+    await session.commit()
+    await session.refresh(obj)
 
     return {"message": "Stage actualizado correctamente", "object_id": obj.object_id, "new_stage": new_stage_name}
 
 
+@router.post("/scan", response_model=ScanResponse,
+            summary="Scan a label and update the stage of its object",
+            response_description="Updated object, or the candidates to confirm when the reading is ambiguous",
+            tags=["Object"],
+            responses={
+                200: {"description": "Scan processed; check `updated`"},
+                400: {"description": "The uploaded file is not an image"},
+                404: {"description": "Stage not found"},
+                502: {"description": "OCR backend error"},
+                504: {"description": "OCR did not finish within OCR_TIMEOUT_SECONDS"},
+            },
+    )
+async def scan_object(
+    request: Request,
+    session: AsyncSessionDep,
+    image: UploadFile = File(...),
+    new_stage_name: str = Form(...),
+    job_code: Optional[str] = Form(None),
+):
+    """
+    ## Endpoint to scan a label and move its object to a new stage
+
+    One round trip instead of `POST /ocr` followed by `PUT /object/update_stage`: the
+    label image is read, matched to an item and piece with the in-memory OCR index and,
+    if the match is confident, the stage change is applied.
+
+    ### Arguments:
+    - **image** (UploadFile): Photo of the label.
+    - **new_stage_name** (str): Name of the new stage.
+    - **job_code** (str, optional): Only match items of this job.
+
+    ### Returns:
+    - **ScanResponse**:
+        - `updated: true`: `object` with the piece and its previous and new stage;
+          `alternatives` lists the other candidates when the reading was not exact.
+        - `updated: false`: nothing was changed; `alternatives` holds the candidates
+          (send the chosen `scanned_ocr` to `PUT /object/update_stage`) and `detail`
+          explains why.
+        - `lines` (OCR text) and `timings_ms` (ocr, match, update, total) in both cases.
+
+    ### Raises:
+    - `HTTPException`:
+        - `400`: If the file is not an image.
+        - `404`: If the stage does not exist (checked before calling OCR).
+        - `502`: If the OCR backend fails.
+        - `504`: If OCR does not finish within `OCR_TIMEOUT_SECONDS`.
+
+    ### Example Usage:
+    ```http
+    POST /object/scan
+    Content-Type: multipart/form-data
+    image=@label.jpg, new_stage_name=CUTTING
+
+    Response:
+    {
+        "updated": true,
+        "lines": ["VA33OO-.375-16 X 1.00 stud_3", "WN675A"],
+        "object": {
+            "object_id": 88, "item_id": 12, "piece_number": 3,
+            "ocr": "WN675AVA3300-.375-16 X 1.00 stud_3", "item_name": "VA3300-.375-16 X 1.00 stud",
+            "job_code": "WN675A", "previous_stage": "WAREHOUSE", "new_stage": "CUTTING"
+        },
+        "score": 0.9886,
+        "alternatives": [],
+        "detail": null,
+        "timings_ms": {"ocr": 812.4, "match": 1.9, "update": 6.3, "total": 823.1}
+    }
+    ```
+
+    ### Workflow:
+    1. Verify that the new stage exists.
+    2. Run OCR on the image (cancelled if the client disconnects).
+    3. Rank candidate items and pieces with the OCR index.
+    4. Apply the change only if the best candidate has a piece number, a score of at least
+       `OCR_SCAN_MIN_CONFIDENCE` and a lead of `OCR_SCAN_MIN_MARGIN` over the next one.
+    5. Update the object and the progress counters and commit.
+    """
+    started = time.perf_counter()
+    timings: dict[str, float] = {}
+
+    def lap(name: str, since: float) -> float:
+        now = time.perf_counter()
+        timings[name] = round((now - since) * 1000, 3)
+        return now
+
+    if not (image.content_type or "").startswith("image/"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El archivo debe ser una imagen.")
+
+    # Verificar el stage antes de pagar el OCR
+    stage = (await session.exec(select(Stage).where(Stage.stage_name == new_stage_name))).first()
+    if not stage:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stage proporcionado no existe.")
+
+    mark = time.perf_counter()
+    content = await image.read()
+    try:
+        lines = await cancel_on_disconnect(request, get_ocr_client().read_text(content))
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except OCRTimeout:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="El OCR no respondió a tiempo.")
+    except OCRError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Error del servicio OCR: {e}")
+    lines = lines or []
+    mark = lap("ocr", mark)
+
+    index = await get_ocr_index(session)
+    matches = index.match(lines, job_code=job_code, min_score=settings.OCR_MATCH_MIN_SCORE)
+    best = confident_match(matches, settings.OCR_SCAN_MIN_CONFIDENCE, settings.OCR_SCAN_MIN_MARGIN)
+    mark = lap("match", mark)
+
+    def not_updated(detail: str) -> ScanResponse:
+        lap("total", started)
+        return ScanResponse(
+            updated=False, lines=lines, alternatives=[to_candidate(m) for m in matches],
+            detail=detail, timings_ms=timings,
+        )
+
+    if best is None:
+        if not lines:
+            return not_updated("No se reconoció texto en la imagen.")
+        if not matches:
+            return not_updated("Ningún Item coincide con el texto leído.")
+        return not_updated("La lectura no alcanza para elegir Item y pieza; confirme uno de los candidatos.")
+
+    # El índice puede ir por detrás de la base: la pieza se confirma aquí
+    item = await session.get(Item, best.entry.item_id)
+    obj = await get_piece(session, item.item_id, best.piece_number) if item else None
+    if not obj:
+        return not_updated("Object asociado al Item no encontrado.")
+
+    moved_from = await session.run_sync(change_stage, item, obj, stage.stage_id)
+    await session.commit()
+    previous_id = moved_from if moved_from is not None else stage.stage_id
+    previous_stage = await session.get(Stage, previous_id)
+    lap("update", mark)
+    lap("total", started)
+
+    return ScanResponse(
+        updated=True,
+        lines=lines,
+        object=ScannedObject(
+            object_id=obj.object_id,
+            item_id=item.item_id,
+            piece_number=obj.piece_number,
+            ocr=best.scanned_ocr,
+            item_name=item.item_name,
+            job_code=best.entry.job_code,
+            previous_stage=previous_stage.stage_name if previous_stage else str(previous_id),
+            new_stage=stage.stage_name,
+        ),
+        score=best.score,
+        # Si la lectura no fue exacta, los demás candidatos permiten corregir
+        alternatives=[to_candidate(m) for m in matches[1:]] if best.score < 1.0 else [],
+        timings_ms=timings,
+    )
+
+
+
+@router.put("/update_stage/batch", response_model=BatchStageUpdateResponse,
+            summary="Update the current stage of many objects at once",
+            response_description="Per-entry result of the batch update",
+            tags=["Object"],
+            responses={
+                200: {"description": "Batch processed; check each result for failures"},
+                422: {"description": "Empty batch or more than MAX_BATCH_SIZE entries"},
+            },
+    )
+async def update_object_stage_batch(
+    updates: Annotated[list[StageUpdateRequest], Body(min_length=1, max_length=MAX_BATCH_SIZE)],
+    session: AsyncSessionDep
+):
+    """
+    ## Endpoint to update the stage of a burst of scanned pieces
+
+    Applies many `(ocr, new_stage_name)` pairs in a single request and a single
+    database transaction. Entries that cannot be resolved are reported and
+    skipped; the rest are applied.
+
+    ### Arguments:
+    - **updates** (list[StageUpdateRequest]): Up to `MAX_BATCH_SIZE` entries, each with:
+        - ocr: OCR of the item followed by `_` and the piece number.
+        - new_stage_name: Name of the new stage.
+
+    ### Returns:
+    - **BatchStageUpdateResponse**: Count of updated and failed entries and
+      one result per entry, in request order.
+
+    ### Example Usage:
+    ```http
+    PUT /object/update_stage/batch
+    Body:
+    [
+        {"ocr": "ITEM123_1", "new_stage_name": "CUTTING"},
+        {"ocr": "ITEM123_2", "new_stage_name": "CUTTING"},
+        {"ocr": "NOPE_1", "new_stage_name": "CUTTING"}
+    ]
+
+    Response:
+    {
+        "updated": 2,
+        "failed": 1,
+        "results": [
+            {"ocr": "ITEM123_1", "success": true, "object_id": 1, "new_stage": "CUTTING", "detail": null},
+            {"ocr": "ITEM123_2", "success": true, "object_id": 2, "new_stage": "CUTTING", "detail": null},
+            {"ocr": "NOPE_1", "success": false, "object_id": null, "new_stage": null,
+             "detail": "Item con el OCR proporcionado no encontrado, OCR NOPE."}
+        ]
+    }
+    ```
+
+    ### Workflow:
+    1. Split every OCR into the item OCR and the piece number.
+    2. Resolve all items, stages and pieces with one IN query each.
+    3. Update the resolved objects and the progress counters. An entry only succeeds if its
+       conditional update left the piece in the new stage (not deleted or moved by another request).
+    4. Commit once and return the per-entry results.
+    """
+    parsed = []
+    for update_request in updates:
+        ocr_cleaned, part = split_scanned_ocr(update_request.ocr)
+        parsed.append((update_request, ocr_cleaned, int(part) if part.isdigit() else None))
+
+    # Resolver Items, Stages y piezas con una consulta IN cada uno
+    items: dict[str, Item] = {}
+    item_rows = await session.exec(
+        select(Item).where(Item.ocr.in_({ocr for _, ocr, _ in parsed})).order_by(Item.item_id)
+    )
+    for item in item_rows.all():
+        items.setdefault(item.ocr, item)
+
+    stage_rows = await session.exec(
+        select(Stage).where(Stage.stage_name.in_({u.new_stage_name for u in updates}))
+    )
+    stages = {stage.stage_name: stage for stage in stage_rows.all()}
+
+    keys = {
+        (items[ocr].item_id, piece_number)
+        for _, ocr, piece_number in parsed
+        if ocr in items and piece_number is not None
+    }
+    pieces = {}
+    if keys:
+        piece_rows = await session.exec(
+            select(Object)
+            # SQLite no usa índices con IN de tuplas; el filtro por item_id sí lo usa
+            .where(Object.item_id.in_({item_id for item_id, _ in keys}))
+            .where(tuple_(Object.item_id, Object.piece_number).in_(keys))
+        )
+        pieces = {(obj.item_id, obj.piece_number): obj for obj in piece_rows.all()}
+
+    results: list[Optional[StageUpdateResult]] = []
+    moves = []
+    # (posición en results, request, object, stage) de cada movimiento
+    pending = []
+    for update_request, ocr_cleaned, piece_number in parsed:
+        item = items.get(ocr_cleaned)
+        stage = stages.get(update_request.new_stage_name)
+        obj = pieces.get((item.item_id, piece_number)) if item else None
+
+        if piece_number is None:
+            detail = invalid_piece_detail(update_request.ocr)
+        elif not item:
+            detail = f"Item con el OCR proporcionado no encontrado, OCR {ocr_cleaned}."
+        elif not stage:
+            detail = "Stage proporcionado no existe."
+        elif not obj:
+            detail = "Object asociado al Item no encontrado."
+        else:
+            pending.append((len(results), update_request, obj, stage))
+            moves.append((item, obj, stage.stage_id))
+            results.append(None)
+            continue
+
+        results.append(StageUpdateResult(ocr=update_request.ocr, success=False, detail=detail))
+
+    # UPDATE condicional por pieza; los deltas de contadores se suman y se escriben juntos
+    moved = await session.run_sync(change_stages, moves)
+    for (index, update_request, obj, stage), success in zip(pending, moved):
+        results[index] = StageUpdateResult(
+            ocr=update_request.ocr, success=success, object_id=obj.object_id,
+            new_stage=stage.stage_name if success else None,
+            detail=None if success else "Otro request movió o eliminó la pieza; vuelva a escanearla.",
+        )
+    await session.commit()
+
+    updated = sum(1 for result in results if result.success)
+    return BatchStageUpdateResponse(updated=updated, failed=len(results) - updated, results=results)
+
 
 @router.put("/test_update_stage",
             summary="Test updating the current stage of an object",
@@ -114,12 +438,13 @@ def update_object_stage(
             responses={
                 200: {"description": "Test successful, returns the values that would be updated"},
                 404: {"description": "Item, stage, or object not found"},
+                422: {"description": "The OCR does not end in a numeric piece number"},
             },
     )
-def test_update_object_stage(
+async def test_update_object_stage(
     ocr: str,
     new_stage_name: str,
-    session: SessionDep
+    session: AsyncSessionDep
 ):
     """
     ## Endpoint to test updating the current stage of an object
@@ -128,7 +453,7 @@ def test_update_object_stage(
     and the name of the new stage. No changes are made to the database.
 
     ### Arguments:
-    - **ocr** (str): OCR of the item associated with the object (ignore the last character).
+    - **ocr** (str): OCR of the item followed by `_` and the piece number.
     - **new_stage_name** (str): Name of the new stage.
 
     ### Returns:
@@ -137,6 +462,7 @@ def test_update_object_stage(
     ### Raises:
     - `HTTPException`:
         - `404`: If the item, stage, or object is not found.
+        - `422`: If the piece suffix of the OCR is not a number (e.g. `ABC_x`).
 
     ### Example Usage:
     ```http
@@ -161,39 +487,28 @@ def test_update_object_stage(
     ```
 
     ### Workflow:
-    1. Clean the OCR by ignoring the last character.
+    1. Split the OCR into the item OCR and the piece number (`_N` suffix).
     2. Retrieve the item associated with the cleaned OCR.
     3. Verify that the new stage exists.
-    4. Retrieve the object associated with the item and the specified part number.
+    4. Retrieve the object by (item_id, piece_number) with a single indexed lookup.
     5. Return the values that would be updated.
     """
-    # Ignorar el último carácter del OCR
-    delimitador = "_"
-    pieces = ocr.split(delimitador)
-    ocr_cleaned, part = pieces[0:-1][0], pieces[-1]
-
+    # Separar el número de pieza del OCR
+    ocr_cleaned, part = split_scanned_ocr(ocr)
+    piece_number = parse_piece_number(ocr, part)
 
     # Obtener el Item asociado al OCR
-    #print(ocr_cleaned)
-    item = session.exec(select(Item).where(Item.ocr == ocr_cleaned)).first()
+    item = (await session.exec(select(Item).where(Item.ocr == ocr_cleaned))).first()
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=F"Item con el OCR proporcionado no encontrado, OCR {ocr_cleaned}.")
 
     # Verificar que el nuevo stage exista
-    stage = session.exec(select(Stage).where(Stage.stage_name == new_stage_name)).first()
+    stage = (await session.exec(select(Stage).where(Stage.stage_name == new_stage_name))).first()
     if not stage:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stage proporcionado no existe.")
     
-    # Obtener el Object asociado al Item
-    #print(f"OCR: {ocr_cleaned}, Part: {part}")
-    nth_term = int(part) -1
-    obj = session.exec(
-    select(Object)
-    .where(Object.item_id == item.item_id)
-    .offset(nth_term)  # Saltar las primeras nth_term piezas.
-    .limit(1)          # Obtener solo una pieza.
-    ).first()
-    #obj = session.exec(select(Object).where(Object.item_id == item.item_id)).first()
+    # Obtener el Object asociado al Item por su número de pieza
+    obj = await get_piece(session, item.item_id, piece_number)
     if not obj:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Object asociado al Item no encontrado.")
     
@@ -216,11 +531,10 @@ def test_update_object_stage(
             tags=["Object"],
             responses={
                 200: {"description": "Object deleted successfully"},
-                404: {"description": "Item or object not found"},
-                400: {"description": "Piece number out of range"},
+                404: {"description": "Item or piece not found"},
             },
     )
-def delete_object(item_ocr: str, piece_number: int, session: SessionDep):
+async def delete_object(item_ocr: str, piece_number: int, session: AsyncSessionDep):
     """
     ## Endpoint to delete an object by item OCR and piece number
 
@@ -228,15 +542,14 @@ def delete_object(item_ocr: str, piece_number: int, session: SessionDep):
 
     ### Arguments:
     - **item_ocr** (str): OCR of the item associated with the object.
-    - **piece_number** (int): Piece number (1-indexed) of the object to delete.
+    - **piece_number** (int): Stored piece number of the object to delete (the `_N` suffix of its OCR).
 
     ### Returns:
     - **dict**: A confirmation message.
 
     ### Raises:
     - `HTTPException`:
-        - `404`: If the item or object is not found.
-        - `400`: If the piece number is out of range.
+        - `404`: If the item or the piece is not found.
 
     ### Example Usage:
     ```http
@@ -250,41 +563,39 @@ def delete_object(item_ocr: str, piece_number: int, session: SessionDep):
 
     ### Workflow:
     1. Retrieve the item associated with the OCR.
-    2. Retrieve all objects associated with the item.
-    3. Validate that the piece number is within range.
-    4. Delete the specified object.
-    5. If the item has no more objects, delete the item as well.
-    6. Commit the changes to the database.
+    2. Look up the object by (item_id, piece_number).
+    3. Delete the specified object and decrement the progress counter of the stage it was in when deleted
+       (`DELETE ... RETURNING current_stage`), so a concurrent scan cannot make it drift. Other pieces keep
+       their numbers.
+    4. If the item has no more objects, delete the item as well.
+    5. Commit the changes to the database.
     """
     # Buscar el Item asociado al OCR
-    item = session.exec(select(Item).where(Item.ocr == item_ocr)).first()
+    item = (await session.exec(select(Item).where(Item.ocr == item_ocr))).first()
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Item con OCR '{item_ocr}' no encontrado.")
 
-    # Obtener los Objects relacionados al Item
-    related_objects = session.exec(select(Object).where(Object.item_id == item.item_id)).all()
-    
-    if not related_objects:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No hay Objects relacionados con el Item '{item_ocr}'.")
-
-    # Validar que el número de pieza esté dentro del rango
-    if piece_number < 1 or piece_number > len(related_objects):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Número de pieza '{piece_number}' fuera de rango. Hay {len(related_objects)} piezas disponibles.")
-
-    # Seleccionar el Object correspondiente al número de pieza (1-indexado)
-    object_to_delete = sorted(related_objects, key=lambda obj: obj.object_id)[piece_number - 1]
+    # Buscar el Object por su número de pieza
+    object_to_delete = await get_piece(session, item.item_id, piece_number)
+    if not object_to_delete:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"La pieza '{piece_number}' no existe en el Item '{item_ocr}'.")
 
-    # Eliminar el Object
-    session.delete(object_to_delete)
-    session.commit()
+    # Eliminar el Object y descontarlo del stage en el que estaba al borrarse
+    object_id = object_to_delete.object_id
+    if not await session.run_sync(remove_object, item, object_to_delete):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"La pieza '{piece_number}' no existe en el Item '{item_ocr}'.")
+    await session.commit()
 
     # Si era el último Object, eliminar el Item
-    if len(related_objects) == 1:
-        session.delete(item)
-        session.commit()
-        return {"message": f"Object con ID '{object_to_delete.object_id}' eliminado. El Item '{item_ocr}' también fue eliminado por no tener más objetos."}
+    remaining = (await session.exec(select(Object.object_id).where(Object.item_id == item.item_id).limit(1))).first()
+    if remaining is None:
+        await session.run_sync(delete_item_counts, item.item_id)
+        await session.delete(item)
+        await session.commit()
+        ocr_index.remove([item.item_id])
+        return {"message": f"Object con ID '{object_id}' eliminado. El Item '{item_ocr}' también fue eliminado por no tener más objetos."}
 
-    return {"message": f"Object con ID '{object_to_delete.object_id}' eliminado exitosamente del Item '{item_ocr}'."}
+    return {"message": f"Object con ID '{object_id}' eliminado exitosamente del Item '{item_ocr}'."}
 
 
 @router.get("/{item_ocr}",
@@ -296,7 +607,7 @@ def delete_object(item_ocr: str, piece_number: int, session: SessionDep):
                 404: {"description": "Item or objects not found"},
             },
         )
-def list_objects(item_ocr: str, session: SessionDep):
+async def list_objects(item_ocr: str, session: AsyncSessionDep):
     """
     ## Endpoint to list all objects associated with an item by OCR
 
@@ -323,6 +634,7 @@ def list_objects(item_ocr: str, session: SessionDep):
             {
                 "object_id": 1,
                 "item_id": 1,
+                "piece_number": 1,
                 "rework": false,
                 "scrap": false,
                 "current_stage": "CUTTING"
@@ -330,6 +642,7 @@ def list_objects(item_ocr: str, session: SessionDep):
             {
                 "object_id": 2,
                 "item_id": 1,
+                "piece_number": 2,
                 "rework": false,
                 "scrap": false,
                 "current_stage": "MACHINING"
@@ -345,29 +658,37 @@ def list_objects(item_ocr: str, session: SessionDep):
     4. Return the list of objects.
     """
     # Buscar el Item asociado al OCR
-    item = session.exec(select(Item).where(Item.ocr == item_ocr)).first()
+    item = (await session.exec(select(Item).where(Item.ocr == item_ocr))).first()
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Item con OCR '{item_ocr}' no encontrado.")
 
     # Obtener los Objects relacionados al Item
-    related_objects = session.exec(select(Object).where(Object.item_id == item.item_id)).all()
+    related_objects = (await session.exec(
+        select(Object).where(Object.item_id == item.item_id).order_by(Object.piece_number)
+    )).all()
     
     if not related_objects:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No hay Objects relacionados con el Item '{item_ocr}'.")
 
-    # Reemplazar current_stage con el nombre del stage
+    # Reemplazar current_stage con el nombre del stage (una sola consulta para todos los Objects)
+    stage_names = dict((await session.exec(
+        select(Stage.stage_id, Stage.stage_name)
+        .where(Stage.stage_id.in_({obj.current_stage for obj in related_objects}))
+    )).all())
+
     objects_with_stage_names = []
     for obj in related_objects:
-        stage = session.exec(select(Stage).where(Stage.stage_id == obj.current_stage)).first()
-        if not stage:
+        stage_name = stage_names.get(obj.current_stage)
+        if stage_name is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Stage con ID '{obj.current_stage}' no encontrado.")
         
         objects_with_stage_names.append({
             "object_id": obj.object_id,
             "item_id": obj.item_id,
+            "piece_number": obj.piece_number,
             "rework": obj.rework,
             "scrap": obj.scrap,
-            "current_stage": stage.stage_name
+            "current_stage": stage_name
         })
 
     return {"item_ocr": item_ocr, "objects": objects_with_stage_names}
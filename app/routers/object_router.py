@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from sqlmodel import select
 from db import SessionDep
-from models import Job, Object, Item, Stage, JobObjectsResponse, ObjectDetails
+from models import Job, Item, Stage, JobObjectsResponse, ObjectDetails
+from services.progress_service import get_job_counts
 from typing import List, Dict
 
 # Definimos el router
@@ -71,10 +72,7 @@ def get_objects_by_job(job_code: str, session: SessionDep):
     ### Workflow:
     1. Validate job existence using provided job_code
     2. Retrieve all items associated with the job
-    3. For each item:
-        - Get all related objects
-        - Group objects by their current processing stage
-        - Count objects per stage
+    3. Read the per-(item, stage) object counters of the job
     4. Return aggregated results with stage names and counts
     """
     # Verificar si el Job existe
@@ -83,28 +81,20 @@ def get_objects_by_job(job_code: str, session: SessionDep):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"El Job con código '{job_code}' no existe.")
 
     # Obtener todos los Items relacionados con el Job
-    items = session.exec(select(Item).where(Item.job_id == job.job_id)).all()
+    items = session.exec(
+        select(Item.item_id, Item.item_name).where(Item.job_id == job.job_id).order_by(Item.item_id)
+    ).all()
 
-    objects_details = []
-
-    for item in items:
-        # Obtener todos los Objects relacionados con el Item
-        objects = session.exec(select(Object).where(Object.item_id == item.item_id)).all()
-        
-        # Agrupar los objetos por etapa
-        stages_count = {}
-        for obj in objects:
-            stage = session.exec(select(Stage).where(Stage.stage_id == obj.current_stage)).first()
-            stage_name = stage.stage_name if stage else "Unknown"
-            if stage_name not in stages_count:
-                stages_count[stage_name] = 0
-            stages_count[stage_name] += 1
+    # Conteo de objetos por (item, stage) desde los contadores de progreso
+    counts = get_job_counts(session, job.job_id)
+    stage_names = dict(session.exec(select(Stage.stage_id, Stage.stage_name)).all())
 
-        # Añadir los detalles de los objetos por etapa
-        for stage_name, count in stages_count.items():
+    objects_details = []
+    for item_id, item_name in items:
+        for stage_id, count in sorted(counts.get(item_id, {}).items()):
             objects_details.append(ObjectDetails(
-                item_name=item.item_name,
-                stage_name=stage_name,
+                item_name=item_name,
+                stage_name=stage_names.get(stage_id, "Unknown"),
                 count=count
             ))
 
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Query, status
+
+from services.ocr_cache import ocr_cache
+
+router = APIRouter(
+    prefix="/admin/ocr-cache",
+    tags=["Monitoring"]
+)
+
+
+@router.get("", summary="OCR cache statistics")
+async def get_ocr_cache_stats():
+    """
+    ## OCR cache statistics
+
+    Hits and misses of the OCR result cache since startup (or the last reset), and how
+    many backend calls and seconds of OCR latency they saved.
+
+    ### Returns:
+    - **lookups**, **memory_hits**, **disk_hits**, **misses**, **hit_rate**: Lookup counters.
+    - **ocr_calls_saved** (int): Reads answered without calling the OCR backend.
+    - **saved_seconds** (float): Sum of the original OCR latency of every hit.
+    - **ocr_seconds** (float): Time spent on the backend for the misses that were cached.
+    - **memory_entries**, **disk_entries**, **disk_bytes**, **max_bytes**, **ttl_seconds**:
+      Current size and limits of each tier.
+    - **evicted**, **expired** (int): Disk entries removed by size or by TTL.
+
+    ### Example Response:
+    ```json
+    {
+        "lookups": 120, "memory_hits": 61, "disk_hits": 9, "misses": 50, "hit_rate": 0.5833,
+        "ocr_calls_saved": 70, "saved_seconds": 88.412, "ocr_seconds": 63.05,
+        "memory_entries": 50, "disk_entries": 812, "disk_bytes": 143220,
+        "max_bytes": 67108864, "ttl_seconds": 604800, "evicted": 0, "expired": 3
+    }
+    ```
+    """
+    return await ocr_cache.snapshot()
+
+
+@router.delete("", status_code=status.HTTP_204_NO_CONTENT, summary="Reset OCR cache statistics")
+async def reset_ocr_cache(clear: bool = Query(False, description="Also drop every cached result")):
+    """
+    ## Reset OCR cache statistics
+
+    Zeroes the hit/miss counters. With `clear=true` the cached results are dropped too
+    (memory and disk), e.g. after switching OCR model, so every image is read again.
+    """
+    ocr_cache.reset_stats()
+    if clear:
+        await ocr_cache.clear()
@@ -1,6 +1,16 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Response, status
-from services.ocr_service import ocr_service  # Importa el servicio
+from fastapi import APIRouter, Query, Request, UploadFile, File, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from config import settings
+from db import AsyncSessionDep
+from models import OCRCandidate, OCRMatchRequest, OCRMatchResponse
+from services.ocr_matcher import Match, get_ocr_index, to_candidate
+from services.ocr_service import (
+    ClientDisconnected, OCRError, OCRTimeout, cancel_on_disconnect, get_ocr_client, read_batch
+)
+import json
 import logging
+import time
+from typing import AsyncIterator, Optional
 from fastapi.responses import PlainTextResponse
 
 router = APIRouter(
@@ -25,10 +35,11 @@ router = APIRouter(
                 }
             },
             400: {"description": "Invalid file type"},
-            500: {"description": "OCR processing error"}
+            500: {"description": "OCR processing error"},
+            504: {"description": "OCR did not finish within OCR_TIMEOUT_SECONDS"}
         }
     )
-async def extract_text(image: UploadFile = File(...)):
+async def extract_text(request: Request, image: UploadFile = File(...)):
     """
     ## Extract text from image using Azure OCR
 
@@ -50,6 +61,7 @@ async def extract_text(image: UploadFile = File(...)):
     - `HTTPException`:
         - 400: Invalid file type uploaded
         - 500: Internal server error during processing
+        - 504: OCR did not finish within `OCR_TIMEOUT_SECONDS`
 
     ### Example Usage:
     ```bash
@@ -71,8 +83,8 @@ async def extract_text(image: UploadFile = File(...)):
 
     ### Workflow:
     1. Validate file type is image
-    2. Send image to Azure OCR service
-    3. Process API response
+    2. Send image to the OCR backend and poll asynchronously (adaptive interval, overall deadline)
+    3. Cancel the OCR operation if the client disconnects
     4. Return formatted results:
         - JSON for structured data
         - Plain text for raw output
@@ -90,13 +102,231 @@ async def extract_text(image: UploadFile = File(...)):
 
     try:
         logging.info(f"Procesando archivo: {image.filename}")
-        recognized_texts = ocr_service.azure_ocr(image.file)
-        if recognized_texts:
+        content = await image.read()
+        lines = await cancel_on_disconnect(request, get_ocr_client().read_text(content))
+        if lines:
             logging.info("Texto reconocido con éxito.")
             #return Response(recognized_texts, mimetype='text/plain')
-            return recognized_texts
+            return "\n".join(lines)
         logging.info("No se reconoció texto en la imagen.")
         return {"message": "No se reconoció texto en la imagen."}
+    except ClientDisconnected:
+        logging.info(f"Cliente desconectado; OCR de {image.filename} cancelado.")
+        return Response(status_code=499)
+    except OCRTimeout as e:
+        logging.warning(str(e))
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="El OCR no respondió a tiempo.")
+    except OCRError as e:
+        # Como antes: un fallo del servicio se reporta como imagen sin texto
+        logging.error(f"Error del servicio OCR: {e}")
+        return {"message": "No se reconoció texto en la imagen."}
     except Exception as e:
         logging.error(f"Error procesando la imagen: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno del servidor al procesar la imagen.")
+
+
+@router.post("/batch",
+        summary="Perform OCR on many images",
+        response_description="One JSON line per image as soon as it is read, then a summary line",
+        responses={
+            200: {
+                "description": "Newline-delimited JSON stream",
+                "content": {
+                    "application/x-ndjson": {
+                        "example": (
+                            '{"index": 1, "filename": "b.jpg", "status": "ok", "lines": ["WN675A"], "elapsed_ms": 640.2}\n'
+                            '{"index": 0, "filename": "a.jpg", "status": "timeout", "lines": [], "elapsed_ms": 15000.9}\n'
+                            '{"summary": {"total": 2, "ok": 1, "empty": 0, "failed": 1, "elapsed_ms": 15002.4}}\n'
+                        )
+                    }
+                }
+            },
+            413: {"description": "More than OCR_BATCH_MAX_IMAGES images"},
+        }
+    )
+async def extract_text_batch(
+    images: list[UploadFile] = File(...),
+    concurrency: Optional[int] = Query(None, ge=1, le=settings.OCR_BATCH_MAX_CONCURRENCY),
+    timeout: Optional[float] = Query(None, gt=0, le=120),
+):
+    """
+    ## Extract text from many images
+
+    For a whole pallet of labels in one request: the images are read concurrently (up to
+    `concurrency` OCR operations at a time) and each result is streamed back as soon as it
+    is ready, so the client can start matching the first labels while the rest are
+    still being read. Results go through the same OCR cache as `POST /ocr`.
+
+    ### Arguments:
+    - **images** (list[UploadFile]): Up to `OCR_BATCH_MAX_IMAGES` image files.
+    - **concurrency** (int, optional): Simultaneous OCR operations
+      (default `OCR_BATCH_CONCURRENCY`, max `OCR_BATCH_MAX_CONCURRENCY`).
+    - **timeout** (float, optional): Deadline per image in seconds, counted from the
+      moment its OCR starts (default `OCR_TIMEOUT_SECONDS`).
+
+    ### Returns:
+    - **application/x-ndjson** stream, in completion order:
+        - One line per image: `index` (position in the request), `filename`, `status`
+          (`ok`, `empty`, `timeout`, `error`, `failed` or `invalid`), `lines` and `elapsed_ms`.
+        - A last `summary` line with the totals.
+
+    ### Raises:
+    - `HTTPException`:
+        - 413: More than `OCR_BATCH_MAX_IMAGES` images.
+
+    ### Example Usage:
+    ```bash
+    curl -N -X POST "http://api/ocr/batch?concurrency=8" \
+         -F "images=@label1.jpg" -F "images=@label2.jpg"
+    ```
+
+    ### Workflow:
+    1. Reject the batch if it has too many images; mark non-image or oversized files as `invalid`.
+    2. Read every image into memory (upload files are closed once the response starts).
+    3. Fan the images out to the OCR backend with a concurrency limit and a per-image deadline.
+    4. Stream one line per image as it completes; stop the pending reads if the client disconnects.
+    """
+    if len(images) > settings.OCR_BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo {settings.OCR_BATCH_MAX_IMAGES} imágenes por lote, se recibieron {len(images)}.",
+        )
+
+    started = time.perf_counter()
+    invalid = []
+    readable = []
+    for index, image in enumerate(images):
+        too_large = image.size is not None and image.size > settings.IMAGE_MAX_BYTES
+        if not (image.content_type or "").startswith("image/") or too_large:
+            invalid.append(index)
+        else:
+            readable.append((index, await image.read()))
+    filenames = [image.filename for image in images]
+    logging.info(f"OCR en lote: {len(readable)} imágenes, {len(invalid)} inválidas")
+
+    def line(payload: dict) -> str:
+        return json.dumps(payload, ensure_ascii=False) + "\n"
+
+    async def stream() -> AsyncIterator[str]:
+        totals = {"ok": 0, "empty": 0, "failed": len(invalid)}
+        for index in invalid:
+            yield line({"index": index, "filename": filenames[index], "status": "invalid", "lines": [], "elapsed_ms": 0.0})
+        results = read_batch(
+            get_ocr_client(), [content for _, content in readable],
+            concurrency=concurrency or settings.OCR_BATCH_CONCURRENCY, timeout=timeout,
+        )
+        try:
+            async for result in results:
+                index = readable[result.index][0]
+                if result.error is not None:
+                    logging.warning(f"OCR en lote, {filenames[index]}: {result.error}")
+                totals[result.status if result.status in totals else "failed"] += 1
+                yield line({
+                    "index": index,
+                    "filename": filenames[index],
+                    "status": result.status,
+                    "lines": result.lines or [],
+                    "elapsed_ms": round(result.seconds * 1000, 3),
+                })
+        finally:
+            # Si el cliente se desconecta, las lecturas pendientes se cancelan aquí
+            await results.aclose()
+        yield line({"summary": {
+            "total": len(images), **totals, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+        }})
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.post("/match", response_model=OCRMatchResponse,
+        summary="Match OCR text to items",
+        response_description="Ranked candidate items and piece numbers",
+    )
+async def match_ocr_text(match_request: OCRMatchRequest, session: AsyncSessionDep):
+    """
+    ## Match OCR text to items
+
+    Resolves the raw text returned by `POST /ocr` to the items it most likely refers to,
+    tolerating misread characters (O/0, I/1, S/5...), extra spaces and the job code on a
+    separate line. Uses an in-memory index of every `Item.ocr`; no per-request scan of
+    the item table.
+
+    ### Arguments:
+    - **text** (str): OCR output, one line per row.
+    - **job_code** (str, optional): Only consider items of this job.
+    - **limit** (int): Maximum number of candidates (1-50, default 5).
+
+    ### Returns:
+    - **OCRMatchResponse**: Candidates ordered by `score` (1.0 = exact), each with the
+      piece number when the text included a valid `_N` suffix and the `scanned_ocr`
+      code to send to `PUT /object/update_stage`.
+
+    ### Example Usage:
+    ```http
+    POST /ocr/match
+    Body:
+    {"text": "VA33OO-.375-16 X 1.00 stud_3\\nWN675A"}
+
+    Response:
+    {
+        "candidates": [{
+            "item_id": 12, "ocr": "WN675AVA3300-.375-16 X 1.00 stud", "item_name": "VA3300-.375-16 X 1.00 stud",
+            "job_code": "WN675A", "score": 0.9886, "piece_number": 3, "piece_count": 8,
+            "scanned_ocr": "WN675AVA3300-.375-16 X 1.00 stud_3"
+        }],
+        "elapsed_ms": 1.7
+    }
+    ```
+
+    ### Workflow:
+    1. Load the item index on first use (or when older than `OCR_MATCH_REFRESH_SECONDS`).
+    2. Build the possible readings: each line, each line without its piece suffix and
+       line pairs joined together.
+    3. Pick candidates by shared trigrams and rank them by edit distance.
+    4. Drop candidates below `OCR_MATCH_MIN_SCORE`.
+    """
+    started = time.perf_counter()
+    index = await get_ocr_index(session)
+    matches = index.match(
+        match_request.text.splitlines(),
+        limit=match_request.limit,
+        job_code=match_request.job_code,
+        min_score=settings.OCR_MATCH_MIN_SCORE,
+    )
+    return OCRMatchResponse(
+        candidates=[to_candidate(match) for match in matches],
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 3),
+    )
+
+
+@router.get("/autocomplete", response_model=list[OCRCandidate],
+        summary="Autocomplete item OCR codes",
+        response_description="Items whose OCR starts with the given prefix",
+    )
+async def autocomplete_ocr(
+    session: AsyncSessionDep,
+    prefix: str = Query(..., min_length=1),
+    job_code: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+):
+    """
+    ## Autocomplete item OCR codes
+
+    Prefix search over every `Item.ocr` for manual entry when the label cannot be read.
+    Case and spaces are ignored.
+
+    ### Arguments:
+    - **prefix** (str): Beginning of the item OCR.
+    - **job_code** (str, optional): Only items of this job.
+    - **limit** (int): Maximum number of results (1-100, default 10).
+
+    ### Returns:
+    - **list[OCRCandidate]**: Matching items in OCR order (`score` is 1.0, no piece).
+
+    ### Example Usage:
+    ```http
+    GET /ocr/autocomplete?prefix=wn675a0.25&limit=3
+    ```
+    """
+    index = await get_ocr_index(session)
+    return [to_candidate(Match(entry, 1.0)) for entry in index.complete(prefix, limit=limit, job_code=job_code)]
@@ -214,18 +214,18 @@ def get_stages_order(process_name: str, session: SessionDep):
 
     ### Workflow:
     1. Validate process existence
-    2. Retrieve stage order relationships
-    3. Enrich with stage details
-    4. Return ordered list
+    2. Retrieve stage order relationships joined with stage details
+    3. Return ordered list
     """
     # Verificar que el Process exista
     process = session.exec(select(Process).where(Process.process_name == process_name)).first()
     if not process:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="El Process no existe.")
 
-    # Obtener el orden de los stages asociados al Process
+    # Obtener el orden de los stages asociados al Process con el nombre de cada Stage
     process_stages = session.exec(
-        select(ProcessStage)
+        select(ProcessStage.order, ProcessStage.stage_id, Stage.stage_name)
+        .join(Stage, Stage.stage_id == ProcessStage.stage_id)
         .where(ProcessStage.process_id == process.process_id)
         .order_by(ProcessStage.order)
     ).all()
@@ -233,14 +233,13 @@ def get_stages_order(process_name: str, session: SessionDep):
     if not process_stages:
         return {"message": f"No hay stages asignados para el Process '{process_name}'."}
 
-    # Obtener detalles de los Stages en el orden especificado
     stages_order = [
         {
-            "order": ps.order,
-            "stage_id": ps.stage_id,
-            "stage_name": session.exec(select(Stage).where(Stage.stage_id == ps.stage_id)).first().stage_name
+            "order": order,
+            "stage_id": stage_id,
+            "stage_name": stage_name
         }
-        for ps in process_stages
+        for order, stage_id, stage_name in process_stages
     ]
 
     return stages_order
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, HTTPException, Query, status
+
+from services.profiler import ProfileSummary, list_profiles, load_profile
+
+router = APIRouter(
+    prefix="/admin/profiles",
+    tags=["Monitoring"]
+)
+
+
+@router.get("", response_model=list[ProfileSummary], summary="List request profiles")
+async def get_profiles(limit: int = Query(50, ge=1, le=500)):
+    """
+    ## List request profiles
+
+    Returns the most recent request profiles saved under `logs/profiles/`.
+
+    A profile is recorded when a user whose role is in `allowed_roles` sends a request
+    with the `X-Profile: 1` header or the `profile=1` query parameter; its id is
+    returned in the `X-Profile-Id` response header.
+
+    ### Arguments:
+    - **limit** (int): Maximum number of profiles to return (1-500, default 50).
+
+    ### Returns:
+    - **list[ProfileSummary]**: Profile id, request, status code, duration and user, newest first.
+
+    ### Example Usage:
+    ```bash
+    curl -H "Authorization: Bearer $TOKEN" -H "X-Profile: 1" "http://api/jobs/WN675A/status"
+    curl -H "Authorization: Bearer $TOKEN" "http://api/admin/profiles"
+    ```
+    """
+    return list_profiles(limit)
+
+
+@router.get("/{profile_id}", summary="Get a request profile")
+async def get_profile(profile_id: str):
+    """
+    ## Get a request profile
+
+    Returns a saved profile with:
+    - **call_tree**: Sampled call tree with total and self time per frame.
+    - **sql**: Query count, total time and time per statement.
+    - **serialization_ms**: Sampled time spent serializing the response.
+
+    ### Arguments:
+    - **profile_id** (str): Id from the `X-Profile-Id` header or the profile list.
+
+    ### Raises:
+    - `HTTPException`:
+        - 404: Profile not found
+    """
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfil no encontrado.")
+    return profile
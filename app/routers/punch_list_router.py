@@ -8,6 +8,7 @@ from datetime import datetime
 import shutil
 from uuid import uuid4
 from db import SessionDep
+from services.metrics import IMAGE_BYTES_WRITTEN
 
 router = APIRouter(
     prefix="/punch-list",
@@ -28,6 +29,7 @@ async def save_upload_file(upload_file: UploadFile, folder: str) -> str:
     # Guardar el archivo
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(upload_file.file, buffer)
+        IMAGE_BYTES_WRITTEN.inc(buffer.tell(), kind="punch_list")
     
     return file_path
 
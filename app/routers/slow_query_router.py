@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Query, status
+
+from config import settings
+from db.slow_query import slow_query_log
+
+router = APIRouter(
+    prefix="/admin/slow-queries",
+    tags=["Monitoring"]
+)
+
+
+@router.get("", summary="Top slow queries")
+async def get_slow_queries(limit: int = Query(20, ge=1, le=500)):
+    """
+    ## Top slow queries
+
+    Lists the statements that exceeded `SLOW_QUERY_THRESHOLD_MS` since startup (or the
+    last reset), ordered by total time.
+
+    ### Arguments:
+    - **limit** (int): Maximum number of statements to return (1-500, default 20).
+
+    ### Returns:
+    - **threshold_ms** (float): Current threshold.
+    - **queries** (list): For each normalized statement: parameters shape, count, total,
+      mean and max time, calling routes and the query plan captured on first sight.
+
+    ### Example Response:
+    ```json
+    {
+        "threshold_ms": 200,
+        "queries": [{
+            "statement": "SELECT ... WHERE job.job_code = ? AND product.product_name = ?",
+            "params_shape": "(str×2)",
+            "count": 14, "total_ms": 5321.4, "mean_ms": 380.1, "max_ms": 902.3,
+            "routes": {"GET /defect-records/search/WN675A/TANKS": 14},
+            "plan": ["SCAN defect_record", "SEARCH job USING INTEGER PRIMARY KEY (rowid=?)"]
+        }]
+    }
+    ```
+    """
+    return {"threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS, "queries": slow_query_log.top(limit)}
+
+
+@router.delete("", status_code=status.HTTP_204_NO_CONTENT, summary="Reset slow query log")
+async def reset_slow_queries():
+    """
+    ## Reset slow query log
+
+    Clears the accumulated statements, e.g. after adding an index, so the list only
+    reflects queries executed from now on.
+    """
+    slow_query_log.reset()
@@ -1,4 +1,4 @@
-from sqlite3 import IntegrityError
+from sqlalchemy.exc import IntegrityError
 from fastapi import APIRouter, HTTPException, status
 from db import SessionDep
 from sqlmodel import select
@@ -1,12 +1,20 @@
 from fastapi import APIRouter, UploadFile, HTTPException
 import pandas as pd
 from fastapi.responses import JSONResponse
-from db import SessionDep
-from models import Job, Item, Object, Process, Product
-from sqlmodel import select
+from db import SessionDep, engine
+from models import Job, Item, Product
+from services.ingest_service import bulk_insert_items
+from services.ocr_matcher import index_job_items
+from services.ingest_jobs import (
+    IngestJob, IngestQueueFull, ingest_jobs, PHASE_PARSING, PHASE_INSERTING, PHASE_DONE, PHASE_FAILED
+)
+from sqlmodel import Session, SQLModel, select
 import logging
+import os
+import shutil
+import tempfile
 import traceback
-from typing import Dict, Any
+from typing import Any, BinaryIO, Callable, Dict, Optional
 
 # Configure logging
 logging.basicConfig(
@@ -15,13 +23,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-map_dict: Dict[str, str] = {
-    "Almacén": "Warehouse",
-    "Corte": "Cutting", 
-    "Doblado": "Bending", 
-    "Maquinado": "Machining"  # Fixed typo: "Macnining" → "Machining"
-}
-
 # Definimos el router
 router = APIRouter(
     prefix="/object",
@@ -85,6 +86,195 @@ def log_dataframe_info(df: pd.DataFrame) -> Dict[str, Any]:
     }
 
 
+
+class IngestStatus(SQLModel):
+    ingest_id: str
+    filename: Optional[str] = None
+    product_name: str
+    phase: str
+    rows_total: int
+    rows_processed: int
+    rows_per_second: float
+    status_code: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+    errors: Optional[Any] = None
+
+
+def get_product_id(session: Session, product_name: str) -> int:
+    """
+    Devuelve el product_id del producto o lanza 400 si no existe.
+    """
+    product = session.exec(select(Product).where(Product.product_name == product_name)).first()
+    if not product:
+        logger.error(f"Product with name '{product_name}' not found")
+        raise HTTPException(status_code=400, detail={
+            "error": "El producto especificado no existe.",
+            "product_name": product_name
+        })
+    logger.info(f"Found product with ID: {product.product_id}")
+    return product.product_id
+
+
+def read_bom_csv(file_obj: BinaryIO) -> pd.DataFrame:
+    """
+    Lee el CSV en utf-8 y, si falla la decodificación, en latin1.
+    """
+    try:
+        logger.info("Attempting to read CSV with utf-8 encoding")
+        df = pd.read_csv(file_obj)
+        logger.info("Successfully read CSV with utf-8 encoding")
+    except UnicodeDecodeError:
+        logger.warning("UTF-8 decode failed, attempting with latin1 encoding")
+        file_obj.seek(0)
+        try:
+            df = pd.read_csv(file_obj, encoding='latin1')
+            logger.info("Successfully read CSV with latin1 encoding")
+        except Exception as e:
+            logger.error(f"Failed to read CSV with latin1 encoding: {str(e)}")
+            raise HTTPException(status_code=400, detail={
+                "error": "El archivo no es un CSV válido o no pudo ser leído.",
+                "details": str(e)
+            })
+
+    # Log DataFrame information
+    logger.info("DataFrame loaded", extra={"df_info": log_dataframe_info(df)})
+    return df
+
+
+def validate_bom(df: pd.DataFrame) -> str:
+    """
+    Valida columnas, Job único y duplicados Job/Item. Devuelve el job_code.
+    """
+    required_columns = ["Job", "Item", "Material", "Espesor", "Cantidad", "OCR", "Clase", 
+                      "Longitud", "Ancho", "Alto", "Volumen", "Área Superficial"]
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    
+    if missing_columns:
+        logger.error(f"Missing columns in CSV: {missing_columns}")
+        raise HTTPException(status_code=400, detail={
+            "error": "Faltan columnas en el archivo CSV.",
+            "missing_columns": missing_columns
+        })
+
+    unique_jobs = df['Job'].unique()
+    if len(unique_jobs) > 1:
+        logger.error(f"Multiple jobs found in CSV: {unique_jobs.tolist()}")
+        raise HTTPException(status_code=400, detail={
+            "error": "Los valores de 'Job' no son consistentes.",
+            "unique_jobs": unique_jobs.tolist()
+        })
+
+    # Check for duplicates. Se compara el Item como texto, igual que se guarda
+    # item_name: la ingesta resuelve los item_id por nombre dentro del Job
+    duplicates = df["Item"].astype(str).duplicated(keep=False)
+    if duplicates.any():
+        duplicated_rows = df.loc[duplicates, ["Job", "Item"]].drop_duplicates().to_dict(orient='records')
+        logger.error(f"Duplicate Job-Item combinations found: {duplicated_rows}")
+        raise HTTPException(status_code=400, detail={
+            "error": "Existen combinaciones duplicadas de 'Job' e 'Item'.",
+            "duplicates": duplicated_rows
+        })
+
+    return str(unique_jobs[0])
+
+
+def ingest_bom(
+    session: Session,
+    df: pd.DataFrame,
+    job_code: str,
+    product_id: int,
+    product_name: str,
+    on_progress: Optional[Callable[[int], None]] = None
+) -> str:
+    """
+    Crea o actualiza el Job con las filas del CSV en una sola transacción.
+
+    `on_progress` recibe el número de filas del CSV ya procesadas (las filas
+    de Items que ya existían cuentan como procesadas). Devuelve el mensaje
+    de respuesta.
+    """
+    logger.info(f"Processing job_code: {job_code}")
+    
+    existing_job = session.exec(select(Job).where(Job.job_code == job_code)).first()
+    logger.info(f"Existing job found: {existing_job is not None}")
+
+    if existing_job:
+        # Verify that the existing job belongs to the specified product
+        if existing_job.product_id != product_id:
+            product_name_in_db = session.exec(select(Product.product_name).where(Product.product_id == existing_job.product_id)).first()
+            logger.error(f"Job {job_code} exists but belongs to product '{product_name_in_db}', not '{product_name}'")
+            raise HTTPException(status_code=400, detail={
+                "error": "El Job ya existe pero está asociado a otro producto.",
+                "current_product": product_name_in_db,
+                "requested_product": product_name
+            })
+            
+        logger.info(f"Updating existing job: {job_code}")
+        existing_item_names = set(session.exec(select(Item.item_name).where(Item.job_id == existing_job.job_id)).all())
+        logger.info(f"Found {len(existing_item_names)} existing items")
+
+        new_rows = df[~df["Item"].astype(str).isin(existing_item_names)]
+        skipped = len(df) - len(new_rows)
+        result = bulk_insert_items(
+            session, new_rows, existing_job.job_id,
+            on_progress=(lambda done: on_progress(skipped + done)) if on_progress else None
+        )
+        session.commit()
+        index_job_items(session, existing_job.job_id)
+        if on_progress:
+            on_progress(len(df))
+        logger.info(f"Updated job {job_code}: Created {result.items_created} items and {result.objects_created} objects")
+        return "Se agregaron nuevos Items y Objects al Job existente."
+
+    logger.info(f"Creating new job: {job_code} for product: {product_name}")
+    job = Job(
+        job_code=job_code,
+        product_id=product_id
+    )
+    session.add(job)
+    session.flush()
+
+    result = bulk_insert_items(session, df, job.job_id, on_progress=on_progress)
+    session.commit()
+    index_job_items(session, job.job_id)
+    logger.info(f"Created new job {job_code}: Created {result.items_created} items and {result.objects_created} objects")
+    return "Job, Items, Objects y Process creados exitosamente."
+
+
+def run_ingest(ingest: IngestJob, path: str) -> None:
+    """
+    Ejecuta una ingesta encolada por `validate_and_insert(async_ingest=True)`.
+
+    Corre en el pool de `ingest_jobs` con su propia sesión y actualiza la
+    fase y el avance de `ingest`. Borra el archivo temporal al terminar.
+    """
+    def report(done: int) -> None:
+        ingest.rows_processed = done
+
+    try:
+        with Session(engine) as session:
+            ingest.phase = PHASE_PARSING
+            product_id = get_product_id(session, ingest.product_name)
+            with open(path, "rb") as file_obj:
+                df = read_bom_csv(file_obj)
+            ingest.rows_total = len(df)
+            job_code = validate_bom(df)
+
+            ingest.phase = PHASE_INSERTING
+            message = ingest_bom(session, df, job_code, product_id, ingest.product_name, on_progress=report)
+
+        ingest.result = {"message": message}
+        ingest.status_code = 201
+        ingest.phase = PHASE_DONE
+        logger.info(f"Ingest {ingest.ingest_id} finished: {ingest.rows_processed} rows")
+    except HTTPException as e:
+        logger.error(f"Ingest {ingest.ingest_id} rejected: {str(e.detail)}")
+        ingest.status_code = e.status_code
+        ingest.errors = e.detail
+        ingest.phase = PHASE_FAILED
+    finally:
+        os.unlink(path)
+
 @router.post('/validate-and-insert',
             response_description="Process result message",
             tags=["Object"],
@@ -163,6 +353,18 @@ def log_dataframe_info(df: pd.DataFrame) -> Dict[str, Any]:
                         }
                     }
                 },
+                202: {
+                    "description": "Ingest queued (`async_ingest=true`)",
+                    "content": {
+                        "application/json": {
+                            "example": {
+                                "ingest_id": "3f2c9a7d0b5e4c1a8e6f2d4b9c0a1e7f",
+                                "status_url": "/object/ingest/3f2c9a7d0b5e4c1a8e6f2d4b9c0a1e7f"
+                            }
+                        }
+                    }
+                },
+                503: {"description": "Too many ingests pending (`async_ingest=true`)"},
                 500: {
                     "description": "Internal server error",
                     "content": {
@@ -178,7 +380,8 @@ def log_dataframe_info(df: pd.DataFrame) -> Dict[str, Any]:
     )
 def validate_and_insert(
     file: UploadFile, 
-    product_name: str, session: SessionDep
+    product_name: str, session: SessionDep,
+    async_ingest: bool = False
 ):
     """
     ## Validate and insert manufacturing objects from CSV
@@ -202,11 +405,14 @@ def validate_and_insert(
         - Volumen: Volume
         - Área Superficial: Surface area
     - **product_name** (str): Name of the product to associate with the job
+    - **async_ingest** (bool): If true, the file is queued and processed in the
+      background; poll `GET /object/ingest/{ingest_id}` for progress
 
     ### Returns:
     - **201 Created**:
         - New job: Creates new job, items, objects, and processes
         - Existing job: Adds new items and objects to existing job
+    - **202 Accepted** (`async_ingest=true`): `ingest_id` and `status_url`
 
     ### Example CSV Format:
     ```csv
@@ -222,10 +428,9 @@ def validate_and_insert(
     4. Check for duplicate entries
     5. Process data:
         - Create new job if needed
-        - Create/update items
-        - Create objects
-        - Handle processes
-    6. Commit changes to database
+        - Resolve all processes with a single query
+        - Bulk-insert new items and their objects (executemany)
+    6. Commit changes to database in a single transaction
     7. Return appropriate response
 
     ### Error Handling:
@@ -236,221 +441,36 @@ def validate_and_insert(
     logger.info(f"Starting validate_and_insert for file: {file.filename} with product_name: {product_name}")
     
     try:
-        # Verify product exists
-        product = session.exec(select(Product).where(Product.product_name == product_name)).first()
-        if not product:
-            logger.error(f"Product with name '{product_name}' not found")
-            raise HTTPException(status_code=400, detail={
-                "error": "El producto especificado no existe.",
-                "product_name": product_name
-            })
-
-        product_id = product.product_id
-        logger.info(f"Found product with ID: {product_id}")
+        product_id = get_product_id(session, product_name)
 
         if not file:
             logger.error("No file found in request")
             raise HTTPException(status_code=400, detail="No se encontró el archivo en la solicitud.")
 
-        df = None
-        try:
-            logger.info("Attempting to read CSV with utf-8 encoding")
-            df = pd.read_csv(file.file)
-            logger.info("Successfully read CSV with utf-8 encoding")
-        except UnicodeDecodeError:
-            logger.warning("UTF-8 decode failed, attempting with latin1 encoding")
-            file.file.seek(0)
+        if async_ingest:
+            # Copiar el archivo fuera del request y encolar la ingesta
+            spool = tempfile.NamedTemporaryFile(prefix="ingest_", suffix=".csv", delete=False)
+            with spool:
+                shutil.copyfileobj(file.file, spool)
             try:
-                df = pd.read_csv(file.file, encoding='latin1')
-                logger.info("Successfully read CSV with latin1 encoding")
-            except Exception as e:
-                logger.error(f"Failed to read CSV with latin1 encoding: {str(e)}")
-                raise HTTPException(status_code=400, detail={
-                    "error": "El archivo no es un CSV válido o no pudo ser leído.",
+                ingest = ingest_jobs.submit(file.filename, product_name, run_ingest, spool.name)
+            except IngestQueueFull as e:
+                os.unlink(spool.name)
+                logger.warning(f"Ingest queue full: {e}")
+                raise HTTPException(status_code=503, detail={
+                    "error": "Hay demasiadas cargas en proceso, intente más tarde.",
                     "details": str(e)
                 })
+            logger.info(f"Queued ingest {ingest.ingest_id} for file: {file.filename}")
+            return JSONResponse(content={
+                "ingest_id": ingest.ingest_id,
+                "status_url": f"{router.prefix}/ingest/{ingest.ingest_id}"
+            }, status_code=202)
 
-        # Log DataFrame information
-        logger.info("DataFrame loaded", extra={"df_info": log_dataframe_info(df)})
-
-        required_columns = ["Job", "Item", "Material", "Espesor", "Cantidad", "OCR", "Clase", 
-                          "Longitud", "Ancho", "Alto", "Volumen", "Área Superficial"]
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            logger.error(f"Missing columns in CSV: {missing_columns}")
-            raise HTTPException(status_code=400, detail={
-                "error": "Faltan columnas en el archivo CSV.",
-                "missing_columns": missing_columns
-            })
-
-        unique_jobs = df['Job'].unique()
-        if len(unique_jobs) > 1:
-            logger.error(f"Multiple jobs found in CSV: {unique_jobs.tolist()}")
-            raise HTTPException(status_code=400, detail={
-                "error": "Los valores de 'Job' no son consistentes.",
-                "unique_jobs": unique_jobs.tolist()
-            })
-
-        # Check for duplicates
-        duplicates = df.duplicated(subset=["Job", "Item"], keep=False)
-        if duplicates.any():
-            duplicated_rows = df.loc[duplicates, ["Job", "Item"]].drop_duplicates().to_dict(orient='records')
-            logger.error(f"Duplicate Job-Item combinations found: {duplicated_rows}")
-            raise HTTPException(status_code=400, detail={
-                "error": "Existen combinaciones duplicadas de 'Job' e 'Item'.",
-                "duplicates": duplicated_rows
-            })
-
-        # Database operations
-        job_code = str(unique_jobs[0])
-        logger.info(f"Processing job_code: {job_code}")
-        
-        existing_job = session.exec(select(Job).where(Job.job_code == job_code)).first()
-        logger.info(f"Existing job found: {existing_job is not None}")
-
-        # Process handling
-        process_map = {}
-        unique_processes = df["Clase"].unique()
-        logger.info(f"Processing {len(unique_processes)} unique processes")
-        
-        for process_name in unique_processes:
-            # Apply mapping for both new and existing jobs
-            process_name_mapped = map_dict[process_name] if process_name in map_dict else process_name
-            logger.info(f"Processing process: {process_name} (mapped to: {process_name_mapped})")
-            existing_process = session.exec(select(Process).where(Process.process_name == process_name_mapped)).first()
-            if not existing_process:
-                logger.info(f"Creating new process: {process_name_mapped}")
-                new_process = Process(process_name=process_name_mapped)
-                session.add(new_process)
-                session.commit()
-                session.refresh(new_process)
-                process_map[process_name] = new_process
-            else:
-                logger.info(f"Using existing process: {process_name_mapped}")
-                process_map[process_name] = existing_process
-
-        if existing_job:
-            # Verify that the existing job belongs to the specified product
-            if existing_job.product_id != product_id:
-                product_name_in_db = session.exec(select(Product.product_name).where(Product.product_id == existing_job.product_id)).first()
-                logger.error(f"Job {job_code} exists but belongs to product '{product_name_in_db}', not '{product_name}'")
-                raise HTTPException(status_code=400, detail={
-                    "error": "El Job ya existe pero está asociado a otro producto.",
-                    "current_product": product_name_in_db,
-                    "requested_product": product_name
-                })
-                
-            logger.info(f"Updating existing job: {job_code}")
-            existing_items = session.exec(select(Item).where(Item.job_id == existing_job.job_id)).all()
-            existing_item_names = {item.item_name for item in existing_items}
-            logger.info(f"Found {len(existing_item_names)} existing items")
-
-            items_created = 0
-            objects_created = 0
-            
-            for _, row in df.iterrows():
-                if row["Item"] not in existing_item_names:
-                    logger.info(f"Creating new item: {row['Item']}")
-                    # Get process name and apply mapping if needed
-                    process_name = row["Clase"]
-                    
-                    # Handle NaN values with default 0
-                    volumen = row["Volumen"] if pd.notna(row["Volumen"]) else 0
-                    area_superficial = row["Área Superficial"] if pd.notna(row["Área Superficial"]) else 0
-                    
-                    logger.info(f"Volume for {row['Item']}: {volumen}, Area: {area_superficial}")
-                    
-                    item = Item(
-                        item_name=row["Item"],
-                        espesor=row["Espesor"],
-                        longitud=row["Longitud"],
-                        ancho=row["Ancho"],
-                        alto=row["Alto"],
-                        volumen=volumen,
-                        area_superficial=area_superficial,
-                        cantidad=row["Cantidad"],
-                        material=row["Material"],
-                        ocr=row["OCR"],
-                        job_id=existing_job.job_id,
-                        process_id=process_map[process_name].process_id
-                    )
-                    session.add(item)
-                    session.commit()
-                    session.refresh(item)
-                    items_created += 1
-
-                    # Create objects
-                    for i in range(row["Cantidad"]):
-                        obj = Object(
-                            current_stage=1,
-                            rework=0,
-                            scrap=0,
-                            item_id=item.item_id
-                        )
-                        session.add(obj)
-                        objects_created += 1
-
-            session.commit()
-            logger.info(f"Updated job {job_code}: Created {items_created} items and {objects_created} objects")
-            return JSONResponse(content={"message": "Se agregaron nuevos Items y Objects al Job existente."}, status_code=201)
-        
-        else:
-            logger.info(f"Creating new job: {job_code} for product: {product_name}")
-            job = Job(
-                job_code=job_code,
-                product_id=product_id
-            )
-            session.add(job)
-            session.commit()
-            session.refresh(job)
-
-            items_created = 0
-            objects_created = 0
-
-            for _, row in df.iterrows():
-                logger.info(f"Processing item: {row['Item']}")
-                process_name = row["Clase"]
-                
-                # Handle NaN values with default 0
-                volumen = row["Volumen"] if pd.notna(row["Volumen"]) else 0
-                area_superficial = row["Área Superficial"] if pd.notna(row["Área Superficial"]) else 0
-                
-                logger.info(f"Volume for {row['Item']}: {volumen}, Area: {area_superficial}")
-                
-                item = Item(
-                    item_name=row["Item"],
-                    espesor=row["Espesor"],
-                    longitud=row["Longitud"],
-                    ancho=row["Ancho"],
-                    alto=row["Alto"],
-                    volumen=volumen,
-                    area_superficial=area_superficial,
-                    cantidad=row["Cantidad"],
-                    material=row["Material"],
-                    ocr=row["OCR"],
-                    job_id=job.job_id,
-                    process_id=process_map[process_name].process_id
-                )
-                session.add(item)
-                session.commit()
-                session.refresh(item)
-                items_created += 1
-
-                # Create objects
-                for i in range(row["Cantidad"]):
-                    obj = Object(
-                        current_stage=1,
-                        rework=0,
-                        scrap=0,
-                        item_id=item.item_id
-                    )
-                    session.add(obj)
-                    objects_created += 1
-
-            session.commit()
-            logger.info(f"Created new job {job_code}: Created {items_created} items and {objects_created} objects")
-            return JSONResponse(content={"message": "Job, Items, Objects y Process creados exitosamente."}, status_code=201)
+        df = read_bom_csv(file.file)
+        job_code = validate_bom(df)
+        message = ingest_bom(session, df, job_code, product_id, product_name)
+        return JSONResponse(content={"message": message}, status_code=201)
 
     except HTTPException as e:
         logger.error(f"HTTP Exception: {str(e.detail)}")
@@ -460,4 +480,61 @@ def validate_and_insert(
         raise HTTPException(status_code=500, detail={
             "error": "Ocurrió un error inesperado.",
             "details": str(e)
-        })
\ No newline at end of file
+        })
+
+
+@router.get("/ingest/{ingest_id}", response_model=IngestStatus,
+            summary="Get the progress of an asynchronous CSV ingest",
+            response_description="Current phase, progress and result of the ingest",
+            tags=["Object"],
+            responses={
+                200: {"description": "Successfully returned the ingest status"},
+                404: {"description": "Ingest not found or expired"},
+            },
+    )
+def get_ingest_status(ingest_id: str):
+    """
+    ## Endpoint to poll an asynchronous CSV ingest
+
+    Returns the progress of an ingest queued with
+    `POST /object/validate-and-insert?async_ingest=true`.
+
+    ### Arguments:
+    - **ingest_id** (str): Id returned by the upload request.
+
+    ### Returns:
+    - **IngestStatus**:
+        - phase: `queued`, `parsing`, `inserting`, `done` or `failed`
+        - rows_total / rows_processed: CSV rows read and already handled
+        - rows_per_second: Throughput since the ingest started
+        - status_code: Status the synchronous endpoint would have returned
+        - result: `{"message": ...}` once the ingest is done
+        - errors: Validation error detail when the ingest failed
+
+    ### Raises:
+    - `HTTPException`:
+        - `404`: If the ingest does not exist or has expired.
+
+    ### Example Usage:
+    ```http
+    GET /object/ingest/3f2c9a7d0b5e4c1a8e6f2d4b9c0a1e7f
+
+    Response:
+    {
+        "ingest_id": "3f2c9a7d0b5e4c1a8e6f2d4b9c0a1e7f",
+        "filename": "WN675A.csv",
+        "product_name": "TANKS",
+        "phase": "done",
+        "rows_total": 126,
+        "rows_processed": 126,
+        "rows_per_second": 9850.3,
+        "status_code": 201,
+        "result": {"message": "Job, Items, Objects y Process creados exitosamente."},
+        "errors": null
+    }
+    ```
+    """
+    ingest = ingest_jobs.get(ingest_id)
+    if not ingest:
+        raise HTTPException(status_code=404, detail=f"Ingesta '{ingest_id}' no encontrada.")
+    return ingest.to_dict()
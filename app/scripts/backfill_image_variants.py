@@ -0,0 +1,63 @@
+"""
+Genera las variantes (miniatura y pantalla) de las DefectImage existentes
+que todavía no las tienen.
+
+Uso (desde app/):
+    python -m scripts.backfill_image_variants                   # todas las pendientes
+    python -m scripts.backfill_image_variants --batch-size 50 --limit 1000
+    python -m scripts.backfill_image_variants --force           # regenerar todas
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import async_engine
+from models import DefectImage
+from services.image_variants import generate_variants, variant_pool
+
+
+async def backfill(batch_size: int, limit: int | None, force: bool) -> tuple[int, int]:
+    """Devuelve (imágenes revisadas, imágenes actualizadas)."""
+    checked = updated = 0
+    last_id = 0
+    started = time.perf_counter()
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        while limit is None or checked < limit:
+            size = batch_size if limit is None else min(batch_size, limit - checked)
+            query = select(DefectImage.defect_image_id).where(DefectImage.defect_image_id > last_id)
+            if not force:
+                query = query.where(DefectImage.thumbnail_url.is_(None))
+            image_ids = (await session.exec(query.order_by(DefectImage.defect_image_id).limit(size))).all()
+            if not image_ids:
+                break
+            updated += await generate_variants(session, image_ids, force=force)
+            checked += len(image_ids)
+            last_id = image_ids[-1]
+            print(f"{checked} imágenes revisadas, {updated} actualizadas ({time.perf_counter() - started:.1f} s)")
+    return checked, updated
+
+
+def main(batch_size: int, limit: int | None, force: bool) -> int:
+    """Devuelve 1 si alguna imagen no se pudo procesar."""
+    try:
+        checked, updated = asyncio.run(backfill(batch_size, limit, force))
+    finally:
+        variant_pool.shutdown()
+    print(f"Listo: {updated} de {checked} imágenes con variantes nuevas.")
+    if updated < checked:
+        print(f"{checked - updated} imágenes fallaron; ver el log para el detalle.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=100, help="Imágenes por lote (por commit)")
+    parser.add_argument("--limit", type=int, help="Máximo de imágenes a procesar")
+    parser.add_argument("--force", action="store_true", help="Regenerar también las que ya tienen variantes")
+    args = parser.parse_args()
+    sys.exit(main(args.batch_size, args.limit, args.force))
@@ -0,0 +1,266 @@
+"""
+Mantenimiento del store de imágenes direccionado por contenido.
+
+    migrate  Pasa las DefectImage del árbol anterior (static/punch_list/...) al
+             store: hashea cada archivo, lo enlaza o copia a static/blobs/ una
+             sola vez por contenido y actualiza la fila. Se puede interrumpir y
+             volver a correr; los originales se borran después de cada commit.
+    verify   Recalcula ref_count desde defect_image y reporta (o corrige) el drift.
+    gc       Borra los blobs sin referencias y los archivos huérfanos del store
+             que no se usaron en los últimos --grace-minutes: cada subida renueva
+             el mtime del blob que reutiliza, así que un blob en 0 que una subida
+             en curso vuelve a referenciar no se borra.
+
+Uso (desde app/):
+    python -m scripts.image_store migrate --dry-run
+    python -m scripts.image_store migrate --batch-size 500
+    python -m scripts.image_store migrate --keep-originals
+    python -m scripts.image_store verify --fix
+    python -m scripts.image_store gc --grace-minutes 60
+
+Después de migrar, `python -m scripts.backfill_image_variants` regenera las variantes.
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+import uuid
+
+from sqlalchemy import delete, func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import settings
+from db import async_engine
+from models import DefectImage, ImageBlob
+from services import image_storage
+from services.image_variants import DISPLAY, THUMBNAIL, variant_path
+
+
+@dataclass
+class MigrationReport:
+    images: int = 0
+    migrated: int = 0
+    missing: int = 0
+    new_blobs: int = 0
+    bytes_before: int = 0
+    bytes_written: int = 0
+
+
+def _link_or_copy(source: Path, destination: Path) -> None:
+    """Enlace duro si es el mismo sistema de archivos; si no, copia vía archivo temporal."""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = destination.with_name(f"{destination.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        try:
+            os.link(source, partial)
+        except OSError:
+            shutil.copyfile(source, partial)
+        os.replace(partial, destination)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+
+
+def _store_existing(path: Path, dry_run: bool) -> Tuple[str, str, int, bool]:
+    with open(path, "rb") as source:
+        sha256, size, head = image_storage.hash_file(source)
+    extension = image_storage.detect_extension(head, path.name)
+    destination = image_storage.blob_path(sha256, extension)
+    created = not destination.exists()
+    if created and not dry_run:
+        _link_or_copy(path, destination)
+    return sha256, extension, size, created
+
+
+def _remove_legacy(paths: List[Path]) -> None:
+    for path in paths:
+        for old in (path, variant_path(path, THUMBNAIL), variant_path(path, DISPLAY)):
+            old.unlink(missing_ok=True)
+
+
+def _prune_empty_dirs(root: Path) -> int:
+    removed = 0
+    for directory in sorted((p for p in root.rglob("*") if p.is_dir()), key=lambda p: len(p.parts), reverse=True):
+        try:
+            directory.rmdir()
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+async def migrate(batch_size: int, keep_originals: bool, dry_run: bool) -> MigrationReport:
+    report = MigrationReport()
+    seen: set = set()
+    last_id = 0
+    started = time.perf_counter()
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        while True:
+            images = (await session.exec(
+                select(DefectImage)
+                .where(DefectImage.blob_sha256.is_(None), DefectImage.defect_image_id > last_id)
+                .order_by(DefectImage.defect_image_id)
+                .limit(batch_size)
+            )).all()
+            if not images:
+                break
+            last_id = images[-1].defect_image_id
+
+            blobs = []
+            legacy = []
+            for image in images:
+                report.images += 1
+                path = image_storage.static_path(image.image_url)
+                if not path.is_file():
+                    report.missing += 1
+                    print(f"Falta el archivo de defect_image_id={image.defect_image_id}: {image.image_url}")
+                    continue
+                sha256, extension, size, created = _store_existing(path, dry_run)
+                report.migrated += 1
+                report.bytes_before += size
+                if sha256 not in seen and created:
+                    report.new_blobs += 1
+                    report.bytes_written += size
+                seen.add(sha256)
+                blobs.append((sha256, extension, size))
+                legacy.append(path)
+                image.image_url = image_storage.blob_url(sha256, extension)
+                image.blob_sha256 = sha256
+                # Las variantes del árbol anterior se regeneran junto al blob
+                image.thumbnail_url = None
+                image.display_url = None
+                session.add(image)
+
+            if dry_run:
+                await session.rollback()
+            else:
+                await image_storage.add_references(session, blobs)
+                await session.commit()
+                if not keep_originals:
+                    _remove_legacy(legacy)
+            print(f"{report.images} imágenes revisadas, {report.migrated} migradas "
+                  f"({time.perf_counter() - started:.1f} s)")
+
+    legacy_root = Path(settings.STATIC_DIR) / "punch_list"
+    if not dry_run and not keep_originals and legacy_root.is_dir():
+        print(f"Carpetas vacías eliminadas: {_prune_empty_dirs(legacy_root)}")
+    return report
+
+
+async def verify(fix: bool) -> int:
+    """Devuelve la cantidad de blobs con ref_count distinto al real."""
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        actual: Dict[str, int] = dict((await session.exec(
+            select(DefectImage.blob_sha256, func.count())
+            .where(DefectImage.blob_sha256.is_not(None))
+            .group_by(DefectImage.blob_sha256)
+        )).all())
+        blobs = (await session.exec(select(ImageBlob))).all()
+        drift = 0
+        for blob in blobs:
+            real = actual.get(blob.sha256, 0)
+            if blob.ref_count != real:
+                drift += 1
+                print(f"{blob.sha256}: guardado={blob.ref_count} real={real}")
+                blob.ref_count = real
+                session.add(blob)
+        if fix:
+            await session.commit()
+    print(f"Blobs revisados: {len(blobs)}. Con drift: {drift}.")
+    return drift
+
+
+def _blob_files(sha256: str, extension: str) -> List[Path]:
+    path = image_storage.blob_path(sha256, extension)
+    return [path, variant_path(path, THUMBNAIL), variant_path(path, DISPLAY)]
+
+
+def _used_since(path: Path, cutoff: float) -> bool:
+    try:
+        return path.stat().st_mtime > cutoff
+    except FileNotFoundError:
+        return False
+
+
+async def gc(grace_minutes: float, dry_run: bool) -> Tuple[int, int]:
+    """Devuelve (blobs sin referencias borrados, archivos huérfanos borrados)."""
+    cutoff = time.time() - grace_minutes * 60
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        unreferenced = [
+            blob
+            for blob in (await session.exec(select(ImageBlob).where(ImageBlob.ref_count <= 0))).all()
+            if not _used_since(image_storage.blob_path(blob.sha256, blob.extension), cutoff)
+        ]
+        if not dry_run and unreferenced:
+            await session.exec(delete(ImageBlob).where(
+                ImageBlob.sha256.in_([blob.sha256 for blob in unreferenced]), ImageBlob.ref_count <= 0
+            ))
+            await session.commit()
+        known = set((await session.exec(select(ImageBlob.sha256))).all())
+
+    removed = 0
+    for blob in unreferenced:
+        if blob.sha256 in known and not dry_run:
+            continue  # volvió a referenciarse entre la consulta y el DELETE
+        removed += 1
+        print(f"Sin referencias: {blob.sha256}{blob.extension}")
+        if not dry_run:
+            for path in _blob_files(blob.sha256, blob.extension):
+                path.unlink(missing_ok=True)
+
+    # Archivos sin fila (subidas que fallaron, migraciones interrumpidas); el margen
+    # evita borrar los de una subida cuyo commit aún no termina
+    orphans = 0
+    root = Path(settings.STATIC_DIR) / image_storage.BLOB_DIR
+    for path in root.rglob("*") if root.is_dir() else ():
+        referenced = path.name[:64] in known and not path.name.endswith(".part")
+        if not path.is_file() or referenced or _used_since(path, cutoff):
+            continue
+        orphans += 1
+        print(f"Huérfano: {path}")
+        if not dry_run:
+            path.unlink(missing_ok=True)
+    return removed, orphans
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Pasar el árbol anterior al store")
+    migrate_parser.add_argument("--batch-size", type=int, default=200, help="Imágenes por commit")
+    migrate_parser.add_argument("--keep-originals", action="store_true", help="No borrar los archivos originales")
+    migrate_parser.add_argument("--dry-run", action="store_true", help="Solo hashear y reportar")
+
+    verify_parser = commands.add_parser("verify", help="Comparar ref_count con defect_image")
+    verify_parser.add_argument("--fix", action="store_true", help="Corregir el drift")
+
+    gc_parser = commands.add_parser("gc", help="Borrar blobs sin referencias y archivos huérfanos")
+    gc_parser.add_argument("--grace-minutes", type=float, default=60)
+    gc_parser.add_argument("--dry-run", action="store_true", help="Solo listar")
+
+    args = parser.parse_args(argv)
+    if args.command == "migrate":
+        report = asyncio.run(migrate(args.batch_size, args.keep_originals, args.dry_run))
+        saved = report.bytes_before - report.bytes_written
+        print(
+            f"Imágenes: {report.images}, migradas: {report.migrated}, sin archivo: {report.missing}. "
+            f"Blobs nuevos: {report.new_blobs} ({report.bytes_written} bytes; {saved} bytes duplicados evitados)."
+        )
+        return 1 if report.missing else 0
+    if args.command == "verify":
+        drift = asyncio.run(verify(args.fix))
+        return 1 if drift and not args.fix else 0
+    unreferenced, orphans = asyncio.run(gc(args.grace_minutes, args.dry_run))
+    print(f"Blobs sin referencias: {unreferenced}. Archivos huérfanos: {orphans}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
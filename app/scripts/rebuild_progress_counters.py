@@ -0,0 +1,51 @@
+"""
+Recalcula los contadores de progreso (tabla job_stage_count) desde la tabla
+object y reporta el drift encontrado.
+
+Uso (desde app/):
+    python -m scripts.rebuild_progress_counters            # recalcula todo
+    python -m scripts.rebuild_progress_counters --verify   # solo reporta
+    python -m scripts.rebuild_progress_counters --job WN675A
+"""
+import argparse
+import sys
+
+from sqlmodel import Session, select
+
+from db import engine
+from models import Job
+from services.progress_service import rebuild_counts
+
+
+def main(job_code: str | None, verify: bool) -> int:
+    """Devuelve 1 si se encontró drift en modo verificación, 0 en otro caso."""
+    with Session(engine) as session:
+        job_id = None
+        if job_code:
+            job_id = session.exec(select(Job.job_id).where(Job.job_code == job_code)).first()
+            if job_id is None:
+                print(f"El Job '{job_code}' no existe.")
+                return 1
+
+        report = rebuild_counts(session, job_id=job_id, fix=not verify)
+        for drift in report.drift:
+            print(
+                f"job_id={drift.job_id} item_id={drift.item_id} stage_id={drift.stage_id}: "
+                f"guardado={drift.stored} real={drift.actual}"
+            )
+        print(f"Contadores revisados: {report.checked}. Con drift: {len(report.drift)}.")
+
+        if verify:
+            return 1 if report.drift else 0
+        session.commit()
+        if report.drift:
+            print("Contadores recalculados.")
+        return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--job", help="job_code a revisar (por defecto todos)")
+    parser.add_argument("--verify", action="store_true", help="Solo reportar el drift, sin corregirlo")
+    args = parser.parse_args()
+    sys.exit(main(args.job, args.verify))
@@ -0,0 +1,303 @@
+"""
+Almacenamiento de imágenes direccionado por contenido.
+
+Cada archivo se guarda una sola vez bajo STATIC_DIR/blobs/ab/cd/<sha256>.<ext>
+(dos niveles de 256 carpetas), sin importar cuántas DefectImage lo usen; la
+tabla image_blob lleva la cuenta de referencias. Subir de nuevo la misma foto
+solo suma una referencia: no se escribe nada a disco.
+
+Cada `UploadFile` se hashea y copia por bloques en el threadpool (el event
+loop nunca hace I/O bloqueante ni carga el archivo completo en memoria) y los
+archivos de un mismo request se procesan en paralelo, hasta
+IMAGE_WRITE_CONCURRENCY a la vez. Los tres tipos de imagen (defecto,
+ubicación y solución) pasan por el mismo camino.
+"""
+import asyncio
+from collections import Counter
+from dataclasses import dataclass
+import hashlib
+import os
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple
+import uuid
+
+from fastapi import UploadFile
+from sqlalchemy import case, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from models import ImageBlob
+from services.metrics import IMAGE_BLOBS_DEDUPLICATED, IMAGE_BYTES_WRITTEN
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_EXTENSION = ".jpg"
+STATIC_URL = "/static"
+BLOB_DIR = "blobs"
+
+# Firma de los primeros bytes -> extensión; el formato sale del contenido, así
+# el mismo hash siempre tiene la misma extensión
+MAGIC_EXTENSIONS: Tuple[Tuple[bytes, str], ...] = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+
+# kind -> tipo de imagen en la tabla image_type
+IMAGE_TYPE_IDS: Dict[str, int] = {
+    "defect": 3,    # BEFORE ERROR
+    "location": 2,  # LOCATION IMAGE
+    "solved": 1,    # SOLVED IMAGE
+}
+
+
+class ImageTooLarge(Exception):
+    """La imagen supera IMAGE_MAX_BYTES."""
+
+
+@dataclass
+class StoredImage:
+    kind: str
+    image_type_id: int
+    sha256: str
+    extension: str
+    path: Path
+    url: str
+    size: int
+    # False si el contenido ya estaba en el store
+    created: bool
+
+    @property
+    def blob(self) -> Tuple[str, str, int]:
+        return self.sha256, self.extension, self.size
+
+
+def blob_relative(sha256: str, extension: str) -> PurePosixPath:
+    """Ruta, relativa a STATIC_DIR, del archivo de un hash."""
+    return PurePosixPath(BLOB_DIR, sha256[:2], sha256[2:4], f"{sha256}{extension}")
+
+
+def blob_path(sha256: str, extension: str) -> Path:
+    return Path(settings.STATIC_DIR) / blob_relative(sha256, extension)
+
+
+def blob_url(sha256: str, extension: str) -> str:
+    return f"{STATIC_URL}/{blob_relative(sha256, extension)}"
+
+
+def static_path(url: str) -> Path:
+    """Ruta en disco de una URL `/static/...`."""
+    return Path(settings.STATIC_DIR) / url.removeprefix(STATIC_URL + "/")
+
+
+def detect_extension(head: bytes, filename: Optional[str]) -> str:
+    """Extensión según el contenido; si no se reconoce, la del nombre del archivo."""
+    for magic, extension in MAGIC_EXTENSIONS:
+        if head.startswith(magic):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return ".heic"
+    suffix = Path(filename or "").suffix.lower()
+    suffix = ".jpg" if suffix == ".jpeg" else suffix
+    # Solo extensiones simples; cualquier otra cosa se guarda como .jpg
+    return suffix if suffix[1:].isalnum() else DEFAULT_EXTENSION
+
+
+def hash_file(source: BinaryIO, max_bytes: Optional[int] = None) -> Tuple[str, int, bytes]:
+    """(sha256, tamaño, primeros bytes) de `source`, leyéndolo por bloques."""
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    source.seek(0)
+    while chunk := source.read(CHUNK_SIZE):
+        if not head:
+            head = chunk[:16]
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            raise ImageTooLarge()
+        digest.update(chunk)
+    return digest.hexdigest(), size, head
+
+
+def place_blob(source: BinaryIO, destination: Path) -> bool:
+    """
+    Copia `source` a `destination` por bloques a través de un archivo temporal
+    si el contenido aún no está en el store. Devuelve True si escribió.
+    """
+    try:
+        # Se renueva el mtime: gc no borra un blob en 0 que se está volviendo a usar
+        os.utime(destination)
+        return False
+    except FileNotFoundError:
+        pass
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    # Nombre temporal único: dos requests pueden subir el mismo contenido a la vez
+    partial = destination.with_name(f"{destination.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        source.seek(0)
+        with open(partial, "wb") as out:
+            while chunk := source.read(CHUNK_SIZE):
+                out.write(chunk)
+        # Mismo contenido, mismo nombre: reemplazar es inocuo si otro ganó la carrera
+        os.replace(partial, destination)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return True
+
+
+def _store_file(source: BinaryIO, filename: Optional[str], max_bytes: int) -> Tuple[str, str, int, bool]:
+    # Primero solo lectura: si el contenido ya existe no se escribe nada
+    sha256, size, head = hash_file(source, max_bytes)
+    extension = detect_extension(head, filename)
+    created = place_blob(source, blob_path(sha256, extension))
+    return sha256, extension, size, created
+
+
+async def save_image(upload: UploadFile, kind: str, max_bytes: Optional[int] = None) -> StoredImage:
+    """
+    Guarda una imagen subida en el store.
+
+    Args:
+        upload (UploadFile): Archivo recibido.
+        kind (str): "defect", "location" o "solved".
+        max_bytes (int, optional): Tamaño máximo; por defecto IMAGE_MAX_BYTES.
+
+    Returns:
+        StoredImage: Hash, ruta en disco y URL pública de la imagen.
+    """
+    image_type_id = IMAGE_TYPE_IDS[kind]
+    max_bytes = settings.IMAGE_MAX_BYTES if max_bytes is None else max_bytes
+    too_large = f"{upload.filename}: la imagen supera el máximo de {max_bytes} bytes."
+    # Starlette ya conoce el tamaño del multipart: se rechaza sin tocar el disco
+    if upload.size is not None and upload.size > max_bytes:
+        raise ImageTooLarge(too_large)
+
+    try:
+        sha256, extension, size, created = await run_in_threadpool(
+            _store_file, upload.file, upload.filename, max_bytes
+        )
+    except ImageTooLarge:
+        raise ImageTooLarge(too_large) from None
+    if created:
+        IMAGE_BYTES_WRITTEN.inc(size, kind=kind)
+    else:
+        IMAGE_BLOBS_DEDUPLICATED.inc(kind=kind)
+    return StoredImage(
+        kind=kind,
+        image_type_id=image_type_id,
+        sha256=sha256,
+        extension=extension,
+        path=blob_path(sha256, extension),
+        url=blob_url(sha256, extension),
+        size=size,
+        created=created,
+    )
+
+
+async def save_images(uploads: Dict[str, Optional[Sequence[UploadFile]]]) -> List[StoredImage]:
+    """
+    Guarda en paralelo las imágenes de un defect record. Si una falla no se
+    borra nada: otra subida pudo referenciar el mismo blob entretanto, así que
+    los archivos que queden sin fila los recoge `scripts.image_store gc`.
+
+    Args:
+        uploads (dict): kind -> archivos subidos. Se ignoran los vacíos (sin nombre).
+
+    Returns:
+        list[StoredImage]: Imágenes guardadas, en el orden recibido.
+    """
+    pending = [
+        (kind, upload)
+        for kind, files in uploads.items()
+        for upload in files or ()
+        if upload.filename
+    ]
+    semaphore = asyncio.Semaphore(max(settings.IMAGE_WRITE_CONCURRENCY, 1))
+
+    async def save(kind: str, upload: UploadFile) -> StoredImage:
+        async with semaphore:
+            return await save_image(upload, kind)
+
+    results = await asyncio.gather(*(save(kind, upload) for kind, upload in pending), return_exceptions=True)
+    stored = [result for result in results if isinstance(result, StoredImage)]
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+    return stored
+
+
+def _insert(dialect: str):
+    """INSERT con ON CONFLICT del dialecto, o None si no lo soporta."""
+    if dialect == "postgresql":
+        return postgresql.insert
+    if dialect == "sqlite":
+        return sqlite.insert
+    return None
+
+
+def reference_rows(blobs: Iterable[Tuple[str, str, int]]) -> List[Dict]:
+    """Filas de image_blob con su incremento, a partir de (sha256, extensión, tamaño)."""
+    counts = Counter()
+    info = {}
+    for sha256, extension, size in blobs:
+        counts[sha256] += 1
+        info[sha256] = (extension, size)
+    return [
+        {"sha256": sha256, "extension": info[sha256][0], "size": info[sha256][1], "ref_count": n}
+        for sha256, n in counts.items()
+    ]
+
+
+async def add_references(session: AsyncSession, blobs: Iterable[Tuple[str, str, int]]) -> None:
+    """
+    Suma una referencia por (sha256, extensión, tamaño) en image_blob, en la
+    transacción de la sesión (junto con las DefectImage que las usan).
+    """
+    rows = reference_rows(blobs)
+    if not rows:
+        return
+    connection = await session.connection()
+    dialect_insert = _insert(connection.dialect.name)
+    if dialect_insert is not None:
+        upsert = dialect_insert(ImageBlob.__table__)
+        # Upsert: dos requests con el mismo contenido no chocan en la clave primaria
+        statement = upsert.on_conflict_do_update(
+            index_elements=["sha256"],
+            set_={"ref_count": ImageBlob.__table__.c.ref_count + upsert.excluded.ref_count},
+        )
+        await session.exec(statement.values(rows))
+        return
+
+    # Sin upsert: incremento atómico y, si el hash no existía, INSERT
+    for row in rows:
+        result = await session.exec(
+            update(ImageBlob)
+            .where(ImageBlob.sha256 == row["sha256"])
+            .values(ref_count=ImageBlob.ref_count + row["ref_count"])
+        )
+        if result.rowcount == 0:
+            await session.exec(insert(ImageBlob.__table__).values(**row))
+
+
+async def release_references(session: AsyncSession, sha256s: Iterable[Optional[str]]) -> None:
+    """
+    Resta una referencia por hash. Los archivos que quedan en 0 no se borran
+    aquí sino con `python -m scripts.image_store gc`.
+    """
+    counts = Counter(sha256 for sha256 in sha256s if sha256)
+    # Un UPDATE atómico por cantidad a restar: dos borrados simultáneos no pierden un decremento
+    by_amount: Dict[int, List[str]] = {}
+    for sha256, n in counts.items():
+        by_amount.setdefault(n, []).append(sha256)
+    for n, hashes in by_amount.items():
+        await session.exec(
+            update(ImageBlob)
+            .where(ImageBlob.sha256.in_(hashes))
+            .values(ref_count=case((ImageBlob.ref_count > n, ImageBlob.ref_count - n), else_=0))
+        )
@@ -0,0 +1,163 @@
+"""
+Variantes livianas de las imágenes de defect records.
+
+Por cada DefectImage se generan una miniatura (IMAGE_THUMBNAIL_PX) para los
+listados y una versión de pantalla comprimida (IMAGE_DISPLAY_PX) para el
+visor, ambas JPEG junto al original (`defect_<id>_thumb.jpg`,
+`defect_<id>_display.jpg`). Decodificar y redimensionar fotos de teléfono es
+CPU puro, así que corre en un pool de procesos y no compite con el event loop
+ni con el GIL de la API.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+from pathlib import Path, PurePath, PurePosixPath
+import threading
+from typing import Dict, Optional, Sequence
+import uuid
+
+from PIL import Image, ImageOps
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config import settings
+from models import DefectImage
+from services.image_storage import static_path
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL = "thumb"
+DISPLAY = "display"
+
+
+def variant_path(original: PurePath, variant: str) -> PurePath:
+    """Ruta (o URL) de una variante junto a su original."""
+    return original.with_name(f"{original.stem}_{variant}.jpg")
+
+
+def _save_jpeg(image: Image.Image, destination: Path, quality: int) -> None:
+    # Nombre único: dos builds del mismo blob no escriben el mismo temporal
+    partial = destination.with_name(f"{destination.name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        image.save(partial, format="JPEG", quality=quality, optimize=True, progressive=True)
+        os.replace(partial, destination)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+
+
+def build_variants(source: str, sizes: Dict[str, int], quality: int, force: bool = False) -> None:
+    """
+    Genera las variantes de `source` decodificando la imagen una sola vez.
+    Corre en un proceso del pool, por eso recibe solo tipos simples.
+
+    Args:
+        source (str): Ruta del original.
+        sizes (dict): variante -> lado mayor en px.
+        quality (int): Calidad JPEG.
+        force (bool): Regenerar aunque ya existan.
+    """
+    original = Path(source)
+    # El store deduplica: otra DefectImage con el mismo contenido ya pudo generarlas
+    if not force and all(variant_path(original, variant).exists() for variant in sizes):
+        return
+    with Image.open(original) as image:
+        # Las fotos de teléfono traen la rotación en EXIF
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        # De mayor a menor: cada variante se reduce desde la anterior
+        for variant, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            _save_jpeg(image, variant_path(original, variant), quality)
+
+
+class VariantPool:
+    """Pool de procesos para `build_variants`, creado en el primer uso."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: hacer fork de un proceso con event loop e hilos no es seguro
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    async def build(self, source: Path, force: bool = False) -> None:
+        sizes = {THUMBNAIL: settings.IMAGE_THUMBNAIL_PX, DISPLAY: settings.IMAGE_DISPLAY_PX}
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._get_executor(), build_variants, str(source), sizes, settings.IMAGE_VARIANT_QUALITY, force
+        )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+variant_pool = VariantPool(max_workers=settings.IMAGE_VARIANT_WORKERS)
+
+
+async def generate_variants(session: AsyncSession, image_ids: Sequence[int], force: bool = False) -> int:
+    """
+    Genera y registra las variantes de las DefectImage indicadas.
+
+    Las imágenes cuyo original falta o no se puede decodificar se registran en
+    el log y se omiten; el resto se guarda igual.
+
+    Args:
+        session (AsyncSession): Sesión de base de datos.
+        image_ids (Sequence[int]): defect_image_id a procesar.
+        force (bool): Regenerar aunque ya tengan variantes.
+
+    Returns:
+        int: Cantidad de imágenes actualizadas.
+    """
+    query = select(DefectImage).where(DefectImage.defect_image_id.in_(image_ids))
+    if not force:
+        query = query.where(DefectImage.thumbnail_url.is_(None))
+    images = (await session.exec(query)).all()
+    if not images:
+        return 0
+
+    results = await asyncio.gather(
+        *(variant_pool.build(static_path(image.image_url), force) for image in images), return_exceptions=True
+    )
+    updated = 0
+    for image, result in zip(images, results):
+        if isinstance(result, BaseException):
+            logger.warning(f"No se generaron variantes de {image.image_url}: {result!r}")
+            continue
+        url = PurePosixPath(image.image_url)
+        image.thumbnail_url = variant_path(url, THUMBNAIL).as_posix()
+        image.display_url = variant_path(url, DISPLAY).as_posix()
+        session.add(image)
+        updated += 1
+    await session.commit()
+    return updated
+
+
+async def generate_record_variants(defect_record_id: int) -> None:
+    """
+    Tarea en segundo plano tras una subida: genera las variantes pendientes
+    de un defect record con su propia sesión.
+    """
+    # Import diferido: los procesos del pool importan este módulo y no necesitan engines
+    from db import async_engine
+
+    try:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            image_ids = (await session.exec(
+                select(DefectImage.defect_image_id).where(DefectImage.defect_record_id == defect_record_id)
+            )).all()
+            await generate_variants(session, image_ids)
+    except Exception:
+        logger.exception(f"Falló la generación de variantes del defect record {defect_record_id}")
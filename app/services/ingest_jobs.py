@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import uuid
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Fases de una ingesta asíncrona
+PHASE_QUEUED = "queued"
+PHASE_PARSING = "parsing"
+PHASE_INSERTING = "inserting"
+PHASE_DONE = "done"
+PHASE_FAILED = "failed"
+
+
+class IngestQueueFull(Exception):
+    """Se alcanzó el máximo de ingestas pendientes."""
+
+
+@dataclass
+class IngestJob:
+    ingest_id: str
+    filename: str
+    product_name: str
+    phase: str = PHASE_QUEUED
+    rows_total: int = 0
+    rows_processed: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    status_code: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+    errors: Any = None
+
+    @property
+    def finished(self) -> bool:
+        return self.phase in (PHASE_DONE, PHASE_FAILED)
+
+    @property
+    def rows_per_second(self) -> float:
+        if not self.started_at:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.rows_processed / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ingest_id": self.ingest_id,
+            "filename": self.filename,
+            "product_name": self.product_name,
+            "phase": self.phase,
+            "rows_total": self.rows_total,
+            "rows_processed": self.rows_processed,
+            "rows_per_second": round(self.rows_per_second, 1),
+            "status_code": self.status_code,
+            "result": self.result,
+            "errors": self.errors,
+        }
+
+
+class IngestJobManager:
+    """
+    Ejecuta ingestas de CSV fuera del request en un pool de hilos acotado.
+
+    Guarda el estado de cada ingesta en memoria para consultarlo por id; las
+    ingestas terminadas se descartan después de `retention_seconds`.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, retention_seconds: int):
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, product_name: str, fn: Callable[..., None], *args) -> IngestJob:
+        """
+        Registra una ingesta y la encola; `fn` recibe el IngestJob y `args`.
+
+        Raises:
+            IngestQueueFull: Si ya hay `max_pending` ingestas sin terminar.
+        """
+        with self._lock:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                raise IngestQueueFull(f"Hay {pending} ingestas pendientes.")
+            job = IngestJob(ingest_id=uuid.uuid4().hex, filename=filename, product_name=product_name)
+            self._jobs[job.ingest_id] = job
+
+        self._executor.submit(self._run, fn, job, *args)
+        return job
+
+    def get(self, ingest_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(ingest_id)
+
+    def _run(self, fn: Callable[..., None], job: IngestJob, *args) -> None:
+        job.started_at = time.time()
+        try:
+            fn(job, *args)
+        except Exception as e:
+            logger.exception(f"Ingest {job.ingest_id} failed")
+            job.phase = PHASE_FAILED
+            job.status_code = job.status_code or 500
+            job.errors = job.errors or {"error": "Ocurrió un error inesperado.", "details": str(e)}
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        expired = [key for key, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for key in expired:
+            del self._jobs[key]
+
+
+ingest_jobs = IngestJobManager(
+    max_workers=settings.INGEST_WORKERS,
+    max_pending=settings.INGEST_MAX_PENDING,
+    retention_seconds=settings.INGEST_RETENTION_SECONDS,
+)
@@ -0,0 +1,166 @@
+from dataclasses import dataclass
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from models import Item, Object, Process
+from services.metrics import INGEST_ROWS, INGEST_ROWS_PER_SECOND
+from services.progress_service import apply_count_deltas
+
+logger = logging.getLogger(__name__)
+
+# Traducción de los valores de 'Clase' del CSV a nombres de Process
+map_dict: Dict[str, str] = {
+    "Almacén": "Warehouse",
+    "Corte": "Cutting",
+    "Doblado": "Bending",
+    "Maquinado": "Machining"
+}
+
+# Filas por bloque de inserción; mantiene los IN (...) bajo el límite de variables de SQLite
+INSERT_CHUNK_SIZE = 500
+
+# Columnas del CSV -> columnas de la tabla item
+ITEM_COLUMNS: Dict[str, str] = {
+    "Item": "item_name",
+    "Espesor": "espesor",
+    "Longitud": "longitud",
+    "Ancho": "ancho",
+    "Alto": "alto",
+    "Volumen": "volumen",
+    "Área Superficial": "area_superficial",
+    "Cantidad": "cantidad",
+    "Material": "material",
+    "OCR": "ocr",
+}
+
+
+@dataclass
+class IngestResult:
+    items_created: int = 0
+    objects_created: int = 0
+
+
+def resolve_processes(session: Session, class_names) -> Dict[str, int]:
+    """
+    Resuelve los valores de 'Clase' a process_id con una sola consulta IN.
+
+    Los Process que no existen se crean dentro de la transacción actual
+    (flush, sin commit).
+
+    Args:
+        session (Session): Sesión de la base de datos.
+        class_names: Valores únicos de la columna 'Clase'.
+
+    Returns:
+        Dict[str, int]: Mapa de 'Clase' original a process_id.
+    """
+    mapped = {name: map_dict.get(name, name) for name in class_names}
+    process_names = list(dict.fromkeys(mapped.values()))
+    existing = session.exec(
+        select(Process).where(Process.process_name.in_(process_names))
+    ).all()
+    by_name = {process.process_name: process for process in existing}
+
+    for process_name in process_names:
+        if process_name not in by_name:
+            logger.info(f"Creating new process: {process_name}")
+            new_process = Process(process_name=process_name)
+            session.add(new_process)
+            by_name[process_name] = new_process
+    session.flush()
+
+    return {name: by_name[process_name].process_id for name, process_name in mapped.items()}
+
+
+def bulk_insert_items(
+    session: Session,
+    df: pd.DataFrame,
+    job_id: int,
+    chunk_size: int = INSERT_CHUNK_SIZE,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> IngestResult:
+    """
+    Inserta los Items del DataFrame y sus Objects usando executemany.
+
+    Las filas se insertan en bloques de `chunk_size` para poder reportar
+    avance; todo ocurre en la transacción de `session` y el commit queda
+    a cargo de quien llama.
+
+    Args:
+        session (Session): Sesión de la base de datos.
+        df (pd.DataFrame): Filas del CSV ya validadas (sin Items existentes
+            ni nombres de Item repetidos).
+        job_id (int): Job al que pertenecen los Items.
+        chunk_size (int): Filas por bloque de inserción.
+        on_progress (Callable[[int], None], optional): Recibe el total de
+            filas insertadas después de cada bloque.
+
+    Returns:
+        IngestResult: Cantidad de Items y Objects creados.
+
+    Raises:
+        ValueError: Si un nombre de Item se repite en `df`.
+    """
+    result = IngestResult()
+    if df.empty:
+        return result
+
+    started = time.perf_counter()
+    process_ids = resolve_processes(session, df["Clase"].unique())
+
+    items = df[list(ITEM_COLUMNS)].rename(columns=ITEM_COLUMNS)
+    items["item_name"] = items["item_name"].astype(str)
+    items["ocr"] = items["ocr"].astype(str)
+    # Valores NaN se guardan como 0
+    items[["volumen", "area_superficial"]] = items[["volumen", "area_superficial"]].fillna(0)
+    duplicated = items["item_name"][items["item_name"].duplicated()]
+    if not duplicated.empty:
+        # Los item_id se resuelven por nombre: un nombre repetido mezclaría las piezas de dos filas
+        raise ValueError(f"Items duplicados en el Job {job_id}: {sorted(set(duplicated))}")
+    items["job_id"] = job_id
+    items["process_id"] = df["Clase"].map(process_ids)
+
+    for start in range(0, len(items), chunk_size):
+        chunk = items.iloc[start:start + chunk_size]
+        session.execute(insert(Item.__table__), chunk.to_dict(orient="records"))
+
+        # Recuperar los item_id recién insertados (item_name es único dentro del Job)
+        inserted = session.exec(
+            select(Item.item_name, Item.item_id)
+            .where(Item.job_id == job_id)
+            .where(Item.item_name.in_(chunk["item_name"].tolist()))
+        ).all()
+        item_ids = chunk["item_name"].map(dict(inserted)).to_numpy(dtype=np.int64)
+
+        # Un Object por unidad de 'Cantidad', numerados 1..Cantidad dentro de cada Item
+        quantities = chunk["cantidad"].to_numpy(dtype=np.int64)
+        object_item_ids = np.repeat(item_ids, quantities)
+        piece_numbers = np.arange(len(object_item_ids)) - np.repeat(np.cumsum(quantities) - quantities, quantities) + 1
+        objects = [
+            {"current_stage": 1, "rework": 0, "scrap": 0, "item_id": item_id, "piece_number": piece_number}
+            for item_id, piece_number in zip(object_item_ids.tolist(), piece_numbers.tolist())
+        ]
+        if objects:
+            session.execute(insert(Object.__table__), objects)
+        # Todas las piezas nuevas empiezan en el stage 1
+        apply_count_deltas(session, [
+            (job_id, item_id, 1, cantidad)
+            for item_id, cantidad in zip(item_ids.tolist(), chunk["cantidad"].tolist())
+        ])
+
+        result.items_created += len(chunk)
+        result.objects_created += len(objects)
+        if on_progress:
+            on_progress(result.items_created)
+
+    INGEST_ROWS.inc(result.items_created)
+    elapsed = time.perf_counter() - started
+    if elapsed > 0:
+        INGEST_ROWS_PER_SECOND.set(result.items_created / elapsed)
+    return result
@@ -2,7 +2,7 @@ from typing import List
 from sqlmodel import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models.object import Item
+from models import Item
 
 async def get_items_by_ocr(ocr: str, session: AsyncSession) -> List[Item]:
     """
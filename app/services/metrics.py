@@ -0,0 +1,195 @@
+"""
+Métricas de la API en formato de exposición de texto de Prometheus.
+
+Registro mínimo en memoria (Counter, Gauge, Histogram con etiquetas): cada
+observación es un lock y una suma, así que puede llamarse desde el camino
+caliente (middleware, eventos del engine) sin costo apreciable.
+"""
+from bisect import bisect_left
+import math
+import threading
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Buckets por defecto de prometheus_client, en segundos
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+DB_BUCKETS: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+OCR_BUCKETS: Tuple[float, ...] = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}, se recibió {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """(nombre, etiquetas formateadas, valor) de cada muestra."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key -> (conteo por bucket sin acumular, suma)
+        self._values: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * len(self.buckets), [0.0])
+            counts, total = entry
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        bucket_names = self.labelnames + ("le",)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(bucket_names, key + (_format_value(bound),)), cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"La métrica {metric.name} ya está registrada.")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Latencia de los requests HTTP por ruta.", ["method", "route", "status"]
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests HTTP en proceso.")
+
+# Base de datos
+DB_QUERIES = Counter("db_queries_total", "Sentencias SQL ejecutadas.")
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Duración de las sentencias SQL.", buckets=DB_BUCKETS)
+# Solo cuenta fallos: las esperas que terminaron obteniendo el lock van en DB_LOCK_WAIT
+DB_LOCK_ERRORS = Counter(
+    "db_lock_errors_total", "Sentencias que fallaron con 'database is locked' tras agotar busy_timeout."
+)
+# SQLite no expone el tiempo en su busy handler: se aproxima con las escrituras que
+# superan SQLITE_LOCK_WAIT_THRESHOLD_MS (y las que agotaron busy_timeout)
+DB_LOCK_WAIT = Histogram(
+    "db_lock_wait_seconds", "Escrituras SQLite lentas, probablemente esperando el lock de escritura.",
+    buckets=DB_BUCKETS,
+)
+
+# Ingesta de CSV
+INGEST_ROWS = Counter("ingest_rows_total", "Filas de CSV insertadas.")
+INGEST_ROWS_PER_SECOND = Gauge("ingest_rows_per_second", "Filas por segundo de la última ingesta.")
+
+# OCR
+OCR_DURATION = Histogram("ocr_request_duration_seconds", "Latencia de las llamadas a OCR.", buckets=OCR_BUCKETS)
+OCR_FAILURES = Counter("ocr_failures_total", "Llamadas a OCR fallidas.", ["reason"])
+OCR_CACHE_LOOKUPS = Counter("ocr_cache_lookups_total", "Consultas a la caché OCR por resultado.", ["result"])
+OCR_CACHE_SAVED_SECONDS = Counter(
+    "ocr_cache_saved_seconds_total", "Segundos de OCR ahorrados (latencia original de los aciertos)."
+)
+
+# Imágenes
+IMAGE_BYTES_WRITTEN = Counter("image_bytes_written_total", "Bytes de imágenes escritos a disco.", ["kind"])
+IMAGE_BLOBS_DEDUPLICATED = Counter(
+    "image_blobs_deduplicated_total", "Imágenes subidas cuyo contenido ya estaba en el store.", ["kind"]
+)
+
+
+def render_metrics() -> str:
+    """Todas las métricas registradas en formato de texto de Prometheus."""
+    return REGISTRY.render()
@@ -0,0 +1,323 @@
+"""
+Caché de resultados OCR.
+
+La clave es el sha256 de los bytes de la imagen: la misma foto escaneada dos
+veces (reintentos del operador, el mismo código en varias piezas) no vuelve a
+pagar la llamada a Azure. Dos niveles:
+
+    memoria  LRU de OCR_CACHE_MEMORY_ENTRIES resultados, por proceso.
+    disco    SQLite en OCR_CACHE_PATH, compartido entre reinicios y workers.
+             Las entradas vencen a los OCR_CACHE_TTL_SECONDS y, si el archivo
+             pasa de OCR_CACHE_MAX_BYTES, se borran las de acceso más antiguo.
+
+Solo se guardan lecturas exitosas (también las sin texto); los errores, plazos
+vencidos y lecturas fallidas siempre vuelven al backend. Cada acierto suma la
+latencia original de esa lectura como tiempo ahorrado.
+"""
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from services.metrics import OCR_CACHE_LOOKUPS, OCR_CACHE_SAVED_SECONDS
+from services.ocr_service import AsyncOCRClient
+
+logger = logging.getLogger(__name__)
+
+MEMORY = "memory"
+DISK = "disk"
+MISS = "miss"
+
+# Al pasar del máximo se libera hasta este porcentaje, para no evictar en cada escritura
+EVICT_TARGET = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_result (
+    key TEXT PRIMARY KEY,
+    lines TEXT NOT NULL,
+    ocr_seconds REAL NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_ocr_result_last_access ON ocr_result (last_access);
+CREATE INDEX IF NOT EXISTS ix_ocr_result_created_at ON ocr_result (created_at);
+"""
+
+
+def image_key(image: bytes) -> str:
+    return hashlib.sha256(image).hexdigest()
+
+
+@dataclass
+class CachedResult:
+    lines: List[str]
+    # Lo que tardó la lectura original: lo que ahorra cada acierto
+    ocr_seconds: float
+    created_at: float
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    saved_seconds: float = 0.0
+    ocr_seconds: float = 0.0
+    evicted: int = 0
+    expired: int = 0
+
+
+class OCRCache:
+    """LRU en memoria delante de una tabla SQLite con TTL y tope de tamaño."""
+
+    def __init__(
+        self,
+        path: Optional[str] = settings.OCR_CACHE_PATH,
+        memory_entries: int = settings.OCR_CACHE_MEMORY_ENTRIES,
+        ttl_seconds: float = settings.OCR_CACHE_TTL_SECONDS,
+        max_bytes: int = settings.OCR_CACHE_MAX_BYTES,
+    ):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._memory: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        # sqlite3 no admite uso concurrente de una conexión desde varios hilos
+        self._lock = threading.Lock()
+
+    # --- disco (siempre en el threadpool) ---
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._disk_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_result").fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    def _disk_get(self, key: str, now: float) -> Optional[CachedResult]:
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT lines, ocr_seconds, created_at, size FROM ocr_result WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            lines, ocr_seconds, created_at, size = row
+            if now - created_at > self.ttl_seconds:
+                db.execute("DELETE FROM ocr_result WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                self.stats.expired += 1
+                return None
+            db.execute("UPDATE ocr_result SET last_access = ? WHERE key = ?", (now, key))
+            return CachedResult(json.loads(lines), ocr_seconds, created_at)
+
+    def _disk_put(self, key: str, result: CachedResult) -> None:
+        payload = json.dumps(result.lines, ensure_ascii=False)
+        size = len(key) + len(payload.encode("utf-8"))
+        with self._lock:
+            db = self._db()
+            previous = db.execute("SELECT size FROM ocr_result WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO ocr_result (key, lines, ocr_seconds, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, payload, result.ocr_seconds, size, result.created_at, result.created_at),
+            )
+            self._disk_bytes += size - (previous[0] if previous else 0)
+            if self._disk_bytes > self.max_bytes:
+                self._evict(db, result.created_at)
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        # Primero lo vencido; después lo de acceso más antiguo hasta bajar del objetivo
+        expired = db.execute(
+            "DELETE FROM ocr_result WHERE created_at < ? RETURNING size", (now - self.ttl_seconds,)
+        ).fetchall()
+        self.stats.expired += len(expired)
+        self._disk_bytes -= sum(size for (size,) in expired)
+        target = self.max_bytes * EVICT_TARGET
+        while self._disk_bytes > target:
+            oldest = db.execute(
+                "SELECT key, size FROM ocr_result ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if not oldest:
+                self._disk_bytes = 0
+                break
+            for key, size in oldest:
+                if self._disk_bytes <= target:
+                    break
+                db.execute("DELETE FROM ocr_result WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                self.stats.evicted += 1
+
+    def _disk_clear(self) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM ocr_result")
+            self._disk_bytes = 0
+
+    def _disk_entries(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM ocr_result").fetchone()[0]
+
+    # --- memoria ---
+
+    def _remember(self, key: str, result: CachedResult) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_get(self, key: str, now: float) -> Optional[CachedResult]:
+        result = self._memory.get(key)
+        if result is None:
+            return None
+        if now - result.created_at > self.ttl_seconds:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return result
+
+    # --- API ---
+
+    async def get(self, key: str) -> Tuple[Optional[CachedResult], str]:
+        """
+        Busca un resultado.
+
+        Returns:
+            tuple: (resultado o None, nivel: "memory", "disk" o "miss").
+        """
+        now = time.time()
+        result = self._memory_get(key, now)
+        tier = MEMORY
+        if result is None and self.path:
+            result = await run_in_threadpool(self._disk_get, key, now)
+            tier = DISK
+            if result is not None:
+                self._remember(key, result)
+        if result is None:
+            self.stats.misses += 1
+            OCR_CACHE_LOOKUPS.inc(result=MISS)
+            return None, MISS
+
+        if tier == MEMORY:
+            self.stats.memory_hits += 1
+        else:
+            self.stats.disk_hits += 1
+        self.stats.saved_seconds += result.ocr_seconds
+        OCR_CACHE_LOOKUPS.inc(result=tier)
+        OCR_CACHE_SAVED_SECONDS.inc(result.ocr_seconds)
+        return result, tier
+
+    async def put(self, key: str, lines: List[str], ocr_seconds: float) -> None:
+        result = CachedResult(list(lines), ocr_seconds, time.time())
+        self.stats.ocr_seconds += ocr_seconds
+        self._remember(key, result)
+        if self.path:
+            try:
+                await run_in_threadpool(self._disk_put, key, result)
+            except sqlite3.Error:
+                # El nivel de disco es opcional: sin él la caché sigue en memoria
+                logger.exception("No se pudo guardar el resultado OCR en %s", self.path)
+
+    async def clear(self) -> None:
+        """Vacía ambos niveles (p. ej. al cambiar de modelo OCR)."""
+        self._memory.clear()
+        if self.path:
+            await run_in_threadpool(self._disk_clear)
+
+    def reset_stats(self) -> None:
+        self.stats = CacheStats()
+
+    async def snapshot(self) -> Dict:
+        """Estadísticas acumuladas y tamaño actual de ambos niveles."""
+        stats = self.stats
+        hits = stats.memory_hits + stats.disk_hits
+        lookups = hits + stats.misses
+        disk_entries = await run_in_threadpool(self._disk_entries) if self.path else 0
+        return {
+            "lookups": lookups,
+            "memory_hits": stats.memory_hits,
+            "disk_hits": stats.disk_hits,
+            "misses": stats.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "ocr_calls_saved": hits,
+            "saved_seconds": round(stats.saved_seconds, 3),
+            "ocr_seconds": round(stats.ocr_seconds, 3),
+            "memory_entries": len(self._memory),
+            "disk_entries": disk_entries,
+            "disk_bytes": self._disk_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "evicted": stats.evicted,
+            "expired": stats.expired,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class CachedOCRClient:
+    """
+    Misma interfaz que AsyncOCRClient, con la caché delante. Lecturas
+    simultáneas de la misma imagen comparten una sola llamada al backend.
+    """
+
+    def __init__(self, client: AsyncOCRClient, cache: OCRCache):
+        self.client = client
+        self.cache = cache
+        # clave -> [tarea de lectura, requests esperándola]
+        self._inflight: Dict[str, list] = {}
+
+    async def read_text(self, image: bytes, timeout: Optional[float] = None) -> Optional[List[str]]:
+        key = await run_in_threadpool(image_key, image)
+        cached, _ = await self.cache.get(key)
+        if cached is not None:
+            return list(cached.lines)
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(self._read_and_store(key, image, timeout))
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # shield: si un request se cancela, la lectura sigue para los demás
+            lines = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # ... salvo que fuera el último que la esperaba
+            if entry[1] == 1:
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+        return None if lines is None else list(lines)
+
+    async def _read_and_store(self, key: str, image: bytes, timeout: Optional[float]) -> Optional[List[str]]:
+        started = time.perf_counter()
+        lines = await self.client.read_text(image, timeout)
+        if lines is not None:
+            await self.cache.put(key, lines, time.perf_counter() - started)
+        return lines
+
+
+ocr_cache = OCRCache()
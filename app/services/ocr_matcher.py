@@ -0,0 +1,360 @@
+"""
+Índice en memoria de los `Item.ocr` para resolver lecturas OCR imperfectas.
+
+El OCR de una etiqueta rara vez sale idéntico al `Item.ocr` guardado: una O
+leída como 0, un espacio de más, el código del Job en otra línea. En vez de
+una igualdad exacta contra la base, cada lectura se compara con todos los
+Items por trigramas y los mejores candidatos se ordenan por distancia de
+edición.
+
+    clave        OCR en mayúsculas, sin espacios y con los caracteres que el OCR
+                 confunde (O/0, I/1, S/5, ...) llevados a uno solo.
+    trigramas    trigrama de la clave -> item_ids, para elegir candidatos sin
+                 recorrer todo el índice.
+    prefijos     claves ordenadas (sin plegar) para el autocompletado manual.
+
+El índice se carga en el primer uso, suma los Items de cada ingesta al hacer
+commit, quita los que se borran y además se reconstruye completo cada
+OCR_MATCH_REFRESH_SECONDS por si algo cambió por otro camino.
+"""
+import asyncio
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from models import Item, Job, OCRCandidate
+
+# Caracteres que el OCR confunde entre sí -> representante común
+_CONFUSABLE = str.maketrans("OQDILZSB|", "001112581")
+_SPACES = re.compile(r"\s+")
+# "<ocr del item>_<pieza>", también con el "_" leído como espacio
+_PIECE_SUFFIX = re.compile(r"^(.+?)\s*[_\s]\s*(\d{1,5})$")
+
+# Pares (lectura, Item) elegidos por trigramas que se comparan con distancia de edición
+CANDIDATES = 24
+# Una diferencia que solo es confusión del OCR (O/0) pesa menos que un error real
+CONFUSABLE_WEIGHT = 0.25
+# Penalización si la pieza leída no existe en el Item
+BAD_PIECE_PENALTY = 0.95
+# Con más líneas no se prueban combinaciones de a pares
+MAX_PAIRED_LINES = 4
+
+
+def normalize(text: str) -> str:
+    """Mayúsculas y sin espacios: la forma en que se compara y se autocompleta."""
+    return _SPACES.sub("", text).upper()
+
+
+def fold(text: str) -> str:
+    """`normalize` con los caracteres confundibles unificados."""
+    return normalize(text).translate(_CONFUSABLE)
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"^^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein(a: str, b: str) -> int:
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        left = i
+        for j, char_b in enumerate(b):
+            # Mínimo entre borrar, insertar y sustituir, sin llamar a min()
+            cost = previous[j] if char_a == char_b else previous[j] + 1
+            if previous[j + 1] + 1 < cost:
+                cost = previous[j + 1] + 1
+            if left + 1 < cost:
+                cost = left + 1
+            current.append(cost)
+            left = cost
+        previous = current
+    return previous[-1]
+
+
+def similarity(query: str, candidate: str) -> float:
+    """
+    1.0 si son iguales; baja con cada edición sobre la clave plegada y, mucho
+    menos, con las diferencias que solo son confusiones del OCR.
+    """
+    folded_query, folded_candidate = fold(query), fold(candidate)
+    longest = max(len(folded_query), len(folded_candidate), 1)
+    distance = levenshtein(folded_query, folded_candidate)
+    raw_query, raw_candidate = normalize(query), normalize(candidate)
+    confusions = 0 if raw_query == raw_candidate else max(levenshtein(raw_query, raw_candidate) - distance, 0)
+    return max(0.0, 1.0 - (distance + CONFUSABLE_WEIGHT * confusions) / longest)
+
+
+def query_variants(lines: Sequence[str]) -> List[Tuple[str, Optional[int]]]:
+    """
+    Lecturas posibles (OCR del Item, pieza) a partir de las líneas del OCR:
+    cada línea entera, cada línea sin su sufijo de pieza y, si son pocas
+    líneas, cada par concatenado (el código del Job suele salir en otra línea).
+    """
+    texts = [line.strip() for line in lines if line.strip()]
+    if len(texts) <= MAX_PAIRED_LINES:
+        texts += [a + b for a in texts[:] for b in texts[:] if a is not b]
+    variants: Dict[Tuple[str, Optional[int]], None] = {}
+    for text in texts:
+        variants[(text, None)] = None
+        match = _PIECE_SUFFIX.match(text)
+        if match:
+            variants[(match.group(1), int(match.group(2)))] = None
+    return list(variants)
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    item_id: int
+    ocr: str
+    item_name: str
+    job_code: str
+    piece_count: int
+
+
+@dataclass
+class Match:
+    entry: IndexEntry
+    score: float
+    piece_number: Optional[int] = None
+
+    @property
+    def scanned_ocr(self) -> Optional[str]:
+        """El código que aceptan los endpoints de /object ("<ocr>_<pieza>")."""
+        if self.piece_number is None:
+            return None
+        return f"{self.entry.ocr}_{self.piece_number}"
+
+
+def to_candidate(match: Match) -> OCRCandidate:
+    entry = match.entry
+    return OCRCandidate(
+        item_id=entry.item_id,
+        ocr=entry.ocr,
+        item_name=entry.item_name,
+        job_code=entry.job_code,
+        score=match.score,
+        piece_number=match.piece_number,
+        piece_count=entry.piece_count,
+        scanned_ocr=match.scanned_ocr,
+    )
+
+
+class OCRIndex:
+    def __init__(self):
+        self._entries: Dict[int, IndexEntry] = {}
+        self._keys: Dict[int, str] = {}
+        self._grams: Dict[str, Set[int]] = {}
+        self._prefixes: List[Tuple[str, int]] = []
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def is_stale(self, max_age: float) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > max_age
+
+    def _add(self, entry: IndexEntry) -> None:
+        self._remove(entry.item_id)
+        key = fold(entry.ocr)
+        self._entries[entry.item_id] = entry
+        self._keys[entry.item_id] = key
+        for gram in trigrams(key):
+            self._grams.setdefault(gram, set()).add(entry.item_id)
+
+    def _remove(self, item_id: int) -> None:
+        key = self._keys.pop(item_id, None)
+        if key is None:
+            return
+        del self._entries[item_id]
+        for gram in trigrams(key):
+            postings = self._grams.get(gram)
+            if postings is not None:
+                postings.discard(item_id)
+                if not postings:
+                    del self._grams[gram]
+
+    def _sort_prefixes(self) -> None:
+        self._prefixes = sorted((normalize(entry.ocr), item_id) for item_id, entry in self._entries.items())
+
+    def rebuild(self, entries: Iterable[IndexEntry]) -> None:
+        """Reemplaza todo el índice (se construye aparte y se cambia de una vez)."""
+        fresh = OCRIndex()
+        for entry in entries:
+            fresh._add(entry)
+        fresh._sort_prefixes()
+        with self._lock:
+            self._entries, self._keys = fresh._entries, fresh._keys
+            self._grams, self._prefixes = fresh._grams, fresh._prefixes
+            self.loaded_at = time.monotonic()
+
+    def clear(self) -> None:
+        """Vacía el índice; se vuelve a cargar en el próximo uso."""
+        self.rebuild(())
+        self.loaded_at = None
+
+    def add(self, entries: Iterable[IndexEntry]) -> None:
+        with self._lock:
+            for entry in entries:
+                self._add(entry)
+            self._sort_prefixes()
+
+    def remove(self, item_ids: Iterable[int]) -> None:
+        with self._lock:
+            for item_id in item_ids:
+                self._remove(item_id)
+            self._sort_prefixes()
+
+    def _candidates(self, key: str, job_code: Optional[str]) -> List[Tuple[int, float]]:
+        grams = trigrams(key)
+        # Los trigramas presentes en casi todo el índice (p. ej. el código del
+        # Job) no distinguen nada y son los más caros de recorrer
+        common = max(1000, len(self._entries) // 10)
+        postings = sorted((self._grams.get(gram, ()) for gram in grams), key=len)
+        selective = [p for p in postings if len(p) <= common] or postings
+        shared: Counter = Counter()
+        for posting in selective:
+            shared.update(posting)
+        if job_code is None:
+            # Solo vale la pena calcular Dice para los que más trigramas comparten
+            ranked = shared.most_common(CANDIDATES * 4)
+        else:
+            ranked = [(i, n) for i, n in shared.items() if self._entries[i].job_code == job_code]
+        scored = []
+        for item_id, count in ranked:
+            # Dice sobre trigramas
+            scored.append((item_id, 2 * count / (len(grams) + len(self._keys[item_id]) + 1)))
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:CANDIDATES]
+
+    def match(
+        self,
+        lines: Sequence[str],
+        limit: int = 5,
+        job_code: Optional[str] = None,
+        min_score: float = 0.0,
+    ) -> List[Match]:
+        """
+        Items más parecidos a las líneas leídas por el OCR, de mejor a peor.
+
+        Args:
+            lines (list[str]): Líneas devueltas por el OCR.
+            limit (int): Máximo de candidatos.
+            job_code (str, optional): Solo Items de este Job.
+            min_score (float): Descarta candidatos con menor puntaje.
+
+        Returns:
+            list[Match]: Un candidato por Item, con la pieza si la lectura la incluía.
+        """
+        best: Dict[int, Match] = {}
+        with self._lock:
+            # Primero todas las lecturas por trigramas; la distancia de edición
+            # (lo caro) solo para los mejores pares (lectura, Item)
+            pairs = []
+            for text, piece in query_variants(lines):
+                key = fold(text)
+                if key:
+                    pairs += [(dice, item_id, text, piece) for item_id, dice in self._candidates(key, job_code)]
+            pairs.sort(key=lambda pair: pair[0], reverse=True)
+            for _, item_id, text, piece in pairs[:CANDIDATES]:
+                entry = self._entries[item_id]
+                score = similarity(text, entry.ocr)
+                piece_number = piece
+                if piece is not None and not 1 <= piece <= entry.piece_count:
+                    score *= BAD_PIECE_PENALTY
+                    piece_number = None
+                current = best.get(item_id)
+                # A igual puntaje gana la lectura que trae número de pieza
+                if current is None or (score, piece_number is not None) > \
+                        (current.score, current.piece_number is not None):
+                    best[item_id] = Match(entry, round(score, 4), piece_number)
+        ranked = sorted(best.values(), key=lambda m: (m.score, m.piece_number is not None), reverse=True)
+        return [m for m in ranked if m.score >= min_score][:limit]
+
+    def complete(self, prefix: str, limit: int = 10, job_code: Optional[str] = None) -> List[IndexEntry]:
+        """Items cuyo OCR empieza con `prefix` (sin distinguir mayúsculas ni espacios)."""
+        key = normalize(prefix)
+        results = []
+        with self._lock:
+            for ocr_key, item_id in self._prefixes[bisect_left(self._prefixes, (key, -1)):]:
+                if not ocr_key.startswith(key) or len(results) >= limit:
+                    break
+                entry = self._entries[item_id]
+                if job_code is None or entry.job_code == job_code:
+                    results.append(entry)
+        return results
+
+
+def confident_match(matches: Sequence[Match], min_confidence: float, min_margin: float) -> Optional[Match]:
+    """
+    El mejor candidato si alcanza para aplicar un cambio sin confirmación:
+    trae número de pieza, tiene al menos `min_confidence` y le saca
+    `min_margin` al segundo. None si hay que preguntar.
+    """
+    if not matches:
+        return None
+    best = matches[0]
+    if best.piece_number is None or best.score < min_confidence:
+        return None
+    if len(matches) > 1 and best.score - matches[1].score < min_margin:
+        return None
+    return best
+
+
+def _entries_query(job_id: Optional[int] = None):
+    query = (
+        select(Item.item_id, Item.ocr, Item.item_name, Job.job_code, Item.cantidad)
+        .join(Job, Item.job_id == Job.job_id)
+    )
+    if job_id is not None:
+        query = query.where(Item.job_id == job_id)
+    return query
+
+
+def _to_entries(rows) -> List[IndexEntry]:
+    return [
+        IndexEntry(item_id=item_id, ocr=ocr, item_name=item_name, job_code=job_code, piece_count=cantidad)
+        for item_id, ocr, item_name, job_code, cantidad in rows
+    ]
+
+
+ocr_index = OCRIndex()
+_loading = asyncio.Lock()
+
+
+async def get_ocr_index(session: AsyncSession) -> OCRIndex:
+    """
+    El índice compartido, cargado (o recargado si venció
+    OCR_MATCH_REFRESH_SECONDS) con una consulta y construido en el threadpool.
+    """
+    if ocr_index.is_stale(settings.OCR_MATCH_REFRESH_SECONDS):
+        async with _loading:
+            if ocr_index.is_stale(settings.OCR_MATCH_REFRESH_SECONDS):
+                rows = (await session.exec(_entries_query())).all()
+                await run_in_threadpool(ocr_index.rebuild, _to_entries(rows))
+    return ocr_index
+
+
+def index_job_items(session: Session, job_id: int) -> None:
+    """
+    Suma al índice los Items de un Job después de una ingesta (ya con commit).
+    Si el índice aún no se cargó no hace nada: se cargará completo en el primer uso.
+    """
+    if ocr_index.loaded_at is None:
+        return
+    ocr_index.add(_to_entries(session.exec(_entries_query(job_id)).all()))
@@ -1,61 +1,331 @@
-import os
-import time
-from azure.cognitiveservices.vision.computervision import ComputerVisionClient
-from msrest.authentication import CognitiveServicesCredentials
-from dotenv import load_dotenv
+"""
+Cliente OCR asíncrono.
+
+La lectura de Azure es una operación larga: se envía la imagen y se consulta
+el resultado hasta que termina. Aquí todo es `await`: el polling empieza con
+un intervalo corto (la mayoría de las etiquetas se leen en menos de un
+segundo), crece hasta OCR_POLL_MAX_SECONDS y respeta `Retry-After`. Toda la
+operación tiene un plazo (OCR_TIMEOUT_SECONDS) y se cancela si el cliente HTTP
+se desconecta, así que un OCR lento ya no congela el event loop.
+
+`read_batch` reparte muchas imágenes sobre el mismo cliente con un límite de
+lecturas simultáneas y entrega cada resultado en cuanto termina.
+
+Backends:
+    AzureReadBackend  API REST Read v3.2 de Azure Computer Vision (httpx).
+    FakeOCRBackend    Local, sin red, para tests y desarrollo (OCR_BACKEND=fake).
+"""
+import asyncio
+from dataclasses import dataclass, field
 import logging
+import time
+from typing import AsyncIterator, Awaitable, List, Optional, Protocol, Sequence, TypeVar
 
-load_dotenv()
+import httpx
+from fastapi import Request
 
-# Configuración de logs
-logging.basicConfig(level=logging.INFO)
+from config import settings
+from services.metrics import OCR_DURATION, OCR_FAILURES
 
-class OCRService:
-    def __init__(self, subscription_key: str, endpoint: str):
-        """
-        Inicializa el cliente de Azure Computer Vision.
-        """
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Estados de la operación de lectura (los mismos de Azure)
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_RUNNING = "running"
+
+
+class OCRError(Exception):
+    """El backend OCR respondió con error o no se pudo contactar."""
+
+
+class OCRTimeout(OCRError):
+    """La lectura no terminó dentro del plazo."""
+
+
+class ClientDisconnected(Exception):
+    """El cliente HTTP cerró la conexión antes de la respuesta."""
+
+
+@dataclass
+class PollResult:
+    status: str
+    lines: List[str] = field(default_factory=list)
+    # Segundos sugeridos por el servidor antes de la siguiente consulta
+    retry_after: Optional[float] = None
+
+
+class OCRBackend(Protocol):
+    async def submit(self, image: bytes) -> str:
+        """Envía la imagen y devuelve el identificador de la operación."""
+
+    async def poll(self, operation: str) -> PollResult:
+        """Estado actual de la operación."""
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+class AzureReadBackend:
+    """API REST Read de Azure Computer Vision."""
+
+    def __init__(self, endpoint: str, subscription_key: str, client: Optional[httpx.AsyncClient] = None):
         if not subscription_key or not endpoint:
             raise ValueError("Azure Subscription Key y Endpoint deben estar configurados correctamente.")
-        self.client = ComputerVisionClient(endpoint, CognitiveServicesCredentials(subscription_key))
+        self.analyze_url = endpoint.rstrip("/") + "/vision/v3.2/read/analyze"
+        self.headers = {"Ocp-Apim-Subscription-Key": subscription_key}
+        # Un solo cliente: conexiones keep-alive reutilizadas entre lecturas
+        self.client = client or httpx.AsyncClient(timeout=httpx.Timeout(10.0))
+
+    async def submit(self, image: bytes) -> str:
+        try:
+            response = await self.client.post(
+                self.analyze_url,
+                content=image,
+                headers={**self.headers, "Content-Type": "application/octet-stream"},
+            )
+        except httpx.HTTPError as e:
+            raise OCRError(f"No se pudo enviar la imagen a Azure: {e}") from e
+        if response.status_code != 202:
+            raise OCRError(f"Azure respondió {response.status_code} al enviar la imagen: {response.text[:200]}")
+        return response.headers["Operation-Location"]
+
+    async def poll(self, operation: str) -> PollResult:
+        try:
+            response = await self.client.get(operation, headers=self.headers)
+        except httpx.HTTPError as e:
+            raise OCRError(f"No se pudo consultar la operación OCR: {e}") from e
+        if response.status_code == 429:
+            return PollResult(status=STATUS_RUNNING, retry_after=_retry_after(response))
+        if response.status_code != 200:
+            raise OCRError(f"Azure respondió {response.status_code} al consultar la operación OCR.")
+        body = response.json()
+        status = body.get("status")
+        if status != STATUS_SUCCEEDED:
+            return PollResult(status=status or STATUS_RUNNING, retry_after=_retry_after(response))
+        lines = [
+            line["text"]
+            for page in body.get("analyzeResult", {}).get("readResults", [])
+            for line in page.get("lines", [])
+        ]
+        return PollResult(status=STATUS_SUCCEEDED, lines=lines)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class FakeOCRBackend:
+    """
+    Backend local: la "imagen" se lee como texto UTF-8 (una línea por renglón)
+    o, si no es texto, se devuelve `text`. Simula `latency` segundos por
+    llamada y `polls` consultas hasta terminar.
+    """
 
-    def azure_ocr(self, image) -> str | None:
+    def __init__(self, text: str = "", latency: float = 0.0, polls: int = 1, fail: bool = False):
+        self.text = text
+        self.latency = latency
+        self.polls = polls
+        self.fail = fail
+        self.submitted = 0
+        self.polled = 0
+        self._operations: dict = {}
+
+    async def submit(self, image: bytes) -> str:
+        await asyncio.sleep(self.latency)
+        self.submitted += 1
+        try:
+            text = image.decode("utf-8")
+        except UnicodeDecodeError:
+            text = self.text
+        operation = f"fake-{self.submitted}"
+        self._operations[operation] = [0, [line.strip() for line in text.splitlines() if line.strip()]]
+        return operation
+
+    async def poll(self, operation: str) -> PollResult:
+        await asyncio.sleep(self.latency)
+        self.polled += 1
+        state = self._operations[operation]
+        state[0] += 1
+        if state[0] < self.polls:
+            return PollResult(status=STATUS_RUNNING)
+        del self._operations[operation]
+        if self.fail:
+            return PollResult(status=STATUS_FAILED)
+        return PollResult(status=STATUS_SUCCEEDED, lines=state[1])
+
+
+class AsyncOCRClient:
+    """Lectura completa (envío + polling adaptativo) con plazo total."""
+
+    def __init__(
+        self,
+        backend: OCRBackend,
+        timeout: float = settings.OCR_TIMEOUT_SECONDS,
+        poll_initial: float = settings.OCR_POLL_INITIAL_SECONDS,
+        poll_max: float = settings.OCR_POLL_MAX_SECONDS,
+        backoff: float = 1.5,
+    ):
+        self.backend = backend
+        self.timeout = timeout
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.backoff = backoff
+
+    async def _read(self, image: bytes) -> Optional[List[str]]:
+        operation = await self.backend.submit(image)
+        interval = self.poll_initial
+        while True:
+            await asyncio.sleep(interval)
+            result = await self.backend.poll(operation)
+            if result.status == STATUS_SUCCEEDED:
+                return result.lines
+            if result.status == STATUS_FAILED:
+                return None
+            interval = min(interval * self.backoff, self.poll_max)
+            if result.retry_after is not None:
+                interval = max(interval, result.retry_after)
+
+    async def read_text(self, image: bytes, timeout: Optional[float] = None) -> Optional[List[str]]:
         """
-        Procesa una imagen para obtener texto reconocido mediante Azure OCR.
+        Lee el texto de una imagen.
+
+        Args:
+            image (bytes): Contenido de la imagen.
+            timeout (float, optional): Plazo en segundos; por defecto el del cliente.
+
+        Returns:
+            list[str] | None: Líneas reconocidas, o None si el backend no pudo leer la imagen.
+
+        Raises:
+            OCRTimeout: Si no terminó dentro del plazo.
+            OCRError: Si el backend respondió con error.
         """
+        limit = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
         try:
-            logging.info("Enviando imagen a Azure OCR...")
-            ocr_result = self.client.read_in_stream(image, raw=True)
-
-            # Obtener el ID de la operación
-            operation_location = ocr_result.headers["Operation-Location"]
-            operation_id = operation_location.split("/")[-1]
-
-            # Esperar a que la operación termine
-            while True:
-                get_result = self.client.get_read_result(operation_id)
-                if get_result.status in ['succeeded', 'failed']:
-                    break
-                time.sleep(1)
-
-            # Procesar resultados
-            if get_result.status == 'succeeded':
-                logging.info("Reconocimiento de texto completado con éxito.")
-                recognized_texts = "\n".join(
-                    line.text
-                    for result in get_result.analyze_result.read_results
-                    for line in result.lines
-                )
-                return recognized_texts
-            else:
-                logging.error("El reconocimiento de texto falló.")
-                return None
-        except Exception as e:
-            logging.error(f"Error al procesar la imagen: {e}")
-            return None
-
-# Inicializar el servicio con credenciales desde variables de entorno
-ocr_service = OCRService(
-    subscription_key=os.getenv("AZURE_SUBSCRIPTION_KEY"),
-    endpoint=os.getenv("AZURE_ENDPOINT")
-)
+            async with asyncio.timeout(limit):
+                lines = await self._read(image)
+        except TimeoutError:
+            OCR_FAILURES.inc(reason="timeout")
+            raise OCRTimeout(f"La lectura OCR no terminó en {limit} s.") from None
+        except asyncio.CancelledError:
+            OCR_FAILURES.inc(reason="cancelled")
+            raise
+        except OCRError:
+            OCR_FAILURES.inc(reason="error")
+            raise
+        finally:
+            OCR_DURATION.observe(time.perf_counter() - started)
+        if lines is None:
+            OCR_FAILURES.inc(reason="failed")
+        return lines
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], check_interval: float = 0.1) -> T:
+    """
+    Espera `awaitable` y lo cancela si el cliente se desconecta antes.
+
+    Raises:
+        ClientDisconnected: Si el cliente cerró la conexión.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=check_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+@dataclass
+class BatchResult:
+    index: int
+    lines: Optional[List[str]] = None
+    error: Optional[OCRError] = None
+    seconds: float = 0.0
+
+    @property
+    def status(self) -> str:
+        if isinstance(self.error, OCRTimeout):
+            return "timeout"
+        if self.error is not None:
+            return "error"
+        if self.lines is None:
+            return "failed"
+        return "ok" if self.lines else "empty"
+
+
+async def read_batch(
+    client: AsyncOCRClient,
+    images: Sequence[bytes],
+    concurrency: int,
+    timeout: Optional[float] = None,
+) -> AsyncIterator[BatchResult]:
+    """
+    Lee varias imágenes con hasta `concurrency` lecturas a la vez y entrega
+    cada resultado apenas termina (no en el orden recibido).
+
+    Args:
+        client (AsyncOCRClient): Cliente OCR (o el de la caché).
+        images (list[bytes]): Contenido de cada imagen.
+        concurrency (int): Lecturas simultáneas contra el backend.
+        timeout (float, optional): Plazo por imagen, contado desde que empieza
+            su lectura (no desde que entra a la cola).
+
+    Yields:
+        BatchResult: Índice de la imagen, líneas o error y duración.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def read(index: int, image: bytes) -> BatchResult:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                lines = await client.read_text(image, timeout)
+            except OCRError as e:
+                return BatchResult(index, error=e, seconds=time.perf_counter() - started)
+            return BatchResult(index, lines=lines, seconds=time.perf_counter() - started)
+
+    tasks = [asyncio.ensure_future(read(index, image)) for index, image in enumerate(images)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # El consumidor dejó de leer (p. ej. el cliente se desconectó): cancelar lo pendiente
+        for task in tasks:
+            task.cancel()
+
+
+def create_backend() -> OCRBackend:
+    if settings.OCR_BACKEND == "fake":
+        return FakeOCRBackend(latency=0.05)
+    return AzureReadBackend(settings.AZURE_ENDPOINT, settings.AZURE_SUBSCRIPTION_KEY)
+
+
+_client: Optional[AsyncOCRClient] = None
+
+
+def get_ocr_client() -> AsyncOCRClient:
+    """
+    Cliente compartido, creado en el primer uso según OCR_BACKEND; con
+    OCR_CACHE_ENABLED va detrás de la caché de resultados (services.ocr_cache).
+    """
+    global _client
+    if _client is None:
+        client = AsyncOCRClient(create_backend())
+        if settings.OCR_CACHE_ENABLED:
+            from services.ocr_cache import CachedOCRClient, ocr_cache
+            client = CachedOCRClient(client, ocr_cache)
+        _client = client
+    return _client
@@ -0,0 +1,326 @@
+"""
+Perfilado por muestreo de requests individuales.
+
+Un hilo toma periódicamente las pilas (`sys._current_frames()`) del hilo del
+event loop, cuando la tarea que está corriendo es del request, y de los hilos
+del threadpool de FastAPI que están ejecutando código de ese request
+(endpoints y dependencias síncronas), y las agrega en un árbol de llamadas.
+Solo corre mientras dura el request perfilado; los requests normales no pagan
+nada (salvo la fábrica de tareas, ver `track_request_tasks`).
+"""
+import asyncio
+from collections import Counter
+import contextvars
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import re
+import sys
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional
+import uuid
+import weakref
+
+from config import settings
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__)).rsplit(os.sep, 1)[0]
+
+# Hilos en los que FastAPI ejecuta los endpoints y dependencias síncronas. El
+# nombre y el `context.run(func)` de cada llamada (ver `_runs_request`) son de
+# anyio: test_profiling.py falla si una versión de anyio los cambia
+WORKER_THREAD_PREFIX = "AnyIO worker thread"
+# Una pila cuyo último frame está en estos módulos es un hilo esperando trabajo
+IDLE_MODULES = ("selectors.py", "threading.py", "queue.py")
+# Funciones que cuentan como serialización de la respuesta
+SERIALIZATION_FUNCTIONS = frozenset({"serialize_response", "jsonable_encoder", "render"})
+
+# Profiler del request en curso; anyio copia el contexto a cada llamada del threadpool
+current_profiler: contextvars.ContextVar[Optional["SamplingProfiler"]] = contextvars.ContextVar(
+    "current_profiler", default=None
+)
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{8}T[0-9]{6}_[0-9a-f]{8}$")
+
+
+def track_request_tasks(loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Instala en `loop` una fábrica de tareas que anota en su profiler las tareas
+    creadas desde el contexto de un request perfilado (el `call_next` de los
+    middlewares, `asyncio.gather`, ...). Conserva la fábrica anterior y se
+    instala una sola vez por loop.
+    """
+    previous = loop.get_task_factory()
+    if getattr(previous, "tracks_request_tasks", False):
+        return
+
+    def factory(loop, coro, **kwargs):
+        if previous is not None:
+            task = previous(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        context = kwargs.get("context")
+        profiler = context.get(current_profiler) if context is not None else current_profiler.get()
+        if profiler is not None:
+            profiler.tasks.add(task)
+        return task
+
+    factory.tracks_request_tasks = True
+    loop.set_task_factory(factory)
+
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(APP_DIR):
+        return os.path.relpath(filename, APP_DIR)
+    _, sep, tail = filename.rpartition("site-packages" + os.sep)
+    return tail if sep else os.path.basename(filename)
+
+
+class SamplingProfiler:
+    """
+    Muestrea cada `interval_ms` milisegundos entre `start()` y `stop()` la
+    pila del hilo del event loop `thread_id` mientras corre una tarea del
+    request, y la de los workers del threadpool que corren código del request.
+    El request se reconoce porque su contexto tiene este profiler en
+    `current_profiler` (ver `activate`).
+    """
+
+    def __init__(self, thread_id: int, interval_ms: float = settings.PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        # Tareas del request en el event loop (la que llamó a `activate` y las que cree)
+        self.tasks: weakref.WeakSet = weakref.WeakSet()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.samples: Counter = Counter()
+        self.serialization_samples = 0
+        self._labels: Dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def activate(self) -> contextvars.Token:
+        """
+        Marca el contexto actual (y lo que se ejecute desde él) como parte del
+        request. Llamado desde la tarea del request, también la registra.
+        """
+        task = asyncio.current_task()
+        if task is not None:
+            self._loop = task.get_loop()
+            self.tasks.add(task)
+            track_request_tasks(self._loop)
+        return current_profiler.set(self)
+
+    def _request_task(self) -> Optional[asyncio.Task]:
+        """Tarea que corre ahora en el event loop, si es del request."""
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        return task if task is not None and task in self.tasks else None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _runs_request(self, frame) -> bool:
+        """
+        True si el worker ejecuta una llamada de este request: anyio corre cada
+        una con `context.run(func)` sobre una copia del contexto del request.
+        """
+        while frame is not None:
+            if "context" in frame.f_code.co_varnames:
+                context = frame.f_locals.get("context")
+                if isinstance(context, contextvars.Context):
+                    return context.get(current_profiler) is self
+            frame = frame.f_back
+        return False
+
+    def _worker_threads(self) -> FrozenSet[int]:
+        return frozenset(t.ident for t in threading.enumerate() if t.name.startswith(WORKER_THREAD_PREFIX))
+
+    def _sample(self, frame) -> None:
+        if frame.f_code.co_filename.endswith(IDLE_MODULES):
+            return
+        stack: List[str] = []
+        serializing = False
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            serializing = serializing or frame.f_code.co_name in SERIALIZATION_FUNCTIONS
+            frame = frame.f_back
+        stack.reverse()
+        self.samples[tuple(stack)] += 1
+        if serializing:
+            self.serialization_samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            workers = self._worker_threads()
+            task = self._request_task()
+            frames = sys._current_frames()
+            # El loop pudo cambiar de tarea mientras se tomaban las pilas: esa muestra se descarta
+            on_loop = task is not None and self._request_task() is task
+            for thread_id, frame in frames.items():
+                if thread_id == self.thread_id:
+                    if on_loop:
+                        self._sample(frame)
+                elif thread_id in workers and self._runs_request(frame):
+                    self._sample(frame)
+
+    def call_tree(self) -> Dict[str, Any]:
+        """
+        Árbol de llamadas con muestras totales y propias por nodo, ordenado
+        de mayor a menor costo.
+        """
+        root: Dict[str, Any] = {"name": "<request>", "samples": 0, "self": 0, "children": {}}
+        for stack, n in self.samples.items():
+            node = root
+            node["samples"] += n
+            for label in stack:
+                node = node["children"].setdefault(label, {"name": label, "samples": 0, "self": 0, "children": {}})
+                node["samples"] += n
+            node["self"] += n
+        return self._finish(root)
+
+    def _finish(self, node: Dict[str, Any]) -> Dict[str, Any]:
+        interval_ms = self.interval * 1000
+        children = sorted(node["children"].values(), key=lambda child: child["samples"], reverse=True)
+        return {
+            "name": node["name"],
+            "samples": node["samples"],
+            "total_ms": round(node["samples"] * interval_ms, 2),
+            "self_ms": round(node["self"] * interval_ms, 2),
+            "children": [self._finish(child) for child in children],
+        }
+
+
+@dataclass
+class ProfileSummary:
+    profile_id: str
+    created_at: str
+    method: str
+    path: str
+    status_code: int
+    duration_ms: float
+    user: Optional[str]
+
+
+def new_profile_id() -> str:
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}_{uuid.uuid4().hex[:8]}"
+
+
+def build_profile(
+    profile_id: str,
+    profiler: SamplingProfiler,
+    stats,
+    method: str,
+    path: str,
+    query: str,
+    status_code: int,
+    duration_ms: float,
+    user: Optional[str],
+) -> Dict[str, Any]:
+    """
+    Arma el documento del perfil: árbol de llamadas, tiempos SQL y tiempo de serialización.
+
+    Args:
+        profile_id (str): Identificador del perfil.
+        profiler (SamplingProfiler): Profiler ya detenido.
+        stats (QueryStats): Consultas registradas durante el request.
+        method, path, query (str): Request perfilado.
+        status_code (int): Código de la respuesta.
+        duration_ms (float): Duración total del request.
+        user (str, optional): Usuario que pidió el perfil.
+    """
+    interval_ms = profiler.interval * 1000
+    statements = sorted(
+        (
+            {"statement": statement, "count": stats.statements[statement], "total_ms": round(ms, 2)}
+            for statement, ms in stats.statement_ms.items()
+        ),
+        key=lambda row: row["total_ms"],
+        reverse=True,
+    )
+    return {
+        "profile_id": profile_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "method": method,
+        "path": path,
+        "query": query,
+        "status_code": status_code,
+        "duration_ms": round(duration_ms, 2),
+        "user": user,
+        "interval_ms": interval_ms,
+        "samples": sum(profiler.samples.values()),
+        "sql": {
+            "count": stats.count,
+            "total_ms": round(stats.total_ms, 2),
+            "statements": statements,
+        },
+        "serialization_ms": round(profiler.serialization_samples * interval_ms, 2),
+        "call_tree": profiler.call_tree(),
+    }
+
+
+def _profile_dir() -> Path:
+    return Path(settings.PROFILE_DIR)
+
+
+def save_profile(profile: Dict[str, Any]) -> Path:
+    """Guarda el perfil en PROFILE_DIR y descarta los más antiguos sobre PROFILE_MAX_FILES."""
+    directory = _profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{profile['profile_id']}.json"
+    path.write_text(json.dumps(profile))
+
+    files = sorted(directory.glob("*.json"))
+    for old in files[:max(len(files) - settings.PROFILE_MAX_FILES, 0)]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    """Lee un perfil guardado; None si el id no es válido o no existe."""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = _profile_dir() / f"{profile_id}.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def list_profiles(limit: int = 50) -> List[ProfileSummary]:
+    """Resumen de los perfiles guardados, del más reciente al más antiguo."""
+    directory = _profile_dir()
+    if not directory.exists():
+        return []
+    summaries = []
+    for path in sorted(directory.glob("*.json"), reverse=True)[:limit]:
+        profile = json.loads(path.read_text())
+        summaries.append(ProfileSummary(
+            profile_id=profile["profile_id"],
+            created_at=profile["created_at"],
+            method=profile["method"],
+            path=profile["path"],
+            status_code=profile["status_code"],
+            duration_ms=profile["duration_ms"],
+            user=profile["user"],
+        ))
+    return summaries
+
+
+def profile_requested(scope: Dict[str, Any]) -> bool:
+    """True si el request trae el header `X-Profile` o el parámetro `profile=1`."""
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.lower() in (b"1", b"true", b"yes")
+    query = scope.get("query_string", b"")
+    return b"profile=" in query and any(
+        part in (b"profile=1", b"profile=true") for part in query.split(b"&")
+    )
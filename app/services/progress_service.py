@@ -0,0 +1,265 @@
+from dataclasses import dataclass, field
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, select
+
+from models import Item, JobStageCount, Object
+
+logger = logging.getLogger(__name__)
+
+# (job_id, item_id, stage_id) -> delta
+CountDelta = Tuple[int, int, int, int]
+
+# Reintentos de un cambio de stage si otro request mueve la misma pieza a la vez
+MOVE_RETRIES = 3
+
+
+def _upsert(session: Session):
+    """
+    Devuelve un INSERT ... ON CONFLICT DO UPDATE que suma `count` al
+    contador existente, o None si el dialecto no lo soporta.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite.insert(JobStageCount)
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(JobStageCount)
+    else:
+        return None
+    return stmt.on_conflict_do_update(
+        index_elements=["item_id", "stage_id"],
+        set_={"count": JobStageCount.count + stmt.excluded.count},
+    )
+
+
+def apply_count_deltas(session: Session, deltas: Iterable[CountDelta]) -> None:
+    """
+    Suma cada delta al contador (job, item, stage), creándolo si no existe.
+
+    Corre en la transacción de `session`; el commit queda a cargo de quien
+    llama para que el contador y los Objects se confirmen juntos.
+
+    Args:
+        session (Session): Sesión de la base de datos.
+        deltas (Iterable[CountDelta]): Tuplas (job_id, item_id, stage_id, delta).
+    """
+    rows = [
+        {"job_id": job_id, "item_id": item_id, "stage_id": stage_id, "count": delta}
+        for job_id, item_id, stage_id, delta in deltas
+        if delta
+    ]
+    if not rows:
+        return
+
+    stmt = _upsert(session)
+    if stmt is not None:
+        session.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = session.execute(
+            update(JobStageCount)
+            .where(JobStageCount.item_id == row["item_id"])
+            .where(JobStageCount.stage_id == row["stage_id"])
+            .values(count=JobStageCount.count + row["count"])
+        )
+        if result.rowcount == 0:
+            session.execute(insert(JobStageCount).values(**row))
+
+
+def move_object(session: Session, item: Item, old_stage: int, new_stage: int) -> None:
+    """
+    Refleja en los contadores que un Object de `item` pasó de `old_stage` a `new_stage`.
+    """
+    if old_stage == new_stage:
+        return
+    apply_count_deltas(session, [
+        (item.job_id, item.item_id, old_stage, -1),
+        (item.job_id, item.item_id, new_stage, 1),
+    ])
+
+
+def _conditional_move(session: Session, obj: Object, new_stage: int) -> Optional[int]:
+    """
+    Mueve `obj` a `new_stage` con un UPDATE condicional sobre el stage leído
+    (`WHERE current_stage = :anterior`). Si otro request movió la pieza entre
+    la lectura y el UPDATE no cambia ninguna fila: se relee el stage actual y
+    se reintenta desde ahí.
+
+    Returns:
+        Optional[int]: Stage desde el que se movió la pieza, o None si no hubo cambio.
+    """
+    old_stage = obj.current_stage
+    for _ in range(MOVE_RETRIES):
+        if old_stage is None or old_stage == new_stage:
+            break
+        result = session.execute(
+            update(Object)
+            .where(Object.object_id == obj.object_id)
+            .where(Object.current_stage == old_stage)
+            .values(current_stage=new_stage)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            # Sin marcar el atributo como modificado: el UPDATE ya se hizo
+            set_committed_value(obj, "current_stage", new_stage)
+            return old_stage
+        old_stage = session.exec(select(Object.current_stage).where(Object.object_id == obj.object_id)).first()
+    if old_stage is not None:
+        set_committed_value(obj, "current_stage", old_stage)
+    return None
+
+
+def change_stage(session: Session, item: Item, obj: Object, new_stage: int) -> Optional[int]:
+    """
+    Mueve un Object de `item` a `new_stage` y, solo si la fila cambió, aplica
+    el delta a los contadores. Dos escaneos simultáneos de la misma pieza no
+    descuentan dos veces el mismo stage.
+
+    Corre en la transacción de `session`; el commit queda a cargo de quien llama.
+
+    Returns:
+        Optional[int]: Stage desde el que se movió la pieza, o None si ya estaba
+        en `new_stage`.
+    """
+    old_stage = _conditional_move(session, obj, new_stage)
+    if old_stage is not None:
+        move_object(session, item, old_stage, new_stage)
+    return old_stage
+
+
+def change_stages(session: Session, moves: Iterable[Tuple[Item, Object, int]]) -> List[bool]:
+    """
+    Igual que `change_stage` para varias piezas (en orden; una pieza puede
+    repetirse), sumando los deltas en una sola escritura de contadores.
+
+    Returns:
+        list[bool]: Por movimiento, si la pieza quedó en el stage pedido. False
+        si otro request la borró o la siguió moviendo durante los reintentos.
+    """
+    merged: Dict[Tuple[int, int, int], int] = {}
+    outcomes: List[bool] = []
+    for item, obj, new_stage in moves:
+        old_stage = _conditional_move(session, obj, new_stage)
+        if old_stage is None:
+            # Sin cambio: ya estaba en new_stage, o se borró/movió entretanto
+            outcomes.append(obj.current_stage == new_stage)
+            continue
+        outcomes.append(True)
+        for stage_id, delta in ((old_stage, -1), (new_stage, 1)):
+            key = (item.job_id, item.item_id, stage_id)
+            merged[key] = merged.get(key, 0) + delta
+    apply_count_deltas(session, [(*key, delta) for key, delta in merged.items()])
+    return outcomes
+
+
+def remove_object(session: Session, item: Item, obj: Object) -> bool:
+    """
+    Borra `obj` y lo descuenta del stage en el que estaba al borrarse
+    (`DELETE ... RETURNING current_stage`), no del leído antes: un escaneo
+    simultáneo pudo moverlo entretanto.
+
+    Corre en la transacción de `session`; el commit queda a cargo de quien llama.
+
+    Returns:
+        bool: False si otro request ya lo había borrado.
+    """
+    deleted = session.execute(
+        delete(Object).where(Object.object_id == obj.object_id).returning(Object.current_stage)
+    ).first()
+    if deleted is None:
+        return False
+    if deleted.current_stage is not None:
+        apply_count_deltas(session, [(item.job_id, item.item_id, deleted.current_stage, -1)])
+    return True
+
+
+def delete_item_counts(session: Session, item_id: int) -> None:
+    """Elimina los contadores de un Item."""
+    session.execute(delete(JobStageCount).where(JobStageCount.item_id == item_id))
+
+
+def delete_job_counts(session: Session, job_id: int) -> None:
+    """Elimina los contadores de un Job."""
+    session.execute(delete(JobStageCount).where(JobStageCount.job_id == job_id))
+
+
+def get_job_counts(session: Session, job_id: int) -> Dict[int, Dict[int, int]]:
+    """
+    Lee los contadores de un Job como {item_id: {stage_id: count}}.
+
+    Los contadores en cero se omiten.
+    """
+    rows = session.exec(
+        select(JobStageCount.item_id, JobStageCount.stage_id, JobStageCount.count)
+        .where(JobStageCount.job_id == job_id)
+        .where(JobStageCount.count != 0)
+    ).all()
+    counts: Dict[int, Dict[int, int]] = {}
+    for item_id, stage_id, count in rows:
+        counts.setdefault(item_id, {})[stage_id] = count
+    return counts
+
+
+@dataclass
+class CounterDrift:
+    job_id: int
+    item_id: int
+    stage_id: int
+    stored: int
+    actual: int
+
+
+@dataclass
+class RebuildReport:
+    checked: int = 0
+    drift: List[CounterDrift] = field(default_factory=list)
+
+
+def rebuild_counts(session: Session, job_id: Optional[int] = None, fix: bool = True) -> RebuildReport:
+    """
+    Recalcula los contadores desde la tabla object y reporta las diferencias.
+
+    Args:
+        session (Session): Sesión de la base de datos.
+        job_id (int, optional): Limitar a un Job; por defecto todos.
+        fix (bool): Si es True reemplaza los contadores por los valores
+            recalculados (sin commit); si es False solo verifica.
+
+    Returns:
+        RebuildReport: Contadores revisados y los que tenían drift.
+    """
+    actual_query = (
+        select(Item.job_id, Object.item_id, Object.current_stage, func.count(Object.object_id))
+        .join(Item, Item.item_id == Object.item_id)
+        .group_by(Item.job_id, Object.item_id, Object.current_stage)
+    )
+    stored_query = select(
+        JobStageCount.job_id, JobStageCount.item_id, JobStageCount.stage_id, JobStageCount.count
+    )
+    if job_id is not None:
+        actual_query = actual_query.where(Item.job_id == job_id)
+        stored_query = stored_query.where(JobStageCount.job_id == job_id)
+
+    actual = {(j, i, s): c for j, i, s, c in session.exec(actual_query).all()}
+    stored = {(j, i, s): c for j, i, s, c in session.exec(stored_query).all()}
+
+    report = RebuildReport()
+    for key in sorted(actual.keys() | stored.keys()):
+        report.checked += 1
+        if actual.get(key, 0) != stored.get(key, 0):
+            report.drift.append(CounterDrift(*key, stored=stored.get(key, 0), actual=actual.get(key, 0)))
+
+    if fix and report.drift:
+        if job_id is None:
+            session.execute(delete(JobStageCount))
+        else:
+            delete_job_counts(session, job_id)
+        apply_count_deltas(session, [(*key, count) for key, count in actual.items()])
+
+    logger.info(f"Contadores revisados: {report.checked}, con drift: {len(report.drift)}")
+    return report
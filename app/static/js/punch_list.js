@@ -136,7 +136,7 @@ async function handleJobCodeChange(event) {
     
     try {
         // Use the updated endpoint
-        const response = await fetch(`/defect-records/complete/${selectedJobCode}/${selectedProduct}`);
+        const response = await fetch(`/defect-records/complete/${selectedJobCode}/${selectedProduct}?limit=1000`);
         if (!response.ok) {
             throw new Error('Error loading defect data');
         }
@@ -182,9 +182,9 @@ function renderDefects(defects) {
             <td class="px-6 py-4 whitespace-nowrap">
                 <div class="flex space-x-2">
                     ${defect.images && defect.images.slice(0, 3).map((image, imgIndex) => `
-                        <img src="${image.image_url}" alt="Defect ${imgIndex + 1}" 
+                        <img src="${image.thumbnail_url || image.image_url}" alt="Defect ${imgIndex + 1}" 
                             class="h-16 w-16 object-cover rounded defect-image" 
-                            onclick="showFullImage(event, '${image.image_url}')">
+                            onclick="showFullImage(event, '${image.display_url || image.image_url}')">
                     `).join('')}
                     ${defect.images && defect.images.length > 3 ? `<span class="text-blue-500">+${defect.images.length - 3} more</span>` : ''}
                 </div>
@@ -420,9 +420,9 @@ function showDefectDetails(index) {
                         ${defectImages.length > 0 ? 
                             defectImages.map((image, imgIndex) => `
                                 <div class="border rounded-lg overflow-hidden">
-                                    <img src="${image.image_url}" alt="Defect ${imgIndex + 1}" 
+                                    <img src="${image.thumbnail_url || image.image_url}" alt="Defect ${imgIndex + 1}" 
                                         class="w-full h-auto object-contain cursor-pointer" 
-                                        onclick="showFullImage(event, '${image.image_url}')">
+                                        onclick="showFullImage(event, '${image.display_url || image.image_url}')">
                                     <div class="p-2 bg-gray-50">
                                         <p class="text-sm text-gray-500">Defect Image</p>
                                     </div>
@@ -439,9 +439,9 @@ function showDefectDetails(index) {
                         ${locationImages.length > 0 ? 
                             locationImages.map((image, imgIndex) => `
                                 <div class="border rounded-lg overflow-hidden">
-                                    <img src="${image.image_url}" alt="Location ${imgIndex + 1}" 
+                                    <img src="${image.thumbnail_url || image.image_url}" alt="Location ${imgIndex + 1}" 
                                         class="w-full h-auto object-contain cursor-pointer" 
-                                        onclick="showFullImage(event, '${image.image_url}')">
+                                        onclick="showFullImage(event, '${image.display_url || image.image_url}')">
                                     <div class="p-2 bg-gray-50">
                                         <p class="text-sm text-gray-500">Location Image</p>
                                     </div>
@@ -458,9 +458,9 @@ function showDefectDetails(index) {
                         ${solvedImages.length > 0 ? 
                             solvedImages.map((image, imgIndex) => `
                                 <div class="border rounded-lg overflow-hidden">
-                                    <img src="${image.image_url}" alt="Solution ${imgIndex + 1}" 
+                                    <img src="${image.thumbnail_url || image.image_url}" alt="Solution ${imgIndex + 1}" 
                                         class="w-full h-auto object-contain cursor-pointer" 
-                                        onclick="showFullImage(event, '${image.image_url}')">
+                                        onclick="showFullImage(event, '${image.display_url || image.image_url}')">
                                     <div class="p-2 bg-gray-50">
                                         <p class="text-sm text-gray-500">Solution Image</p>
                                     </div>
@@ -660,10 +660,10 @@ function displayExistingImages(defect) {
         defect.images.forEach(image => {
             const imageHtml = `
                 <div class="relative group">
-                    <img src="${image.image_url}" alt="Image" class="w-full h-24 object-cover rounded border border-gray-200">
+                    <img src="${image.thumbnail_url || image.image_url}" alt="Image" class="w-full h-24 object-cover rounded border border-gray-200">
                     <div class="absolute inset-0 bg-black bg-opacity-0 group-hover:bg-opacity-30 transition-all flex items-center justify-center">
                         <button type="button" class="text-white opacity-0 group-hover:opacity-100 transition-opacity" 
-                            onclick="showFullImage(event, '${image.image_url}')">
+                            onclick="showFullImage(event, '${image.display_url || image.image_url}')">
                             <svg xmlns="http://www.w3.org/2000/svg" class="h-6 w-6" fill="none" viewBox="0 0 24 24" stroke="currentColor">
                                 <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M21 21l-6-6m2-5a7 7 0 11-14 0 7 7 0 0114 0z" />
                             </svg>
@@ -812,7 +812,7 @@ async function handleJobCodeChange(event) {
     
     try {
         // Use the updated endpoint
-        const response = await fetch(`/defect-records/complete/${selectedJobCode}/${selectedProduct}`);
+        const response = await fetch(`/defect-records/complete/${selectedJobCode}/${selectedProduct}?limit=1000`);
         if (!response.ok) {
             throw new Error('Error loading defect data');
         }
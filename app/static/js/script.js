@@ -151,6 +151,10 @@ async function loadProductsForUpload() {
     }
 }
 
+// Files at least this large are uploaded with async_ingest=true and polled;
+// smaller ones keep the synchronous upload
+const ASYNC_INGEST_MIN_BYTES = 5 * 1024 * 1024;
+
 // Handle upload form submission
 async function handleFormSubmit(e) {
     e.preventDefault();
@@ -182,8 +186,9 @@ async function handleFormSubmit(e) {
             product_name: selectedProductText
         });
 
-        // Send product_name as query parameter
-        const response = await fetch(`/object/validate-and-insert?product_name=${encodeURIComponent(selectedProductText)}`, {
+        // Send product_name as query parameter; large files are processed in the background
+        const asyncIngest = file.size >= ASYNC_INGEST_MIN_BYTES;
+        const response = await fetch(`/object/validate-and-insert?product_name=${encodeURIComponent(selectedProductText)}&async_ingest=${asyncIngest}`, {
             method: "POST",
             body: formData,
         });
@@ -206,7 +211,19 @@ async function handleFormSubmit(e) {
             return;
         }
 
-        const result = await response.json();
+        let result = await response.json();
+        if (response.status === 202) {
+            const ingest = await pollIngest(result.status_url);
+            if (ingest.phase === "failed") {
+                const errorMessage = ingest.errors && typeof ingest.errors === 'object' ?
+                    ingest.errors.error || JSON.stringify(ingest.errors) :
+                    ingest.errors;
+                showNotification(`Error: ${errorMessage}`, "error");
+                console.error("Detailed error:", ingest.errors);
+                return;
+            }
+            result = ingest.result;
+        }
         showNotification(result.message || "File processed successfully!", "success");
 
         // Reset the form after successful submission
@@ -222,6 +239,22 @@ async function handleFormSubmit(e) {
     }
 }
 
+// Poll an asynchronous CSV ingest until it finishes
+async function pollIngest(statusUrl, intervalMs = 1000) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        if (!response.ok) {
+            throw new Error(`Error ${response.status} while checking upload progress`);
+        }
+        const ingest = await response.json();
+        console.log(`Ingest ${ingest.phase}: ${ingest.rows_processed}/${ingest.rows_total} rows (${ingest.rows_per_second} rows/s)`);
+        if (ingest.phase === "done" || ingest.phase === "failed") {
+            return ingest;
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 // Load products for the defect management page
 async function loadProducts() {
     try {
@@ -449,7 +482,7 @@ async function handleJobCodeChange(event) {
     try {
         // Use the updated endpoint
         console.log(`Fetching defect data for job code: ${selectedJobCode}, product: ${selectedProduct}`);
-        const response = await fetch(`/defect-records/complete/${selectedJobCode}/${selectedProduct}`);
+        const response = await fetch(`/defect-records/complete/${selectedJobCode}/${selectedProduct}?limit=1000`);
         
         if (!response.ok) {
             console.error("Error response from defect records endpoint:", response.status, response.statusText);
@@ -516,9 +549,9 @@ function renderDefects(defects) {
                 <td class="px-6 py-4 whitespace-nowrap">
                     <div class="flex space-x-2">
                         ${defect.images && defect.images.slice(0, 3).map((image, imgIndex) => `
-                            <img src="${image.image_url}" alt="Defect ${imgIndex + 1}" 
+                            <img src="${image.thumbnail_url || image.image_url}" alt="Defect ${imgIndex + 1}" 
                                 class="h-16 w-16 object-cover rounded defect-image" 
-                                onclick="showFullImage(event, '${image.image_url}')">
+                                onclick="showFullImage(event, '${image.display_url || image.image_url}')">
                         `).join('')}
                         ${defect.images && defect.images.length > 3 ? `<span class="text-blue-500">+${defect.images.length - 3} more</span>` : ''}
                     </div>
@@ -676,9 +709,9 @@ function showDefectDetails(index) {
                 <div class="grid grid-cols-1 gap-4">
                     ${defect.images && defect.images.map((image, imgIndex) => `
                         <div class="border rounded-lg overflow-hidden">
-                            <img src="${image.image_url}" alt="Defect ${imgIndex + 1}" 
+                            <img src="${image.thumbnail_url || image.image_url}" alt="Defect ${imgIndex + 1}" 
                                 class="w-full h-auto object-contain cursor-pointer" 
-                                onclick="showFullImage(event, '${image.image_url}')">
+                                onclick="showFullImage(event, '${image.display_url || image.image_url}')">
                             <div class="p-2 bg-gray-50">
                                 <p class="text-sm text-gray-500">${getImageTypeLabel(image)}</p>
                             </div>
@@ -861,10 +894,10 @@ function displayExistingImages(defect) {
             try {
                 const imageHtml = `
                     <div class="relative group">
-                        <img src="${image.image_url}" alt="Image" class="w-full h-24 object-cover rounded border border-gray-200">
+                        <img src="${image.thumbnail_url || image.image_url}" alt="Image" class="w-full h-24 object-cover rounded border border-gray-200">
                         <div class="absolute inset-0 bg-black bg-opacity-0 group-hover:bg-opacity-30 transition-all flex items-center justify-center">
                             <button type="button" class="text-white opacity-0 group-hover:opacity-100 transition-opacity" 
-                                onclick="showFullImage(event, '${image.image_url}')">
+                                onclick="showFullImage(event, '${image.display_url || image.image_url}')">
                                 <svg xmlns="http://www.w3.org/2000/svg" class="h-6 w-6" fill="none" viewBox="0 0 24 24" stroke="currentColor">
                                     <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M21 21l-6-6m2-5a7 7 0 11-14 0 7 7 0 0114 0z" />
                                 </svg>
@@ -0,0 +1,73 @@
+import io
+
+import pytest
+import pytest_asyncio
+from fastapi import UploadFile
+from sqlalchemy import delete
+from sqlmodel import select
+
+from models import Object, Product, Stage, StageUpdateRequest
+from routers import object_current_stage
+from routers.object_current_stage import update_object_stage_batch
+from routers.validate_csv import validate_and_insert
+from services.progress_service import change_stages, rebuild_counts
+
+CSV = """Job,Item,Material,Espesor,Cantidad,OCR,Clase,Longitud,Ancho,Alto,Volumen,Área Superficial
+JOB1,Plate,Steel,0.25,2,JOB1Plate,Corte,3,5.85,0.25,0.03,3.3
+JOB1,0.25-20 X 0.75 STUD_1,Steel,0.25,3,JOB1_STUD_1,Sin clase,0.75,0.25,0.25,0.0003,0.06
+"""
+
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture(async_session):
+    async_session.add_all([Product(product_name="TANKS"), Stage(stage_name="CUTTING"), Stage(stage_name="MACHINING")])
+    await async_session.commit()
+    upload = UploadFile(file=io.BytesIO(CSV.encode()), filename="job1.csv")
+    await async_session.run_sync(lambda session: validate_and_insert(upload, "TANKS", session))
+    return async_session
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_partial_failures(session):
+    updates = [
+        StageUpdateRequest(ocr="JOB1Plate_1", new_stage_name="MACHINING"),
+        StageUpdateRequest(ocr="JOB1_STUD_1_3", new_stage_name="MACHINING"),
+        StageUpdateRequest(ocr="JOB1_STUD_1_9", new_stage_name="MACHINING"),
+        StageUpdateRequest(ocr="NOPE_1", new_stage_name="MACHINING"),
+        StageUpdateRequest(ocr="JOB1Plate_2", new_stage_name="PAINT"),
+        StageUpdateRequest(ocr="JOB1Plate_x", new_stage_name="MACHINING"),
+        # La misma pieza escaneada dos veces dentro del lote
+        StageUpdateRequest(ocr="JOB1Plate_1", new_stage_name="CUTTING"),
+    ]
+    response = await update_object_stage_batch(updates, session)
+
+    assert (response.updated, response.failed) == (3, 4)
+    assert [result.success for result in response.results] == [True, True, False, False, False, False, True]
+    # Mismo detalle que el 422 del endpoint individual
+    assert response.results[5].detail == (
+        "Número de pieza inválido en el OCR 'JOB1Plate_x': se espera '<OCR del Item>_<número>'."
+    )
+
+    stages = dict((await session.exec(select(Object.object_id, Object.current_stage))).all())
+    assert stages == {1: 1, 2: 1, 3: 1, 4: 1, 5: 2}
+    assert not (await session.run_sync(rebuild_counts, fix=False)).drift
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_pieces_deleted_before_the_update(session, monkeypatch):
+    def delete_then_change(sync_session, moves):
+        # Otro request borra la pieza entre la lectura del lote y su UPDATE
+        sync_session.execute(delete(Object).where(Object.piece_number == 2, Object.item_id == 1))
+        return change_stages(sync_session, moves)
+
+    monkeypatch.setattr(object_current_stage, "change_stages", delete_then_change)
+    response = await update_object_stage_batch([
+        StageUpdateRequest(ocr="JOB1Plate_1", new_stage_name="MACHINING"),
+        StageUpdateRequest(ocr="JOB1Plate_2", new_stage_name="MACHINING"),
+    ], session)
+
+    assert (response.updated, response.failed) == (1, 1)
+    assert [(result.success, result.new_stage) for result in response.results] == [
+        (True, "MACHINING"), (False, None),
+    ]
+    assert response.results[1].detail == "Otro request movió o eliminó la pieza; vuelva a escanearla."
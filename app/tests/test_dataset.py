@@ -0,0 +1,27 @@
+import io
+import random
+
+from fastapi import UploadFile
+from sqlmodel import Session, func, select
+
+from benchmarks.dataset import generate_bom, write_bom_csv
+from models import Item, Object, Product, Stage
+from routers.validate_csv import validate_and_insert
+
+
+def test_generated_bom_is_accepted_by_ingest(engine, tmp_path):
+    df = generate_bom("QA123Z", 300, random.Random(7))
+    path = write_bom_csv(df, tmp_path / "QA123Z.csv")
+    # latin1, como los CSV de la planta
+    assert "Área Superficial".encode("latin1") in path.read_bytes()
+
+    with Session(engine) as session:
+        session.add_all([Product(product_name="TANKS"), Stage(stage_name="CUTTING")])
+        session.commit()
+        upload = UploadFile(file=io.BytesIO(path.read_bytes()), filename=path.name)
+        validate_and_insert(upload, "TANKS", session)
+
+        assert session.exec(select(func.count(Item.item_id))).one() == 300
+        assert session.exec(select(func.count(Object.object_id))).one() == df["Cantidad"].sum()
+    assert df["Cantidad"].max() >= 20
+    assert set(df["Clase"]) <= {"Doblado", "Corte", "Almacén", "Maquinado", "Sin clase"}
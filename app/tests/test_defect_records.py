@@ -0,0 +1,101 @@
+import random
+
+from fastapi import HTTPException, Response
+import pytest
+import pytest_asyncio
+from sqlmodel import Session, select
+
+from benchmarks.dataset import _seed_catalogs, _seed_defects
+from models import Job, Product
+from routers.defect_record_router import get_defect_code, router
+
+# Las dos variantes de búsqueda comparten nombre en el módulo
+ENDPOINTS = {route.path: route.endpoint for route in router.routes}
+search_by_job = ENDPOINTS["/defect-records/search/{job_code}/{product_name}"]
+search_by_process = ENDPOINTS["/defect-records/search/{job_code}/{product_name}/{process_name}"]
+
+
+def seed_defects(session: Session, count: int) -> Job:
+    rng = random.Random(3)
+    ids = _seed_catalogs(session, rng, user_count=4)
+    product = session.exec(select(Product).where(Product.product_name == "TANKS")).one()
+    job = Job(job_code="JOB123", product_id=product.product_id)
+    session.add(job)
+    session.flush()
+    _seed_defects(session, job, "TANKS", count, 3, ids, rng, images_dir=None, image_size=(1, 1))
+    session.commit()
+    return job
+
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture(async_session):
+    await async_session.run_sync(seed_defects, 25)
+    return async_session
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limit", [5, 25])
+async def test_complete_records_fixed_query_count(session, query_budget, limit):
+    response = Response()
+    with query_budget(4):
+        records = await get_defect_code(session=session, response=response, job_serial="JOB123",
+                                        product_name="TANKS", skip=0, limit=limit)
+
+    assert len(records) == limit
+    assert response.headers["X-Total-Count"] == "25"
+    first = records[0]
+    assert first.issue.process.process_name
+    assert first.inspector.role.role_name and first.issue_by_user.role.role_name
+    assert [image.image_type.type_name for image in first.images] == ["BEFORE ERROR", "LOCATION IMAGE", "SOLVED IMAGE"]
+
+
+@pytest.mark.asyncio
+async def test_complete_records_pagination(session):
+    first = await get_defect_code(session=session, response=Response(), job_serial="JOB123",
+                                  product_name="TANKS", skip=0, limit=10)
+    last = await get_defect_code(session=session, response=Response(), job_serial="JOB123",
+                                 product_name="TANKS", skip=20, limit=10)
+
+    assert len(last) == 5
+    ids = [record.defect_record_id for record in first + last]
+    assert ids == sorted(ids) and len(set(ids)) == 15
+
+
+@pytest.mark.asyncio
+async def test_records_without_limit_return_every_row(session):
+    # Clientes anteriores a la paginación no mandan `limit` y esperan todas las filas
+    response = Response()
+    records = await get_defect_code(session=session, response=response, job_serial="JOB123",
+                                    product_name="TANKS", skip=0, limit=None)
+    assert len(records) == int(response.headers["X-Total-Count"]) == 25
+    assert len(await search_by_job("JOB123", "TANKS", session, Response(), skip=5, limit=None)) == 20
+
+
+@pytest.mark.asyncio
+async def test_complete_records_not_found(session):
+    with pytest.raises(HTTPException, match="Producto"):
+        await get_defect_code(session=session, response=Response(), job_serial="JOB123",
+                              product_name="NOPE", skip=0, limit=10)
+    with pytest.raises(HTTPException, match="Job"):
+        await get_defect_code(session=session, response=Response(), job_serial="NOPE",
+                              product_name="TANKS", skip=0, limit=10)
+
+
+@pytest.mark.asyncio
+async def test_search_records_paginated(session, query_budget):
+    response = Response()
+    with query_budget(2):
+        rows = await search_by_job("JOB123", "TANKS", session, response, skip=20, limit=10)
+
+    assert response.headers["X-Total-Count"] == "25"
+    assert len(rows) == 5
+    assert rows[0].job_code == "JOB123" and rows[0].process
+
+    process = rows[0].process
+    response = Response()
+    with query_budget(2):
+        rows = await search_by_process("JOB123", "TANKS", process, session, response, skip=0, limit=100)
+    assert len(rows) == int(response.headers["X-Total-Count"]) > 0
+
+    with pytest.raises(HTTPException):
+        await search_by_process("JOB123", "TANKS", "NOPE", session, Response(), skip=0, limit=100)
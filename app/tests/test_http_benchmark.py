@@ -0,0 +1,23 @@
+from benchmarks.http_benchmark import ScenarioResult, compare
+
+
+def test_summary_percentiles():
+    result = ScenarioResult("scan", requests=101, errors=1, seconds=2.0, latencies_ms=[float(n) for n in range(1, 101)])
+
+    summary = result.summary()
+
+    assert summary["rps"] == 50.5
+    assert summary["p50_ms"] == 50.5
+    assert 95 <= summary["p95_ms"] <= 96
+    assert 99 <= summary["p99_ms"] <= 100
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {"scan": {"p95_ms": 100.0, "rps": 50.0}, "login": {"p95_ms": 900.0, "rps": 4.0}}
+    current = {
+        "scan": {"p95_ms": 130.0, "rps": 49.0},
+        "login": {"p95_ms": 950.0, "rps": 4.1},
+        "ingest": {"p95_ms": 500.0, "rps": 1.0},  # sin línea base: no se compara
+    }
+
+    assert compare(current, baseline, tolerance=0.15) == ["scan: p95 100.0 -> 130.0 ms"]
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import io
+import os
+import random
+import time
+
+from fastapi import BackgroundTasks, HTTPException, UploadFile
+import pytest
+import pytest_asyncio
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.dataset import _seed_catalogs
+from config import settings
+from db import create_async_db_engine
+from models import DefectImage, DefectRecord, ImageBlob, Job, Product
+from routers.defect_record_router import router
+from scripts import image_store
+from services import image_storage
+
+ENDPOINTS = {(route.path, tuple(route.methods)[0]): route.endpoint for route in router.routes}
+create_defect_record = ENDPOINTS[("/defect-records/create-defect-record", "POST")]
+patch_defect_record = ENDPOINTS[("/defect-records/defect-record/{defect_record_id}", "PATCH")]
+
+
+def upload(name: str, size: int, fill: bytes = b"x") -> UploadFile:
+    # Sin `size` para forzar el corte durante la copia por bloques
+    return UploadFile(io.BytesIO(fill * size), filename=name)
+
+
+@pytest.fixture(autouse=True)
+def static_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STATIC_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_save_images_streams_all_kinds(static_dir, monkeypatch):
+    monkeypatch.setattr(image_storage, "CHUNK_SIZE", 7)
+    stored = await image_storage.save_images({
+        "defect": [upload("a.JPG", 100), upload("", 10)],
+        "location": [upload("b.png", 50, fill=b"\x89PNG\r\n\x1a\n")],
+        "solved": None,
+    })
+
+    assert [(image.kind, image.image_type_id, image.size) for image in stored] == [
+        ("defect", 3, 100), ("location", 2, 400),
+    ]
+    defect, location = stored
+    sha256 = hashlib.sha256(b"x" * 100).hexdigest()
+    assert defect.url == f"/static/blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}.jpg"
+    # La extensión sale del contenido, no del nombre
+    assert location.url.endswith(".png")
+    assert (static_dir / defect.url.removeprefix("/static/")).read_bytes() == b"x" * 100
+    assert not list(static_dir.rglob("*.part"))
+
+
+@pytest.mark.asyncio
+async def test_save_images_deduplicates_content(static_dir):
+    first, second, third = await image_storage.save_images({
+        "defect": [upload("a.jpg", 30), upload("b.jpg", 30)],
+        "solved": [upload("c.jpg", 31)],
+    })
+
+    assert first.url == second.url != third.url
+    assert first.created != second.created and third.created
+    assert len([path for path in static_dir.rglob("*") if path.is_file()]) == 2
+
+
+@pytest.mark.asyncio
+async def test_save_images_rejects_oversized_without_unlinking(static_dir, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_MAX_BYTES", 64)
+
+    with pytest.raises(image_storage.ImageTooLarge, match="big.jpg"):
+        await image_storage.save_images({
+            "defect": [upload("ok.jpg", 10), upload("big.jpg", 65)],
+            "location": [upload("ok2.jpg", 64)],
+        })
+
+    # La copia cortada no deja temporales; los blobs completos quedan para gc
+    assert not list(static_dir.rglob("*.part"))
+    assert len([path for path in static_dir.rglob("*") if path.is_file()]) == 2
+
+
+@pytest_asyncio.fixture(name="catalog")
+async def catalog_fixture(async_session):
+    def seed(session):
+        ids = _seed_catalogs(session, random.Random(1), user_count=2)
+        product = session.exec(select(Product).where(Product.product_name == "TANKS")).one()
+        job = Job(job_code="JOB123", product_id=product.product_id)
+        session.add(job)
+        session.commit()
+        user_id = next(iter(ids["user"].values()))
+        return {
+            "product_id": product.product_id,
+            "job_id": job.job_id,
+            "inspector_user_id": user_id,
+            "issue_by_user_id": user_id,
+            "issue_id": next(iter(ids["issue"])),
+            "correction_process_id": 1,
+            "status_id": next(iter(ids["status"].values())),
+        }
+
+    return await async_session.run_sync(seed)
+
+
+@pytest.mark.asyncio
+async def test_create_and_patch_defect_record_images(async_session, catalog, static_dir):
+    background_tasks = BackgroundTasks()
+    created = await create_defect_record(
+        session=async_session, background_tasks=background_tasks, **catalog,
+        defect_images=[upload("d1.jpg", 20), upload("d2.jpg", 30)],
+        location_images=[upload("l1.jpg", 20)],
+    )
+    assert len(created.defect_images) == 2 and len(created.location_images) == 1
+    # Las variantes se generan después de responder
+    assert [task.args for task in background_tasks.tasks] == [(created.defect_record_id,)]
+
+    # Llamada directa: los Form/File omitidos deben pasarse explícitamente
+    updated = await patch_defect_record(
+        session=async_session, background_tasks=BackgroundTasks(), defect_record_id=created.defect_record_id,
+        **{name: None for name in catalog}, description=None, close_record=False,
+        defect_images=None, location_images=None, solved_images=[upload("s1.jpg", 5)],
+    )
+    assert updated.solved_images[0].startswith("/static/blobs/")
+
+    rows = (await async_session.exec(select(DefectImage.image_type_id, DefectImage.image_url))).all()
+    assert sorted(type_id for type_id, _ in rows) == [1, 2, 3, 3]
+    for _, url in rows:
+        assert (static_dir / url.removeprefix("/static/")).is_file()
+    # d1 y l1 tienen el mismo contenido: un archivo, dos referencias
+    blobs = (await async_session.exec(select(ImageBlob.size, ImageBlob.ref_count))).all()
+    assert sorted(blobs) == [(5, 1), (20, 2), (30, 1)]
+
+    delete_defect_record = ENDPOINTS[("/defect-records/{defect_record_id}", "DELETE")]
+    await delete_defect_record(created.defect_record_id, async_session)
+    blobs = (await async_session.exec(select(ImageBlob.ref_count))).all()
+    assert blobs == [0, 0, 0]
+
+
+@pytest.mark.asyncio
+async def test_create_defect_record_too_large(async_session, catalog, static_dir, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_MAX_BYTES", 16)
+
+    with pytest.raises(HTTPException) as error:
+        await create_defect_record(
+            session=async_session, background_tasks=BackgroundTasks(), **catalog,
+            defect_images=[upload("d1.jpg", 17)],
+            location_images=[upload("l1.jpg", 1)],
+        )
+
+    assert error.value.status_code == 413
+    await async_session.rollback()
+    assert (await async_session.exec(select(DefectRecord))).all() == []
+
+
+@pytest.mark.asyncio
+async def test_failed_commit_keeps_blob_shared_with_another_upload(async_session, catalog, static_dir, monkeypatch):
+    shared = []
+
+    async def failing_commit():
+        # Otra subida del mismo contenido reutiliza el blob antes de que falle este commit
+        shared.append(await image_storage.save_image(upload("b.jpg", 20), "defect"))
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(async_session, "commit", failing_commit)
+    with pytest.raises(RuntimeError):
+        await create_defect_record(
+            session=async_session, background_tasks=BackgroundTasks(), **catalog,
+            defect_images=[upload("a.jpg", 20)], location_images=None,
+        )
+
+    assert not shared[0].created
+    assert shared[0].path.read_bytes() == b"x" * 20
+
+
+@pytest.mark.asyncio
+async def test_gc_keeps_recently_used_blobs(async_engine, async_session, static_dir, monkeypatch):
+    monkeypatch.setattr(image_store, "async_engine", async_engine)
+    old, reused, orphan, fresh_orphan = (
+        await image_storage.save_images({"defect": [upload(f"{n}.jpg", 10 + n) for n in range(4)]})
+    )
+    await image_storage.add_references(async_session, [old.blob, reused.blob])
+    await image_storage.release_references(async_session, [old.sha256, reused.sha256])
+    await async_session.commit()
+    two_hours_ago = time.time() - 7200
+    for image in (old, reused, orphan):
+        os.utime(image.path, (two_hours_ago, two_hours_ago))
+
+    # Una subida en curso vuelve a usar un blob en 0: renueva su mtime
+    assert not (await image_storage.save_image(upload("again.jpg", 11), "defect")).created
+
+    assert await image_store.gc(grace_minutes=60, dry_run=False) == (1, 1)
+    assert [image.path.exists() for image in (old, reused, orphan, fresh_orphan)] == [False, True, False, True]
+    blobs = (await async_session.exec(select(ImageBlob.sha256))).all()
+    assert blobs == [reused.sha256]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_releases_do_not_lose_decrements(tmp_path):
+    engine = create_async_db_engine(f"sqlite:///{tmp_path / 'blobs.sqlite3'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine) as session:
+        await image_storage.add_references(session, [("a" * 64, ".jpg", 10)] * 10 + [("b" * 64, ".jpg", 5)])
+        await session.commit()
+
+    async def release(sha256s):
+        async with AsyncSession(engine) as session:
+            await image_storage.release_references(session, sha256s)
+            await session.commit()
+
+    # Borrados simultáneos del mismo archivo; uno resta más referencias de las que hay
+    await asyncio.gather(*(release(["a" * 64]) for _ in range(8)), release(["b" * 64, "b" * 64]))
+    async with AsyncSession(engine) as session:
+        blobs = dict((await session.exec(select(ImageBlob.sha256, ImageBlob.ref_count))).all())
+    await engine.dispose()
+    assert blobs == {"a" * 64: 2, "b" * 64: 0}
+
+
+@pytest.mark.asyncio
+async def test_references_without_upsert(async_session, monkeypatch):
+    # Dialectos sin ON CONFLICT usan UPDATE y, si no existía, INSERT
+    monkeypatch.setattr(image_storage, "_insert", lambda dialect: None)
+    await image_storage.add_references(async_session, [("a" * 64, ".jpg", 10)] * 2)
+    await image_storage.add_references(async_session, [("a" * 64, ".jpg", 10), ("b" * 64, ".png", 4)])
+    await image_storage.release_references(async_session, ["b" * 64, None])
+    await async_session.commit()
+
+    blobs = (await async_session.exec(select(ImageBlob.sha256, ImageBlob.extension, ImageBlob.ref_count))).all()
+    assert sorted(blobs) == [("a" * 64, ".jpg", 3), ("b" * 64, ".png", 0)]
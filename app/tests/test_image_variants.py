@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+import random
+
+from PIL import Image
+import pytest
+import pytest_asyncio
+from sqlmodel import select
+
+from config import settings
+from models import DefectImage, DefectRecord
+from services import image_variants
+
+
+def write_photo(path, size=(2400, 1800)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Ruido: no comprime, como el peor caso de una foto de teléfono
+    noise = random.Random(0).randbytes(size[0] * size[1] * 3)
+    Image.frombytes("RGB", size, noise).save(path, format="JPEG", quality=95)
+
+
+@pytest.fixture(autouse=True)
+def static_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STATIC_DIR", str(tmp_path))
+    yield tmp_path
+    image_variants.variant_pool.shutdown()
+
+
+def test_build_variants_sizes(static_dir):
+    original = static_dir / "punch_list" / "defect_1.jpg"
+    write_photo(original)
+
+    image_variants.build_variants(str(original), {"thumb": 320, "display": 1600}, quality=80)
+
+    with Image.open(static_dir / "punch_list" / "defect_1_thumb.jpg") as thumb:
+        assert thumb.size == (320, 240)
+    with Image.open(static_dir / "punch_list" / "defect_1_display.jpg") as display:
+        assert display.size == (1600, 1200)
+    assert (static_dir / "punch_list" / "defect_1_thumb.jpg").stat().st_size < original.stat().st_size / 20
+
+
+def test_concurrent_builds_of_the_same_original(static_dir):
+    original = static_dir / "blobs" / "ab" / "cd" / "abcd.jpg"
+    write_photo(original, size=(1200, 900))
+
+    # Dos DefectImage con el mismo blob o un backfill junto a un request
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        builds = [
+            pool.submit(image_variants.build_variants, str(original), {"thumb": 320, "display": 1000}, 80, True)
+            for _ in range(12)
+        ]
+        for build in builds:
+            build.result()
+
+    with Image.open(original.with_name("abcd_display.jpg")) as display:
+        display.load()
+        assert display.size == (1000, 750)
+    assert not list(static_dir.rglob("*.part"))
+
+
+@pytest_asyncio.fixture(name="images")
+async def images_fixture(async_session, static_dir):
+    def seed(session):
+        session.execute(DefectRecord.__table__.insert(), [{
+            "product_id": 1, "job_id": 1, "inspector_user_id": 1, "issue_by_user_id": 1,
+            "issue_id": 1, "correction_process_id": 1, "status_id": 1,
+        }])
+        urls = ["/static/punch_list/a/defect_1.jpg", "/static/punch_list/a/missing.jpg"]
+        session.add_all([DefectImage(defect_record_id=1, image_type_id=3, image_url=url) for url in urls])
+        session.commit()
+
+    write_photo(static_dir / "punch_list" / "a" / "defect_1.jpg", size=(800, 600))
+    await async_session.run_sync(seed)
+
+
+@pytest.mark.asyncio
+async def test_generate_variants_skips_missing_originals(async_session, images, static_dir):
+    ids = (await async_session.exec(select(DefectImage.defect_image_id))).all()
+
+    assert await image_variants.generate_variants(async_session, ids) == 1
+    # Ya generadas: no se vuelven a procesar salvo con force
+    assert await image_variants.generate_variants(async_session, ids) == 0
+
+    rows = (await async_session.exec(select(DefectImage).order_by(DefectImage.defect_image_id))).all()
+    assert rows[0].thumbnail_url == "/static/punch_list/a/defect_1_thumb.jpg"
+    assert rows[0].display_url == "/static/punch_list/a/defect_1_display.jpg"
+    assert rows[1].thumbnail_url is None
+    assert (static_dir / "punch_list" / "a" / "defect_1_thumb.jpg").is_file()
@@ -0,0 +1,131 @@
+import io
+import json
+import os
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from sqlmodel import Session, func, select
+
+from models import Item, Object, Product
+from routers import validate_csv
+from routers.validate_csv import get_ingest_status, validate_and_insert
+from services import ingest_jobs as ingest_jobs_module
+from services.ingest_jobs import IngestJobManager, IngestQueueFull, PHASE_DONE, PHASE_FAILED
+
+CSV = """Job,Item,Material,Espesor,Cantidad,OCR,Clase,Longitud,Ancho,Alto,Volumen,Área Superficial
+JOB1,Plate,Steel,0.25,3,JOB1Plate,Corte,3,5.85,0.25,0.03,3.3
+JOB1,Stud,Steel,0.25,2,JOB1Stud,Sin clase,0.75,0.25,0.25,,0.06
+"""
+
+
+@pytest.fixture(name="jobs")
+def jobs_fixture(engine, monkeypatch):
+    # La ingesta corre en el pool con su propia sesión: debe usar la base de prueba
+    monkeypatch.setattr(validate_csv, "engine", engine)
+    manager = IngestJobManager(max_workers=1, max_pending=2, retention_seconds=60)
+    monkeypatch.setattr(validate_csv, "ingest_jobs", manager)
+    with Session(engine) as session:
+        session.add(Product(product_name="TANKS"))
+        session.commit()
+    yield manager
+    manager._executor.shutdown(wait=True)
+
+
+def upload(engine, content: str) -> dict:
+    file = UploadFile(file=io.BytesIO(content.encode()), filename="job1.csv")
+    with Session(engine) as session:
+        response = validate_and_insert(file, "TANKS", session, async_ingest=True)
+    assert response.status_code == 202
+    return json.loads(response.body)
+
+
+def poll(ingest_id: str, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = get_ingest_status(ingest_id)
+        if status["phase"] in (PHASE_DONE, PHASE_FAILED):
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"La ingesta {ingest_id} no terminó: {status}")
+
+
+def finish_after(event: threading.Event):
+    def run(job):
+        event.wait(5)
+        job.phase = PHASE_DONE
+    return run
+
+
+def test_async_ingest_runs_to_done(engine, jobs):
+    body = upload(engine, CSV)
+    assert body["status_url"] == f"/object/ingest/{body['ingest_id']}"
+
+    status = poll(body["ingest_id"])
+    assert status["phase"] == PHASE_DONE
+    assert (status["status_code"], status["rows_total"], status["rows_processed"]) == (201, 2, 2)
+    assert status["result"] == {"message": "Job, Items, Objects y Process creados exitosamente."}
+
+    with Session(engine) as session:
+        assert session.exec(select(func.count()).select_from(Item)).one() == 2
+        assert session.exec(select(func.count()).select_from(Object)).one() == 5
+
+
+def test_async_ingest_reports_failed_phase(engine, jobs):
+    body = upload(engine, "Job,Item\nJOB1,Plate\n")
+
+    status = poll(body["ingest_id"])
+    assert (status["phase"], status["status_code"]) == (PHASE_FAILED, 400)
+    assert status["errors"]["error"] == "Faltan columnas en el archivo CSV."
+    with Session(engine) as session:
+        assert session.exec(select(func.count()).select_from(Item)).one() == 0
+
+
+def test_async_ingest_returns_503_when_queue_is_full(engine, jobs, monkeypatch):
+    release = threading.Event()
+    blocked = [jobs.submit(f"blocked{n}.csv", "TANKS", finish_after(release)) for n in range(jobs.max_pending)]
+
+    spooled = []
+    real_submit = jobs.submit
+    monkeypatch.setattr(jobs, "submit", lambda *args: spooled.append(args[3]) or real_submit(*args))
+    file = UploadFile(file=io.BytesIO(CSV.encode()), filename="job1.csv")
+    with Session(engine) as session, pytest.raises(HTTPException) as error:
+        validate_and_insert(file, "TANKS", session, async_ingest=True)
+    assert error.value.status_code == 503
+    # El archivo temporal de la carga rechazada no queda en disco
+    assert spooled and not os.path.exists(spooled[0])
+
+    release.set()
+    for job in blocked:
+        poll(job.ingest_id)
+    assert upload(engine, CSV)["ingest_id"]
+
+
+def test_finished_jobs_are_pruned_after_retention(monkeypatch):
+    manager = IngestJobManager(max_workers=1, max_pending=1, retention_seconds=60)
+    done = threading.Event()
+    done.set()
+    finished = manager.submit("done.csv", "TANKS", finish_after(done))
+    deadline = time.monotonic() + 5
+    while finished.finished_at is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert finished.finished
+
+    # Una ingesta terminada no cuenta como pendiente
+    release = threading.Event()
+    running = manager.submit("running.csv", "TANKS", finish_after(release))
+    with pytest.raises(IngestQueueFull):
+        manager.submit("extra.csv", "TANKS", lambda job: None)
+    assert manager.get(finished.ingest_id) is not None
+
+    clock = time.time()
+    monkeypatch.setattr(ingest_jobs_module.time, "time", lambda: clock + 120)
+    with pytest.raises(IngestQueueFull):
+        manager.submit("extra.csv", "TANKS", lambda job: None)
+    assert manager.get(finished.ingest_id) is None
+    # La que sigue en curso no se descarta aunque sea antigua
+    assert manager.get(running.ingest_id) is running
+
+    release.set()
+    manager._executor.shutdown(wait=True)
@@ -0,0 +1,120 @@
+import io
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException, UploadFile
+from sqlmodel import Session, func, select
+
+from models import Item, Job, JobStageCount, Object, Product
+from routers.validate_csv import validate_and_insert
+from services import ingest_service
+from services.progress_service import rebuild_counts
+
+DATASET = Path(__file__).resolve().parent.parent / "data_example" / "WN675A.csv"
+
+CSV = """Job,Item,Material,Espesor,Cantidad,OCR,Clase,Longitud,Ancho,Alto,Volumen,Área Superficial
+JOB1,Plate,Steel,0.25,3,JOB1Plate,Corte,3,5.85,0.25,0.03,3.3
+JOB1,Stud,Steel,0.25,2,JOB1Stud,Sin clase,0.75,0.25,0.25,,0.06
+JOB1,Bracket,Steel,0.25,1,JOB1Bracket,Doblado,1,1,1,1,1
+"""
+
+
+@pytest.fixture(name="session")
+def session_fixture(engine):
+    with Session(engine) as session:
+        session.add(Product(product_name="TANKS"))
+        session.commit()
+        yield session
+
+
+def ingest(session: Session, content: bytes, filename: str = "job.csv"):
+    return validate_and_insert(UploadFile(file=io.BytesIO(content), filename=filename), "TANKS", session)
+
+
+def count(session: Session, model) -> int:
+    return session.exec(select(func.count()).select_from(model)).one()
+
+
+def insert_job(session: Session, df: pd.DataFrame, **kwargs):
+    job = Job(job_code=str(df["Job"].iloc[0]), product_id=1)
+    session.add(job)
+    session.flush()
+    return ingest_service.bulk_insert_items(session, df, job.job_id, **kwargs)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 7])
+def test_bulk_insert_matches_the_csv(session, chunk_size):
+    content = DATASET.read_bytes()
+    expected = pd.read_csv(io.BytesIO(content), encoding="latin1")
+
+    if chunk_size is None:
+        assert ingest(session, content, DATASET.name).status_code == 201
+    else:
+        # Varios bloques: los item_id y números de pieza se resuelven por bloque
+        result = insert_job(session, expected, chunk_size=chunk_size)
+        session.commit()
+        assert (result.items_created, result.objects_created) == (len(expected), expected["Cantidad"].sum())
+
+    items = session.exec(select(Item)).all()
+    assert len(items) == len(expected)
+    assert {item.item_name: item.cantidad for item in items} == dict(
+        zip(expected["Item"].astype(str), expected["Cantidad"])
+    )
+    assert count(session, Object) == expected["Cantidad"].sum()
+
+    # Piezas numeradas 1..Cantidad dentro de cada Item, todas en el stage 1
+    pieces = {}
+    for item_id, piece_number, current_stage in session.exec(
+        select(Object.item_id, Object.piece_number, Object.current_stage)
+    ).all():
+        assert current_stage == 1
+        pieces.setdefault(item_id, []).append(piece_number)
+    assert {item.item_id: sorted(pieces[item.item_id]) for item in items} == {
+        item.item_id: list(range(1, item.cantidad + 1)) for item in items
+    }
+
+    counters = session.exec(select(JobStageCount.item_id, JobStageCount.stage_id, JobStageCount.count)).all()
+    assert sorted(counters) == sorted((item.item_id, 1, item.cantidad) for item in items)
+    assert rebuild_counts(session, fix=False).drift == []
+
+
+def test_existing_job_only_adds_new_items(session):
+    ingest(session, CSV.encode())
+    extra = CSV + "JOB1,Washer,Steel,0.25,4,JOB1Washer,Corte,1,1,1,1,1\n"
+    ingest(session, extra.encode())
+
+    assert count(session, Item) == 4
+    assert count(session, Object) == 10
+    assert rebuild_counts(session, fix=False).drift == []
+
+
+def test_failed_chunk_rolls_back_the_whole_ingest(session, engine, monkeypatch):
+    calls = []
+
+    def failing_deltas(session, deltas):
+        calls.append(deltas)
+        if len(calls) == 2:
+            raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(ingest_service, "apply_count_deltas", failing_deltas)
+    with pytest.raises(RuntimeError):
+        insert_job(session, pd.read_csv(io.StringIO(CSV)), chunk_size=1)
+    # El primer bloque ya se había escrito, pero nada se confirmó
+    session.rollback()
+
+    with Session(engine) as fresh:
+        assert [count(fresh, model) for model in (Job, Item, Object, JobStageCount)] == [0, 0, 0, 0]
+
+
+def test_duplicate_items_are_rejected(session):
+    # Mismo Item con otros datos: ambas filas se resolverían al mismo item_id
+    duplicated = CSV + "JOB1,Plate,Steel,0.5,1,JOB1Plate2,Corte,3,5.85,0.25,0.03,3.3\n"
+    with pytest.raises(HTTPException) as error:
+        ingest(session, duplicated.encode())
+    assert error.value.status_code == 400
+    assert error.value.detail["duplicates"] == [{"Job": "JOB1", "Item": "Plate"}]
+    assert count(session, Item) == 0
+
+    with pytest.raises(ValueError, match="Plate"):
+        insert_job(session, pd.read_csv(io.StringIO(duplicated)))
@@ -0,0 +1,89 @@
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlmodel import Session
+
+from models import Item, Job, Object, Process, ProcessStage, Product, Stage
+from routers.job_status import get_job_status
+from services.progress_service import apply_count_deltas, rebuild_counts
+
+
+def seed_job(session: Session) -> Job:
+    # CUTTING(1) -> MACHINING(2) -> WAREHOUSE(3)
+    session.add_all([Stage(stage_name="CUTTING"), Stage(stage_name="MACHINING"), Stage(stage_name="WAREHOUSE")])
+    session.add(Product(product_name="TANKS"))
+    process = Process(process_name="Machining")
+    session.add(process)
+    session.commit()
+    for order, stage_id in enumerate([1, 2, 3], start=1):
+        session.add(ProcessStage(process_id=process.process_id, stage_id=stage_id, order=order))
+
+    job = Job(job_code="JOB123", product_id=1)
+    session.add(job)
+    session.commit()
+    for name, stages in [("Plate", [1, 2, 2, 3]), ("Stud", [3, 3])]:
+        item = Item(item_name=name, espesor=1, longitud=1, ancho=1, alto=1, volumen=1,
+                    area_superficial=1, cantidad=len(stages), ocr=f"JOB123{name}",
+                    job_id=job.job_id, process_id=process.process_id)
+        session.add(item)
+        session.commit()
+        session.add_all([
+            Object(item_id=item.item_id, piece_number=n, current_stage=stage, scrap=0)
+            for n, stage in enumerate(stages, start=1)
+        ])
+    session.commit()
+    rebuild_counts(session)
+    session.commit()
+    return job
+
+
+@pytest_asyncio.fixture(name="job")
+async def job_fixture(async_session):
+    return await async_session.run_sync(seed_job)
+
+
+async def count_queries(async_engine, coro):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        await coro
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+    return len(statements)
+
+
+@pytest.mark.asyncio
+async def test_job_status_ratios(async_session, job):
+    response = await get_job_status("JOB123", async_session)
+
+    ratios = {
+        stage.stage_name: {item.item_name: (item.ratio, item.status) for item in stage.items}
+        for stage in response.stages
+    }
+    # Los objetos en la etapa 1 siempre cuentan como pendientes
+    assert ratios == {
+        "CUTTING": {"Plate": ("3/4", False), "Stud": ("2/2", True)},
+        "MACHINING": {"Plate": ("3/4", False), "Stud": ("2/2", True)},
+        "WAREHOUSE": {"Plate": ("1/4", False), "Stud": ("2/2", True)},
+    }
+
+
+@pytest.mark.asyncio
+async def test_job_status_query_count_is_fixed(async_engine, async_session, job):
+    baseline = await count_queries(async_engine, get_job_status("JOB123", async_session))
+
+    async_session.add_all([Object(item_id=1, piece_number=n, current_stage=2, scrap=0) for n in range(5, 55)])
+    await async_session.run_sync(apply_count_deltas, [(job.job_id, 1, 2, 50)])
+    await async_session.commit()
+    async_session.expire_all()
+
+    assert await count_queries(async_engine, get_job_status("JOB123", async_session)) == baseline
+
+
+@pytest.mark.asyncio
+async def test_job_status_unknown_job(async_session):
+    with pytest.raises(HTTPException) as exc:
+        await get_job_status("NOPE", async_session)
+    assert exc.value.status_code == 404
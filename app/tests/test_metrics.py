@@ -0,0 +1,123 @@
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from auth import create_access_token
+from config import settings
+from middleware import auth_middleware
+from middleware.metrics import metrics_middleware
+from db import create_db_engine
+from models import Stage
+from routers import metrics_router
+from services.metrics import DB_LOCK_ERRORS, DB_LOCK_WAIT, DB_QUERIES, HTTP_REQUEST_DURATION, Counter, Histogram, Registry
+
+
+def test_exposition_format():
+    registry = Registry()
+    counter = Counter("bytes_total", "Bytes escritos.", ["kind"], registry=registry)
+    histogram = Histogram("latency_seconds", "Latencia.", buckets=(0.1, 1.0), registry=registry)
+
+    counter.inc(10, kind='defect "A"')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(3)
+
+    assert registry.render().splitlines() == [
+        "# HELP bytes_total Bytes escritos.",
+        "# TYPE bytes_total counter",
+        'bytes_total{kind="defect \\"A\\""} 10',
+        "# HELP latency_seconds Latencia.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 3.55",
+        "latency_seconds_count 3",
+    ]
+
+
+def test_labels_must_match():
+    counter = Counter("labelled_total", "Con etiquetas.", ["kind"], registry=Registry())
+    with pytest.raises(ValueError):
+        counter.inc(route="/x")
+
+
+def test_middleware_records_route_template(engine):
+    app = FastAPI()
+    app.middleware("http")(metrics_middleware)
+    app.include_router(metrics_router.router)
+
+    @app.get("/stages/{stage_name}")
+    def get_stage(stage_name: str):
+        with Session(engine) as session:
+            return session.exec(select(Stage).where(Stage.stage_name == stage_name)).first()
+
+    labels = {"method": "GET", "route": "/stages/{stage_name}", "status": "200"}
+    requests_before = HTTP_REQUEST_DURATION.count(**labels)
+    queries_before = DB_QUERIES.value()
+
+    client = TestClient(app)
+    client.get("/stages/CUTTING")
+    client.get("/stages/BENDING")
+    response = client.get("/metrics")
+
+    assert HTTP_REQUEST_DURATION.count(**labels) == requests_before + 2
+    assert DB_QUERIES.value() == queries_before + 2
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="GET",route="/stages/{stage_name}",status="200"}' in response.text
+    assert "http_requests_in_flight 1" in response.text
+
+
+def test_metrics_require_token_or_role(monkeypatch):
+    app = FastAPI()
+    app.middleware("http")(auth_middleware)
+    app.include_router(metrics_router.router)
+    client = TestClient(app, follow_redirects=False)
+
+    def bearer(token: str) -> dict:
+        return {"Authorization": f"Bearer {token}", "Accept": "text/html"}
+
+    def login(role: str) -> dict:
+        return bearer(create_access_token({"sub": "ana", "role": role}))
+
+    assert client.get("/metrics").headers["location"] == "/login"
+    assert client.get("/metrics", headers=login("operador")).headers["location"] == "/home"
+    assert client.get("/metrics", headers=login("admin")).status_code == 200
+
+    # Sin METRICS_TOKEN configurado ningún token fijo da acceso
+    assert client.get("/metrics", headers=bearer("")).status_code == 303
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics", headers=bearer("scrape-secret")).status_code == 200
+    assert client.get("/metrics", headers=bearer("wrong")).status_code == 303
+
+
+def test_sqlite_lock_waits_are_observed(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'locks.sqlite3'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE t (x INTEGER)"))
+    waits_before, errors_before = DB_LOCK_WAIT.count(), DB_LOCK_ERRORS.value()
+
+    holding = threading.Event()
+
+    def hold_write_lock():
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO t VALUES (1)"))
+            holding.set()
+            time.sleep(0.2)
+
+    holder = threading.Thread(target=hold_write_lock)
+    holder.start()
+    holding.wait(5)
+    # Espera a que el otro commit libere el lock y luego escribe: no es un error
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO t VALUES (2)"))
+    holder.join()
+    engine.dispose()
+
+    assert DB_LOCK_WAIT.count() == waits_before + 1
+    assert DB_LOCK_ERRORS.value() == errors_before
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+
+from routers import ocr_routes
+from services import ocr_service
+from services.ocr_service import AsyncOCRClient, OCRTimeout, PollResult, STATUS_SUCCEEDED, read_batch
+
+
+class DelayBackend:
+    """La "imagen" es `texto:segundos`; cuenta las lecturas simultáneas."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def submit(self, image: bytes) -> str:
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        return image.decode()
+
+    async def poll(self, operation: str) -> PollResult:
+        text, delay = operation.split(":")
+        try:
+            await asyncio.sleep(float(delay))
+        finally:
+            self.active -= 1
+        return PollResult(status=STATUS_SUCCEEDED, lines=[text] if text else [])
+
+
+def client(backend) -> AsyncOCRClient:
+    return AsyncOCRClient(backend, timeout=2.0, poll_initial=0.001, poll_max=0.01)
+
+
+@pytest.mark.asyncio
+async def test_read_batch_limits_concurrency_and_yields_in_completion_order():
+    backend = DelayBackend()
+    images = [b"slow:0.3"] + [f"L{n}:0.05".encode() for n in range(7)]
+    started = time.perf_counter()
+    results = [result async for result in read_batch(client(backend), images, concurrency=4)]
+
+    assert backend.peak == 4
+    assert sorted(r.index for r in results) == list(range(8))
+    # La lenta no retiene a las demás
+    assert results[-1].index == 0 and results[-1].lines == ["slow"]
+    assert time.perf_counter() - started < 0.5
+
+
+@pytest.mark.asyncio
+async def test_read_batch_deadline_is_per_image():
+    backend = DelayBackend()
+    images = [b"stuck:5", b"A:0.01", b":0.01"]
+    results = {r.index: r async for r in read_batch(client(backend), images, concurrency=1, timeout=0.1)}
+
+    assert isinstance(results[0].error, OCRTimeout) and results[0].status == "timeout"
+    # Con concurrency=1 las siguientes esperaron en la cola, pero su plazo empieza al leerlas
+    assert (results[1].status, results[1].lines) == ("ok", ["A"])
+    assert results[2].status == "empty"
+
+
+@pytest.mark.asyncio
+async def test_read_batch_close_cancels_pending_reads():
+    backend = DelayBackend()
+    results = read_batch(client(backend), [b"A:0.01", b"B:5", b"C:5"], concurrency=3)
+    first = await results.__anext__()
+    assert first.lines == ["A"]
+    await results.aclose()
+    await asyncio.sleep(0.01)
+    assert backend.active == 0
+
+
+def test_batch_endpoint_streams_ndjson(monkeypatch):
+    monkeypatch.setattr(ocr_service, "_client", client(DelayBackend()))
+    app = FastAPI()
+    app.include_router(ocr_routes.router)
+    files = [
+        ("images", ("a.jpg", b"WN675A:0.05", "image/jpeg")),
+        ("images", ("b.jpg", b"stud_3:0.01", "image/jpeg")),
+        ("images", ("notes.txt", b"x:0", "text/plain")),
+    ]
+    with TestClient(app) as test_client:
+        response = test_client.post("/ocr/batch", files=files, params={"concurrency": 2})
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(row) for row in response.text.splitlines()]
+    assert [(row["filename"], row["status"], row["lines"]) for row in rows[:-1]] == [
+        ("notes.txt", "invalid", []), ("b.jpg", "ok", ["stud_3"]), ("a.jpg", "ok", ["WN675A"]),
+    ]
+    assert rows[-1]["summary"] | {"elapsed_ms": 0} == {"total": 3, "ok": 2, "empty": 0, "failed": 1, "elapsed_ms": 0}
+
+
+def test_batch_endpoint_rejects_oversized_batch(monkeypatch):
+    monkeypatch.setattr(ocr_routes.settings, "OCR_BATCH_MAX_IMAGES", 1)
+    app = FastAPI()
+    app.include_router(ocr_routes.router)
+    files = [("images", (f"{n}.jpg", b"x", "image/jpeg")) for n in range(2)]
+    assert TestClient(app).post("/ocr/batch", files=files).status_code == 413
@@ -0,0 +1,105 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+
+from routers import ocr_cache_router
+from services import ocr_cache as ocr_cache_module
+from services.ocr_cache import CachedOCRClient, OCRCache, image_key
+from services.ocr_service import AsyncOCRClient, FakeOCRBackend, OCRTimeout
+
+
+def cached_client(cache: OCRCache, backend: FakeOCRBackend, **kwargs) -> CachedOCRClient:
+    options = {"timeout": 2.0, "poll_initial": 0.01, "poll_max": 0.04}
+    return CachedOCRClient(AsyncOCRClient(backend, **{**options, **kwargs}), cache)
+
+
+@pytest.mark.asyncio
+async def test_hits_skip_the_backend_and_survive_restart(tmp_path):
+    path = str(tmp_path / "ocr.sqlite3")
+    backend = FakeOCRBackend(latency=0.02)
+    cache = OCRCache(path, memory_entries=10, ttl_seconds=60, max_bytes=1 << 20)
+    client = cached_client(cache, backend)
+
+    assert await client.read_text(b"WN675A\nstud_3") == ["WN675A", "stud_3"]
+    assert await client.read_text(b"WN675A\nstud_3") == ["WN675A", "stud_3"]
+    assert backend.submitted == 1
+    stats = await cache.snapshot()
+    assert (stats["misses"], stats["memory_hits"], stats["ocr_calls_saved"]) == (1, 1, 1)
+    assert stats["saved_seconds"] > 0.02
+
+    # Otro proceso (memoria vacía) lee del nivel de disco
+    cache.close()
+    restarted = OCRCache(path, memory_entries=10, ttl_seconds=60, max_bytes=1 << 20)
+    client = cached_client(restarted, backend)
+    assert await client.read_text(b"WN675A\nstud_3") == ["WN675A", "stud_3"]
+    assert backend.submitted == 1
+    assert restarted.stats.disk_hits == 1
+    restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite3"))
+    failing = FakeOCRBackend(fail=True)
+    assert await cached_client(cache, failing).read_text(b"x") is None
+    assert await cached_client(cache, failing).read_text(b"x") is None
+    assert failing.submitted == 2
+
+    with pytest.raises(OCRTimeout):
+        await cached_client(cache, FakeOCRBackend(polls=1000), timeout=0.05).read_text(b"x")
+    assert (await cache.snapshot())["disk_entries"] == 0
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_share_one_backend_call(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite3"))
+    backend = FakeOCRBackend(latency=0.05)
+    client = cached_client(cache, backend)
+
+    results = await asyncio.gather(*(client.read_text(b"WN675A") for _ in range(10)))
+    assert results == [["WN675A"]] * 10
+    assert backend.submitted == 1
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_size_eviction(tmp_path, monkeypatch):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite3"), memory_entries=2, ttl_seconds=60, max_bytes=400)
+    for n in range(10):
+        await cache.put(image_key(f"{n}".encode()), [f"LINE-{n}"], 0.5)
+    stats = await cache.snapshot()
+    assert stats["memory_entries"] == 2
+    assert stats["disk_bytes"] <= 400
+    assert stats["evicted"] > 0
+    # Se conservan las más recientes
+    assert (await cache.get(image_key(b"9")))[1] == "memory"
+    assert (await cache.get(image_key(b"7")))[1] == "disk"
+    assert (await cache.get(image_key(b"0")))[0] is None
+
+    clock = ocr_cache_module.time.time()
+    monkeypatch.setattr(ocr_cache_module.time, "time", lambda: clock + 120)
+    assert (await cache.get(image_key(b"9")))[0] is None
+    assert (await cache.get(image_key(b"7")))[0] is None
+    assert cache.stats.expired == 2
+    cache.close()
+
+
+def test_admin_endpoint_reports_and_resets(tmp_path, monkeypatch):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite3"))
+    monkeypatch.setattr(ocr_cache_router, "ocr_cache", cache)
+    asyncio.run(cache.put("k", ["WN675A"], 1.5))
+    asyncio.run(cache.get("k"))
+    app = FastAPI()
+    app.include_router(ocr_cache_router.router)
+    client = TestClient(app)
+
+    body = client.get("/admin/ocr-cache").json()
+    assert (body["memory_hits"], body["saved_seconds"], body["disk_entries"]) == (1, 1.5, 1)
+
+    assert client.delete("/admin/ocr-cache", params={"clear": True}).status_code == 204
+    body = client.get("/admin/ocr-cache").json()
+    assert (body["lookups"], body["memory_entries"], body["disk_entries"]) == (0, 0, 0)
+    cache.close()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from services.ocr_service import (
+    AsyncOCRClient, AzureReadBackend, ClientDisconnected, FakeOCRBackend, OCRError, OCRTimeout,
+    cancel_on_disconnect,
+)
+
+
+def client(backend, **kwargs) -> AsyncOCRClient:
+    options = {"timeout": 2.0, "poll_initial": 0.01, "poll_max": 0.04}
+    return AsyncOCRClient(backend, **{**options, **kwargs})
+
+
+@pytest.mark.asyncio
+async def test_read_text_polls_until_done():
+    backend = FakeOCRBackend(polls=4)
+    lines = await client(backend).read_text(b"VA330O-.375-16 X 1.00 stud_3\n\n  WN675A  \n")
+
+    assert lines == ["VA330O-.375-16 X 1.00 stud_3", "WN675A"]
+    assert (backend.submitted, backend.polled) == (1, 4)
+
+
+@pytest.mark.asyncio
+async def test_read_text_failed_operation_returns_none():
+    assert await client(FakeOCRBackend(fail=True)).read_text(b"x") is None
+
+
+@pytest.mark.asyncio
+async def test_read_text_deadline():
+    backend = FakeOCRBackend(polls=1000)
+    started = time.perf_counter()
+    with pytest.raises(OCRTimeout):
+        await client(backend, timeout=0.2).read_text(b"x")
+
+    assert time.perf_counter() - started < 0.5
+    # El intervalo crece: en 0.2 s con tope de 0.04 s son pocas consultas
+    assert backend.polled < 10
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_do_not_block_each_other():
+    backend = FakeOCRBackend(latency=0.05, polls=2)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(client(backend).read_text(f"L{n}".encode()) for n in range(20)))
+
+    assert [lines for lines in results] == [[f"L{n}"] for n in range(20)]
+    assert time.perf_counter() - started < 0.5
+
+
+class FakeRequest:
+    def __init__(self, disconnect_after: float):
+        self.deadline = time.perf_counter() + disconnect_after
+
+    async def is_disconnected(self) -> bool:
+        return time.perf_counter() > self.deadline
+
+
+@pytest.mark.asyncio
+async def test_cancel_on_disconnect():
+    cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(ClientDisconnected):
+        await cancel_on_disconnect(FakeRequest(0.05), slow(), check_interval=0.01)
+    await asyncio.sleep(0)
+    assert cancelled.is_set()
+
+    assert await cancel_on_disconnect(FakeRequest(10), asyncio.sleep(0, result=7), check_interval=0.01) == 7
+
+
+def azure_transport(statuses):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.path, request.headers["Ocp-Apim-Subscription-Key"]))
+        if request.method == "POST":
+            return httpx.Response(202, headers={"Operation-Location": "https://ocr.test/vision/v3.2/read/analyzeResults/op1"})
+        status = statuses.pop(0)
+        body = {"status": status}
+        if status == "succeeded":
+            body["analyzeResult"] = {"readResults": [{"lines": [{"text": "WN675A"}, {"text": "stud_3"}]}]}
+        return httpx.Response(200, content=json.dumps(body), headers={"Content-Type": "application/json"})
+
+    return httpx.MockTransport(handler), calls
+
+
+@pytest.mark.asyncio
+async def test_azure_backend_rest_flow():
+    transport, calls = azure_transport(["notStarted", "running", "succeeded"])
+    backend = AzureReadBackend("https://ocr.test/", "key", client=httpx.AsyncClient(transport=transport))
+
+    assert await client(backend).read_text(b"\xff\xd8\xff") == ["WN675A", "stud_3"]
+    assert calls[0] == ("POST", "/vision/v3.2/read/analyze", "key")
+    assert [method for method, _, _ in calls] == ["POST", "GET", "GET", "GET"]
+    await backend.aclose()
+
+
+@pytest.mark.asyncio
+async def test_azure_backend_error_status():
+    transport = httpx.MockTransport(lambda request: httpx.Response(401, content=b"denied"))
+    backend = AzureReadBackend("https://ocr.test", "key", client=httpx.AsyncClient(transport=transport))
+
+    with pytest.raises(OCRError, match="401"):
+        await client(backend).read_text(b"x")
+    await backend.aclose()
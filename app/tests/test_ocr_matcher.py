@@ -0,0 +1,102 @@
+import io
+
+import pytest
+import pytest_asyncio
+from fastapi import UploadFile
+
+from models import OCRMatchRequest, Product, Stage
+from routers.object_current_stage import delete_object
+from routers.ocr_routes import autocomplete_ocr, match_ocr_text
+from routers.validate_csv import validate_and_insert
+from services.ocr_matcher import IndexEntry, OCRIndex, levenshtein, ocr_index, query_variants
+
+CSV = """Job,Item,Material,Espesor,Cantidad,OCR,Clase,Longitud,Ancho,Alto,Volumen,Área Superficial
+JOB1,Plate,Steel,0.25,2,JOB1Plate,Corte,3,5.85,0.25,0.03,3.3
+JOB1,0.25-20 X 0.75 STUD_1,Steel,0.25,3,JOB1_STUD_1,Sin clase,0.75,0.25,0.25,0.0003,0.06
+JOB1,0.25-14 X 1.25 STUD_1,Steel,0.25,4,JOB10.25-14 X 1.25 STUD_1,Sin clase,0.75,0.25,0.25,0.0003,0.06
+"""
+
+CSV_JOB2 = """Job,Item,Material,Espesor,Cantidad,OCR,Clase,Longitud,Ancho,Alto,Volumen,Área Superficial
+JOB2,Round Manhole Handle,Steel,0.25,2,JOB2Round Manhole Handle,Corte,3,5.85,0.25,0.03,3.3
+"""
+
+
+def ingest(session, csv: str):
+    upload = UploadFile(file=io.BytesIO(csv.encode()), filename="job.csv")
+    return session.run_sync(lambda sync_session: validate_and_insert(upload, "TANKS", sync_session))
+
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture(async_session):
+    ocr_index.clear()
+    async_session.add_all([Product(product_name="TANKS"), Stage(stage_name="CUTTING")])
+    await async_session.commit()
+    await ingest(async_session, CSV)
+    yield async_session
+    ocr_index.clear()
+
+
+def match(session, text: str, **kwargs):
+    return match_ocr_text(OCRMatchRequest(text=text, **kwargs), session)
+
+
+def test_levenshtein_and_variants():
+    assert levenshtein("kitten", "sitting") == 3
+    assert levenshtein("", "abc") == 3
+    assert ("JOB1_STUD_1", 3) in query_variants(["JOB1_STUD_1_3"])
+    # El código del Job en otra línea
+    assert ("WN675APlate", 2) in query_variants(["Plate_2", "WN675A"])
+
+
+@pytest.mark.asyncio
+async def test_match_tolerates_misreads(session):
+    response = await match(session, "J0B1_STUD_I_3")
+    best = response.candidates[0]
+    assert (best.ocr, best.piece_number, best.scanned_ocr) == ("JOB1_STUD_1", 3, "JOB1_STUD_1_3")
+    assert 0.9 < best.score < 1.0
+
+    # Job y nombre en líneas separadas, con espacios de más
+    response = await match(session, "0.25-14 X 1.25  STUD_1_4\nJOB1")
+    best = response.candidates[0]
+    assert (best.ocr, best.piece_number, best.score) == ("JOB10.25-14 X 1.25 STUD_1", 4, 1.0)
+
+    # Pieza inexistente: se devuelve el Item sin número de pieza
+    best = (await match(session, "JOB1Plate_7")).candidates[0]
+    assert (best.ocr, best.piece_number) == ("JOB1Plate", None)
+
+    assert (await match(session, "JOB1Plate", job_code="JOB2")).candidates == []
+
+
+@pytest.mark.asyncio
+async def test_index_follows_ingest_and_delete(session):
+    await match(session, "JOB1Plate_1")
+    loaded_at = ocr_index.loaded_at
+
+    await ingest(session, CSV_JOB2)
+    best = (await match(session, "JOB2Round ManhoIe Handle_2")).candidates[0]
+    assert (best.job_code, best.piece_number) == ("JOB2", 2)
+    # Sumado al índice sin recargarlo completo
+    assert ocr_index.loaded_at == loaded_at
+
+    await delete_object("JOB1Plate", 1, session)
+    await delete_object("JOB1Plate", 2, session)
+    assert all(c.ocr != "JOB1Plate" for c in (await match(session, "JOB1Plate_1")).candidates)
+
+
+@pytest.mark.asyncio
+async def test_autocomplete(session):
+    results = await autocomplete_ocr(session, prefix="job1 0.25", job_code=None, limit=10)
+    assert [c.ocr for c in results] == ["JOB10.25-14 X 1.25 STUD_1"]
+    results = await autocomplete_ocr(session, prefix="JOB1", job_code=None, limit=2)
+    assert [c.ocr for c in results] == ["JOB10.25-14 X 1.25 STUD_1", "JOB1Plate"]
+
+
+def test_match_ranks_large_index():
+    index = OCRIndex()
+    index.rebuild(
+        IndexEntry(item_id=n, ocr=f"WN675A{n:05d}-PLATE", item_name=f"{n:05d}", job_code="WN675A", piece_count=2)
+        for n in range(20000)
+    )
+    matches = index.match(["WN675AO1234-PLATE_2"], limit=3)
+    assert (matches[0].entry.item_id, matches[0].piece_number) == (1234, 2)
+    assert matches[0].score > matches[1].score
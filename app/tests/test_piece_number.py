@@ -0,0 +1,68 @@
+import io
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException, UploadFile
+from sqlmodel import select
+
+from models import Item, Object, Product, Stage
+from routers.object_current_stage import delete_object, list_objects, update_object_stage
+# Alias: con el nombre original pytest lo recolectaría como test
+from routers.object_current_stage import test_update_object_stage as simulate_update_object_stage
+from routers.validate_csv import validate_and_insert
+
+CSV = """Job,Item,Material,Espesor,Cantidad,OCR,Clase,Longitud,Ancho,Alto,Volumen,Área Superficial
+JOB1,Plate,Steel,0.25,2,JOB1Plate,Corte,3,5.85,0.25,0.03,3.3
+JOB1,0.25-20 X 0.75 STUD_1,Steel,0.25,3,JOB1_STUD_1,Sin clase,0.75,0.25,0.25,0.0003,0.06
+"""
+
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture(async_session):
+    async_session.add_all([Product(product_name="TANKS"), Stage(stage_name="CUTTING"), Stage(stage_name="MACHINING")])
+    await async_session.commit()
+    upload = UploadFile(file=io.BytesIO(CSV.encode()), filename="job1.csv")
+    await async_session.run_sync(lambda session: validate_and_insert(upload, "TANKS", session))
+    return async_session
+
+
+@pytest.mark.asyncio
+async def test_ingest_numbers_pieces_per_item(session):
+    rows = (await session.exec(select(Item.ocr, Object.piece_number).join(Object).order_by(Object.object_id))).all()
+    assert rows == [
+        ("JOB1Plate", 1), ("JOB1Plate", 2),
+        ("JOB1_STUD_1", 1), ("JOB1_STUD_1", 2), ("JOB1_STUD_1", 3),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_update_stage_addresses_piece_number(session):
+    # El OCR del Item también contiene "_": solo el último segmento es la pieza
+    response = await update_object_stage("JOB1_STUD_1_3", "MACHINING", session)
+
+    piece = (await session.exec(select(Object).where(Object.object_id == response["object_id"]))).one()
+    assert (piece.piece_number, piece.current_stage) == (3, 2)
+
+
+@pytest.mark.asyncio
+async def test_deleted_piece_keeps_other_numbers(session):
+    await delete_object("JOB1_STUD_1", 2, session)
+
+    listing = await list_objects("JOB1_STUD_1", session)
+    assert [obj["piece_number"] for obj in listing["objects"]] == [1, 3]
+    with pytest.raises(HTTPException) as exc:
+        await update_object_stage("JOB1_STUD_1_2", "MACHINING", session)
+    assert exc.value.status_code == 404
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("endpoint", [update_object_stage, simulate_update_object_stage])
+@pytest.mark.parametrize("scanned_ocr", ["JOB1Plate_x", "JOB1_STUD_1_", "JOB1Plate_-1", "JOB1Plate"])
+async def test_malformed_piece_number_is_rejected(session, endpoint, scanned_ocr):
+    with pytest.raises(HTTPException) as exc:
+        await endpoint(scanned_ocr, "MACHINING", session)
+    assert exc.value.status_code == 422
+    assert scanned_ocr in exc.value.detail
+
+    stages = (await session.exec(select(Object.current_stage))).all()
+    assert set(stages) == {1}
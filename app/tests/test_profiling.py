@@ -0,0 +1,163 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import threading
+import time
+
+import anyio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+from sqlmodel import Session, select
+
+from auth import create_access_token
+from config import settings
+from middleware.profiling import profiling_middleware
+from models import Stage
+from routers import profiling_router
+from services.profiler import WORKER_THREAD_PREFIX, SamplingProfiler, current_profiler
+
+
+@pytest.fixture(name="client")
+def client_fixture(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    app = FastAPI()
+    app.middleware("http")(profiling_middleware)
+    app.include_router(profiling_router.router)
+
+    overlap = threading.Barrier(2, timeout=5)
+
+    def spin(seconds: float) -> None:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+
+    # Dos endpoints síncronos que corren a la vez en workers distintos del threadpool
+    @app.get("/profiled-work")
+    def profiled_work():
+        overlap.wait()
+        spin(0.15)
+        return {"ok": True}
+
+    @app.get("/other-work")
+    def other_work():
+        overlap.wait()
+        spin(0.15)
+        return {"ok": True}
+
+    async_overlap = asyncio.Barrier(2)
+
+    async def spin_async(seconds: float) -> None:
+        # Cede el loop entre tramos: el otro request corre intercalado en el mismo hilo.
+        # Tramos más largos que sys.getswitchinterval() para que el muestreo caiga dentro
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            spin(0.02)
+            await asyncio.sleep(0)
+
+    @app.get("/profiled-async-work")
+    async def profiled_async_work():
+        await async_overlap.wait()
+        await spin_async(0.15)
+        return {"ok": True}
+
+    @app.get("/other-async-work")
+    async def other_async_work():
+        await async_overlap.wait()
+        await spin_async(0.15)
+        return {"ok": True}
+
+    @app.get("/stages")
+    def list_stages():
+        time.sleep(0.05)
+        with Session(engine) as session:
+            return [stage.stage_name for stage in session.exec(select(Stage)).all()]
+
+    return TestClient(app)
+
+
+def auth_header(role: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'ana', 'role': role})}"}
+
+
+def test_normal_requests_are_not_profiled(client, tmp_path):
+    assert "X-Profile-Id" not in client.get("/stages", headers=auth_header("admin")).headers
+    # El flag de un rol sin permisos se ignora
+    assert "X-Profile-Id" not in client.get("/stages?profile=1", headers=auth_header("operador")).headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_admin_profile_is_saved_and_retrievable(client):
+    response = client.get("/stages", headers={**auth_header("admin"), "X-Profile": "1"})
+    profile_id = response.headers["X-Profile-Id"]
+
+    summaries = client.get("/admin/profiles").json()
+    assert [s["profile_id"] for s in summaries] == [profile_id]
+    assert summaries[0]["path"] == "/stages" and summaries[0]["user"] == "ana"
+
+    profile = client.get(f"/admin/profiles/{profile_id}").json()
+    assert profile["duration_ms"] >= 50
+    assert profile["sql"]["count"] == 1
+    assert profile["sql"]["statements"][0]["statement"].startswith("SELECT")
+    assert profile["samples"] > 0
+    assert any("list_stages" in line for line in _names(profile["call_tree"]))
+
+
+def test_sync_endpoint_samples_only_its_worker_thread(client):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        other = pool.submit(client.get, "/other-work")
+        profiled = pool.submit(client.get, "/profiled-work", headers={**auth_header("admin"), "X-Profile": "1"})
+        response = profiled.result()
+        assert other.result().status_code == 200
+
+    profile = client.get(f"/admin/profiles/{response.headers['X-Profile-Id']}").json()
+    names = list(_names(profile["call_tree"]))
+    assert any("profiled_work" in name for name in names)
+    assert any("spin" in name for name in names)
+    # El otro request corría en otro worker al mismo tiempo: no aparece
+    assert not any("other_work" in name for name in names)
+
+
+def test_async_endpoint_samples_only_its_task(client):
+    # Con el cliente abierto todos los requests comparten el mismo event loop
+    with client, ThreadPoolExecutor(max_workers=2) as pool:
+        other = pool.submit(client.get, "/other-async-work")
+        profiled = pool.submit(
+            client.get, "/profiled-async-work", headers={**auth_header("admin"), "X-Profile": "1"}
+        )
+        response = profiled.result()
+        assert other.result().status_code == 200
+
+    profile = client.get(f"/admin/profiles/{response.headers['X-Profile-Id']}").json()
+    names = list(_names(profile["call_tree"]))
+    assert any("profiled_async_work" in name for name in names)
+    assert not any("other_async_work" in name for name in names)
+
+
+@pytest.mark.asyncio
+async def test_anyio_workers_run_calls_in_the_request_context():
+    # El filtro de workers depende del nombre de los hilos de anyio y de que cada
+    # llamada corra con `context.run(func)`: si anyio lo cambia, este test falla
+    profiler, other = SamplingProfiler(threading.get_ident()), SamplingProfiler(threading.get_ident())
+    token = profiler.activate()
+    try:
+        name, runs, runs_other = await anyio.to_thread.run_sync(lambda: (
+            threading.current_thread().name, profiler._runs_request(sys._getframe()), other._runs_request(sys._getframe())
+        ))
+    finally:
+        current_profiler.reset(token)
+
+    assert name.startswith(WORKER_THREAD_PREFIX)
+    assert runs and not runs_other
+
+
+def test_unknown_profile(client):
+    assert client.get("/admin/profiles/../../etc/passwd").status_code == 404
+    assert client.get("/admin/profiles/20240101T000000_deadbeef").status_code == 404
+
+
+def _names(node):
+    yield node["name"]
+    for child in node["children"]:
+        yield from _names(child)
@@ -0,0 +1,160 @@
+import asyncio
+import io
+
+import pytest
+import pytest_asyncio
+from fastapi import UploadFile
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import create_async_db_engine
+
+from models import Item, Job, JobStageCount, Object, Product, Stage, StageUpdateRequest
+from routers.job_status import delete_job
+from routers import object_current_stage
+from routers.object_current_stage import delete_object, get_piece, update_object_stage, update_object_stage_batch
+from routers.validate_csv import validate_and_insert
+from services.progress_service import change_stage, get_job_counts, rebuild_counts
+
+CSV = """Job,Item,Material,Espesor,Cantidad,OCR,Clase,Longitud,Ancho,Alto,Volumen,Área Superficial
+JOB1,Plate,Steel,0.25,3,JOB1Plate,Corte,3,5.85,0.25,0.03,3.3
+JOB1,Stud,Steel,0.25,2,JOB1Stud,Sin clase,0.75,0.25,0.25,,0.06
+"""
+
+
+async def seed(async_session):
+    async_session.add_all([Product(product_name="TANKS"), Stage(stage_name="CUTTING"), Stage(stage_name="MACHINING")])
+    await async_session.commit()
+    upload = UploadFile(file=io.BytesIO(CSV.encode()), filename="job1.csv")
+    await async_session.run_sync(lambda session: validate_and_insert(upload, "TANKS", session))
+    return async_session
+
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture(async_session):
+    return await seed(async_session)
+
+
+async def assert_no_drift(session):
+    report = await session.run_sync(rebuild_counts, fix=False)
+    assert report.drift == []
+
+
+@pytest.mark.asyncio
+async def test_ingest_seeds_counters(session):
+    job = (await session.exec(select(Job))).one()
+    plate, stud = (await session.exec(select(Item).order_by(Item.item_id))).all()
+    counts = await session.run_sync(get_job_counts, job.job_id)
+    assert counts == {plate.item_id: {1: 3}, stud.item_id: {1: 2}}
+    await assert_no_drift(session)
+
+
+@pytest.mark.asyncio
+async def test_stage_update_and_delete_keep_counters(session):
+    await update_object_stage("JOB1Plate_1", "MACHINING", session)
+    await update_object_stage("JOB1Plate_2", "MACHINING", session)
+    await update_object_stage("JOB1Plate_2", "MACHINING", session)
+    await assert_no_drift(session)
+
+    await delete_object("JOB1Plate", 1, session)
+    await delete_object("JOB1Stud", 1, session)
+    await delete_object("JOB1Stud", 2, session)
+    await assert_no_drift(session)
+
+    job = (await session.exec(select(Job))).one()
+    plate = (await session.exec(select(Item).where(Item.ocr == "JOB1Plate"))).one()
+    assert await session.run_sync(get_job_counts, job.job_id) == {plate.item_id: {1: 1, 2: 1}}
+
+
+@pytest.mark.asyncio
+async def test_delete_job_removes_counters(session):
+    await delete_job("JOB1", session)
+    assert (await session.exec(select(JobStageCount))).all() == []
+
+
+@pytest.mark.asyncio
+async def test_rebuild_reports_and_fixes_drift(session):
+    counter = (await session.exec(select(JobStageCount))).first()
+    actual = counter.count
+    counter.count += 5
+    session.add(counter)
+    await session.commit()
+
+    report = await session.run_sync(rebuild_counts, fix=True)
+    assert [(d.stored, d.actual) for d in report.drift] == [(actual + 5, actual)]
+    await session.commit()
+    await assert_no_drift(session)
+
+
+@pytest_asyncio.fixture(name="file_engine")
+async def file_engine_fixture(tmp_path):
+    # Conexiones independientes (no StaticPool) para que cada sesión vea su propia lectura
+    engine = create_async_db_engine(f"sqlite:///{tmp_path / 'counters.sqlite3'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        await seed(session)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_moves_of_the_same_piece_keep_counters(file_engine):
+    async with AsyncSession(file_engine, expire_on_commit=False) as first, \
+            AsyncSession(file_engine, expire_on_commit=False) as second:
+        # Ambas sesiones leen la pieza en CUTTING antes de que ninguna la mueva
+        item = (await first.exec(select(Item).where(Item.ocr == "JOB1Plate"))).one()
+        stale_item = (await second.exec(select(Item).where(Item.ocr == "JOB1Plate"))).one()
+        piece = await get_piece(first, item.item_id, 1)
+        stale_piece = await get_piece(second, item.item_id, 1)
+        assert piece.current_stage == stale_piece.current_stage == 1
+
+        assert await first.run_sync(change_stage, item, piece, 2) == 1
+        await first.commit()
+        # La segunda ya no encuentra la pieza en CUTTING: no vuelve a descontar
+        assert await second.run_sync(change_stage, stale_item, stale_piece, 2) is None
+        await second.commit()
+        assert stale_piece.current_stage == 2
+
+    async def scan(ocr, stage_name):
+        async with AsyncSession(file_engine, expire_on_commit=False) as session:
+            await update_object_stage(ocr, stage_name, session)
+
+    async def batch(ocr, stage_name):
+        async with AsyncSession(file_engine, expire_on_commit=False) as session:
+            await update_object_stage_batch([StageUpdateRequest(ocr=ocr, new_stage_name=stage_name)], session)
+
+    await asyncio.gather(
+        scan("JOB1Plate_2", "MACHINING"), scan("JOB1Plate_2", "MACHINING"),
+        batch("JOB1Plate_2", "MACHINING"), scan("JOB1Stud_1", "MACHINING"), batch("JOB1Stud_1", "CUTTING"),
+    )
+
+    async with AsyncSession(file_engine) as session:
+        await assert_no_drift(session)
+        stages = dict((await session.exec(select(Object.piece_number, Object.current_stage)
+                                          .where(Object.item_id == item.item_id))).all())
+        assert stages == {1: 2, 2: 2, 3: 1}
+
+
+@pytest.mark.asyncio
+async def test_delete_uses_the_stage_at_delete_time(file_engine, monkeypatch):
+    real_get_piece = object_current_stage.get_piece
+
+    async def get_piece_then_move(session, item_id, piece_number):
+        piece = await real_get_piece(session, item_id, piece_number)
+        # Un escaneo mueve la pieza después de que el borrado la leyó
+        async with AsyncSession(file_engine, expire_on_commit=False) as other:
+            item = await other.get(Item, item_id)
+            await other.run_sync(change_stage, item, await real_get_piece(other, item_id, piece_number), 2)
+            await other.commit()
+        return piece
+
+    monkeypatch.setattr(object_current_stage, "get_piece", get_piece_then_move)
+    async with AsyncSession(file_engine, expire_on_commit=False) as session:
+        await delete_object("JOB1Plate", 1, session)
+
+    async with AsyncSession(file_engine) as session:
+        await assert_no_drift(session)
+        job = (await session.exec(select(Job))).one()
+        plate = (await session.exec(select(Item).where(Item.ocr == "JOB1Plate"))).one()
+        assert (await session.run_sync(get_job_counts, job.job_id))[plate.item_id] == {1: 2}
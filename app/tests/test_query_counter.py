@@ -0,0 +1,74 @@
+import io
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, UploadFile
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from db.query_counter import track_queries
+from middleware.query_counter import query_counter_middleware
+from models import Item, Job, Object, Product, Stage
+from routers.job_status import delete_job, get_job_status
+from routers.object_current_stage import list_objects
+from routers.validate_csv import validate_and_insert
+
+CSV = """Job,Item,Material,Espesor,Cantidad,OCR,Clase,Longitud,Ancho,Alto,Volumen,Área Superficial
+JOB1,Plate,Steel,0.25,12,JOB1Plate,Corte,3,5.85,0.25,0.03,3.3
+JOB1,Stud,Steel,0.25,8,JOB1Stud,Sin clase,0.75,0.25,0.25,0.0003,0.06
+"""
+
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture(async_session):
+    async_session.add_all([Product(product_name="TANKS"), Stage(stage_name="CUTTING"), Stage(stage_name="MACHINING")])
+    await async_session.commit()
+    upload = UploadFile(file=io.BytesIO(CSV.encode()), filename="job1.csv")
+    await async_session.run_sync(lambda session: validate_and_insert(upload, "TANKS", session))
+    return async_session
+
+
+@pytest.mark.asyncio
+async def test_hot_endpoints_stay_within_query_budget(session, query_budget):
+    # Item, Objects y nombres de Stage, sin importar cuántas piezas tenga el Item
+    with query_budget(3):
+        await list_objects("JOB1Plate", session)
+    # Job, Items, rutas de proceso y contadores
+    with query_budget(4):
+        await get_job_status("JOB1", session)
+
+
+@pytest.mark.asyncio
+async def test_delete_job_uses_bulk_deletes(session, query_budget):
+    # Job, ids de Items, contadores, Objects, Items, las colecciones del Job
+    # (items y defect_records, que el ORM revisa al borrarlo) y el Job
+    with query_budget(8):
+        await delete_job("JOB1", session)
+    for model in (Job, Item, Object):
+        assert (await session.exec(select(model))).all() == []
+
+
+def test_repeated_statements_are_flagged_as_n_plus_one(engine):
+    with Session(engine) as session, track_queries() as stats:
+        for name in ["CUTTING", "MACHINING", "WAREHOUSE", "BENT", "PAINT"]:
+            session.exec(select(Stage).where(Stage.stage_name == name)).first()
+        session.exec(select(Item)).all()
+
+    assert stats.count == 6
+    assert [n for _, n in stats.repeated(threshold=5)] == [5]
+
+
+def test_middleware_sets_query_headers(engine):
+    app = FastAPI()
+    app.middleware("http")(query_counter_middleware)
+
+    @app.get("/stages")
+    def list_stages():
+        with Session(engine) as session:
+            return [stage.stage_name for stage in session.exec(select(Stage)).all()]
+
+    response = TestClient(app).get("/stages")
+
+    assert response.headers["X-DB-Query-Count"] == "1"
+    assert float(response.headers["X-DB-Query-Time-Ms"]) >= 0
+    assert "X-DB-N-Plus-One" not in response.headers
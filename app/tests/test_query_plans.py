@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import text, tuple_
+from sqlmodel import SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from models import DefectImage, DefectRecord, Issue, Item, Object, ProcessStage, Stage
+
+# Consultas de los endpoints más usados; ninguna debe recorrer toda la tabla filtrada
+HOT_QUERIES = {
+    "item_by_ocr": select(Item).where(Item.ocr == "JOB1Plate"),
+    "items_by_job": select(Item.item_id, Item.item_name).where(Item.job_id == 1).order_by(Item.item_id),
+    "items_by_job_and_name": select(Item.item_name, Item.item_id)
+        .where(Item.job_id == 1).where(Item.item_name.in_(["Plate", "Stud"])),
+    "objects_by_item": select(Object).where(Object.item_id == 1).order_by(Object.piece_number),
+    "object_by_piece": select(Object).where(Object.item_id == 1).where(Object.piece_number == 2),
+    "objects_by_pieces": select(Object)
+        .where(Object.item_id.in_([1, 2]))
+        .where(tuple_(Object.item_id, Object.piece_number).in_([(1, 1), (2, 3)])),
+    "objects_in_stage": select(Object.object_id).where(Object.current_stage == 2).limit(1),
+    "defect_records_by_job_and_product": select(DefectRecord)
+        .where(DefectRecord.job_id == 1, DefectRecord.product_id == 1),
+    "issues_by_process": select(Issue).where(Issue.process_id == 1),
+    "images_by_defect_record": select(DefectImage).where(DefectImage.defect_record_id == 1),
+    "process_routes": select(ProcessStage.process_id, Stage.stage_id, Stage.stage_name)
+        .join(Stage, Stage.stage_id == ProcessStage.stage_id)
+        .where(ProcessStage.process_id.in_(select(Item.process_id).where(Item.job_id == 1)))
+        .order_by(ProcessStage.process_id, ProcessStage.order, ProcessStage.id),
+}
+
+# Tablas chicas de catálogo: recorrerlas completas es aceptable
+CATALOG_TABLES = {"stage"}
+
+
+@pytest.fixture(name="sqlite_engine", scope="module")
+def sqlite_engine_fixture():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+
+
+def query_plan(engine, statement) -> list[str]:
+    sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_index(sqlite_engine, name):
+    plan = query_plan(sqlite_engine, HOT_QUERIES[name])
+
+    full_scans = [
+        step for step in plan
+        if step.startswith("SCAN ")
+        and " USING " not in step
+        and step.split()[1] in SQLModel.metadata.tables
+        and step.split()[1] not in CATALOG_TABLES
+    ]
+    assert not full_scans, f"{name}: {plan}"
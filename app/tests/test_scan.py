@@ -0,0 +1,93 @@
+import io
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException, UploadFile
+from sqlmodel import select
+from starlette.datastructures import Headers
+
+from models import Object, Product, Stage
+from routers.object_current_stage import scan_object
+from routers.validate_csv import validate_and_insert
+from services import ocr_service
+from services.ocr_matcher import ocr_index
+from services.ocr_service import AsyncOCRClient, FakeOCRBackend
+
+CSV = """Job,Item,Material,Espesor,Cantidad,OCR,Clase,Longitud,Ancho,Alto,Volumen,Área Superficial
+JOB1,Plate,Steel,0.25,2,JOB1Plate,Corte,3,5.85,0.25,0.03,3.3
+JOB1,0.25-20 X 0.75 STUD_1,Steel,0.25,3,JOB1_STUD_1,Sin clase,0.75,0.25,0.25,0.0003,0.06
+JOB1,0.25-20 X 0.75 STUD_2,Steel,0.25,3,JOB1_STUD_2,Sin clase,0.75,0.25,0.25,0.0003,0.06
+"""
+
+
+class ConnectedRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def label(text: str) -> UploadFile:
+    # FakeOCRBackend "lee" la imagen como texto
+    return UploadFile(io.BytesIO(text.encode()), filename="label.jpg", headers=Headers({"content-type": "image/jpeg"}))
+
+
+def scan(session, text: str, stage: str = "MACHINING", job_code=None):
+    return scan_object(ConnectedRequest(), session, image=label(text), new_stage_name=stage, job_code=job_code)
+
+
+@pytest_asyncio.fixture(name="session")
+async def session_fixture(async_session, monkeypatch):
+    backend = FakeOCRBackend()
+    monkeypatch.setattr(ocr_service, "_client", AsyncOCRClient(backend, poll_initial=0.001))
+    ocr_index.clear()
+    async_session.add_all([Product(product_name="TANKS"), Stage(stage_name="CUTTING"), Stage(stage_name="MACHINING")])
+    await async_session.commit()
+    upload = UploadFile(file=io.BytesIO(CSV.encode()), filename="job1.csv")
+    await async_session.run_sync(lambda session: validate_and_insert(upload, "TANKS", session))
+    async_session.backend = backend
+    yield async_session
+    ocr_index.clear()
+
+
+async def piece_stage(session, object_id: int) -> int:
+    return (await session.exec(select(Object.current_stage).where(Object.object_id == object_id))).one()
+
+
+@pytest.mark.asyncio
+async def test_scan_applies_confident_match(session):
+    response = await scan(session, "J0B1Plate_2")
+
+    assert response.updated
+    assert (response.object.ocr, response.object.piece_number) == ("JOB1Plate_2", 2)
+    assert (response.object.previous_stage, response.object.new_stage) == ("CUTTING", "MACHINING")
+    assert await piece_stage(session, response.object.object_id) == 2
+    # La lectura no fue exacta: se devuelven los demás candidatos
+    assert 0.9 < response.score < 1.0
+    assert set(response.timings_ms) == {"ocr", "match", "update", "total"}
+
+
+@pytest.mark.asyncio
+async def test_scan_ambiguous_reading_is_not_applied(session):
+    # "_?" puede ser STUD_1 o STUD_2: no se toca nada y se pide confirmación
+    response = await scan(session, "JOB1_STUD_?_3")
+
+    assert not response.updated and response.object is None
+    assert {c.scanned_ocr for c in response.alternatives[:2]} == {"JOB1_STUD_1_3", "JOB1_STUD_2_3"}
+    stages = (await session.exec(select(Object.current_stage))).all()
+    assert set(stages) == {1}
+
+
+@pytest.mark.asyncio
+async def test_scan_without_match_or_text(session):
+    response = await scan(session, "\n")
+    assert (response.updated, response.detail) == (False, "No se reconoció texto en la imagen.")
+
+    response = await scan(session, "JOB1Plate_2", job_code="JOB9")
+    assert (response.updated, response.alternatives) == (False, [])
+
+
+@pytest.mark.asyncio
+async def test_scan_checks_stage_before_ocr(session):
+    with pytest.raises(HTTPException) as exc:
+        await scan(session, "JOB1Plate_1", stage="PAINT")
+    assert exc.value.status_code == 404
+    assert session.backend.submitted == 0
@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from config import settings
+from db.query_counter import track_queries
+from db.slow_query import explain, normalize_sql, params_shape, slow_query_log
+from models import Item, Stage
+from tests.conftest import IS_SQLITE
+from routers import slow_query_router
+
+
+@pytest.fixture(name="slow_log")
+def slow_log_fixture(monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 0)
+    slow_query_log.reset()
+    yield slow_query_log
+    slow_query_log.reset()
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT * FROM item WHERE ocr = 'A1' AND  item_id IN (?, ?, ?) LIMIT 10") == \
+        "SELECT * FROM item WHERE ocr = ? AND item_id IN (...) LIMIT ?"
+    assert normalize_sql("INSERT INTO stage (stage_name) VALUES (?), (?), (?)") == \
+        "INSERT INTO stage (stage_name) VALUES (...)"
+    # Los dígitos dentro de identificadores no se tocan
+    assert normalize_sql("SELECT item_1.ocr FROM item AS item_1") == "SELECT item_1.ocr FROM item AS item_1"
+
+
+def test_params_shape():
+    assert params_shape((1, 2, "a", None), False) == "(int×2, str, NoneType)"
+    assert params_shape([(1, "a"), (2, "b")], True) == "2 × (int, str)"
+    assert params_shape({"job_id": 1}, False) == "{job_id: int}"
+
+
+def test_slow_queries_are_grouped_with_plan(engine, slow_log):
+    with Session(engine) as session, track_queries("GET /items"):
+        for ocr in ("A", "B", "C"):
+            session.exec(select(Item).where(Item.ocr == ocr)).all()
+        session.exec(select(Stage)).all()
+
+    top = slow_log.top()
+    item_query = next(q for q in top if "FROM item" in q["statement"])
+    assert item_query["count"] == 3
+    assert item_query["params_shape"] == "(str)"
+    assert item_query["routes"] == {"GET /items": 3}
+    assert any("USING INDEX ix_item_ocr" in line for line in item_query["plan"])
+    assert len(top) == 2
+
+
+def test_disabled_with_negative_threshold(engine, slow_log, monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", -1)
+    with Session(engine) as session:
+        session.exec(select(Stage)).all()
+    assert slow_log.top() == []
+
+
+def test_admin_endpoint_lists_and_resets(engine, slow_log):
+    with Session(engine) as session:
+        session.exec(select(Stage)).all()
+    app = FastAPI()
+    app.include_router(slow_query_router.router)
+    client = TestClient(app)
+
+    body = client.get("/admin/slow-queries").json()
+    assert body["threshold_ms"] == 0
+    assert body["queries"][0]["routes"] == {"-": 1}
+
+    assert client.delete("/admin/slow-queries").status_code == 204
+    assert client.get("/admin/slow-queries").json()["queries"] == []
+
+
+class FakeCursor:
+    """Cursor DBAPI de PostgreSQL en el que falla el EXPLAIN."""
+
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, statement, parameters=()):
+        self.executed.append(statement.split(" SELECT")[0])
+        if statement.startswith("EXPLAIN"):
+            raise ValueError("can't adapt type 'dict'")
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+def test_failed_explain_on_postgresql_rolls_back_to_savepoint():
+    executed = []
+    conn = SimpleNamespace(
+        dialect=SimpleNamespace(name="postgresql"),
+        connection=SimpleNamespace(cursor=lambda: FakeCursor(executed)),
+    )
+    plan = explain(conn, "SELECT * FROM item WHERE ocr = %(ocr)s", {"ocr": {}})
+
+    assert plan == ["EXPLAIN falló: can't adapt type 'dict'"]
+    assert executed == [
+        "SAVEPOINT slow_query_explain",
+        "EXPLAIN",
+        "ROLLBACK TO SAVEPOINT slow_query_explain",
+        "RELEASE SAVEPOINT slow_query_explain",
+    ]
+
+
+@pytest.mark.skipif(IS_SQLITE, reason="Requiere TEST_DATABASE_URL de PostgreSQL")
+def test_failed_explain_keeps_the_request_transaction_usable(engine):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        plan = explain(conn, "SELECT * FROM no_such_table", ())
+        assert plan[0].startswith("EXPLAIN falló")
+        # Sin el SAVEPOINT esta sentencia fallaría con "current transaction is aborted"
+        assert conn.execute(select(Stage)).all() == []
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import create_engine
+
+from config import settings
+from db import apply_sqlite_pragmas, create_async_db_engine, create_db_engine, sqlite_pragmas
+
+
+def read_pragmas(connection, names):
+    return {name: connection.execute(text(f"PRAGMA {name}")).scalar() for name in names}
+
+
+def test_app_engine_applies_the_profile(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'app.sqlite3'}")
+    with engine.connect() as connection:
+        values = read_pragmas(connection, ["journal_mode", "synchronous", "busy_timeout",
+                                           "cache_size", "temp_store", "foreign_keys"])
+    engine.dispose()
+
+    assert values["journal_mode"] == settings.SQLITE_JOURNAL_MODE.lower()
+    assert values["synchronous"] == {"OFF": 0, "NORMAL": 1, "FULL": 2}[settings.SQLITE_SYNCHRONOUS]
+    assert values["busy_timeout"] == settings.SQLITE_BUSY_TIMEOUT_MS
+    assert values["cache_size"] == settings.SQLITE_CACHE_SIZE
+    assert values["temp_store"] == {"DEFAULT": 0, "FILE": 1, "MEMORY": 2}[settings.SQLITE_TEMP_STORE]
+    assert values["foreign_keys"] == int(settings.SQLITE_FOREIGN_KEYS)
+
+
+@pytest.mark.skipif("SQLITE_FOREIGN_KEYS" in os.environ, reason="SQLITE_FOREIGN_KEYS definido en el entorno")
+def test_foreign_keys_stay_off_by_default():
+    # El perfil no cambia la integridad referencial de bases existentes
+    assert settings.SQLITE_FOREIGN_KEYS is False
+    assert sqlite_pragmas()["foreign_keys"] == "OFF"
+
+
+@pytest.mark.asyncio
+async def test_async_engine_applies_the_profile(tmp_path):
+    engine = create_async_db_engine(f"sqlite:///{tmp_path / 'app.sqlite3'}")
+    async with engine.connect() as connection:
+        values = await connection.run_sync(lambda sync: read_pragmas(sync, ["journal_mode", "busy_timeout"]))
+    await engine.dispose()
+    assert values == {"journal_mode": "wal", "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS}
+
+
+def test_custom_pragmas_apply_to_every_connection(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'custom.sqlite3'}")
+    apply_sqlite_pragmas(engine, {**sqlite_pragmas(), "foreign_keys": "ON", "cache_size": "-2048"})
+    for _ in range(2):
+        with engine.connect() as connection:
+            assert read_pragmas(connection, ["foreign_keys", "cache_size"]) == {"foreign_keys": 1, "cache_size": -2048}
+        engine.dispose()